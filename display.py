@@ -1,54 +1,99 @@
-from PyQt5.QtWidgets import QWidget, QGridLayout, QLabel
-from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import QWidget, QStyle, QStyleOption
+from PyQt5.QtCore import Qt, QRectF, QSize
+from PyQt5.QtGui import QPainter, QColor, QFont
+from em_framebuffer import get_geometry
 
 class DisplayWidget(QWidget):
-    def __init__(self):
+    """LED matrix drawn in a single paintEvent.
+
+    There is no widget per pixel: set_frame() only stores the new frame and
+    schedules a repaint, and paintEvent() draws the lit pixels row by row
+    from the packed framebuffer, so 16x16 and larger grids cost the same
+    per frame as 4x4.
+    """
+    OFF_COLOR = QColor("black")
+    ON_COLOR = QColor("white")
+    GRID_COLOR = QColor("#3F3F46")
+    MARGIN = 20  # Room for the stylesheet border and padding
+
+    def __init__(self, geometry=None):
         super().__init__()
-        self.grid_size = 4
-        self.pixels = []
-        self.initUI()
-
-    def initUI(self):
-        layout = QGridLayout()
-        layout.setSpacing(0)
-        for y in range(self.grid_size):
-            row = []
-            for x in range(self.grid_size):
-                pixel = QLabel()
-                pixel.setFixedSize(200, 200)
-                pixel.setAlignment(Qt.AlignTop | Qt.AlignLeft)  # Align text to top-left
-                pixel.setText(f"{x} {y}")  # Set coordinate text
-                # Initial styling (black background, white text)
-                pixel.setStyleSheet("""
-                    background-color: black;
-                    color: white;
-                    font-size: 12px;
-                    padding: 4px;
-                """)
-                layout.addWidget(pixel, y, x)
-                row.append(pixel)
-            self.pixels.append(row)
-        self.setLayout(layout)
+        self.display_geometry = get_geometry(geometry)
+        self.frame = 0  # Currently shown pixels, bit y*width+x
+        self.show_coordinates = True
+        self.metrics = None  # em_metrics.Metrics counting painted frames
+        self.on_first_paint = None  # Called once when the first paint has finished
+        self.setMinimumSize(200, 200)
+
+    @property
+    def grid_size(self):
+        return self.display_geometry.width
+
+    def sizeHint(self):
+        return QSize(800, 800)
+
+    def set_geometry(self, geometry):
+        """Switch to another matrix size; the frame is cleared"""
+        self.display_geometry = get_geometry(geometry)
+        self.frame = 0
+        self.update()
 
     def update_pixel(self, x, y, state):
-        if not (0 <= x < self.grid_size and 0 <= y < self.grid_size):
+        if not self.display_geometry.contains(x, y):
             return  # Ignore invalid coordinates
-        # Set background and text color based on state
-        bg_color = "white" if state else "black"
-        text_color = "black" if state else "white"
-        self.pixels[y][x].setStyleSheet(f"""
-            background-color: {bg_color};
-            color: {text_color};
-            font-size: 12px;
-            padding: 4px;
-        """)
-        
+        bit = self.display_geometry.bit(x, y)
+        self.set_frame((self.frame | bit) if state else (self.frame & ~bit))
+
+    def set_frame(self, frame):
+        """Show a whole frame at once"""
+        if frame != self.frame:
+            self.frame = frame
+            self.update()
+
     def clear_all(self):
-        for y in range(self.grid_size):
-            for x in range(self.grid_size):
-                self.pixels[y][x].setStyleSheet("""
-                    background-color: black;
-                    color: white;
-                    font-size: 12px;
-                    padding: 4px;
-                """)
\ No newline at end of file
+        self.set_frame(0)
+
+    def paintEvent(self, event):
+        if self.metrics is not None:
+            self.metrics.frames.inc()
+        painter = QPainter(self)
+        option = QStyleOption()
+        option.initFrom(self)
+        self.style().drawPrimitive(QStyle.PE_Widget, option, painter, self)  # Stylesheet background
+
+        geometry = self.display_geometry
+        area = self.contentsRect().adjusted(self.MARGIN, self.MARGIN, -self.MARGIN, -self.MARGIN)
+        cell = max(min(area.width() / geometry.width, area.height() / geometry.height), 1)
+        left = area.x() + (area.width() - cell * geometry.width) / 2
+        top = area.y() + (area.height() - cell * geometry.height) / 2
+        painter.fillRect(QRectF(left, top, cell * geometry.width, cell * geometry.height), self.OFF_COLOR)
+
+        # Lit pixels, one row of the bit plane at a time
+        for y, bits in enumerate(geometry.rows(self.frame)):
+            x = 0
+            while bits:
+                if bits & 1:
+                    painter.fillRect(QRectF(left + x * cell, top + y * cell, cell, cell), self.ON_COLOR)
+                bits >>= 1
+                x += 1
+
+        if cell >= 6:
+            painter.setPen(self.GRID_COLOR)
+            for x in range(geometry.width + 1):
+                painter.drawLine(int(left + x * cell), int(top), int(left + x * cell), int(top + cell * geometry.height))
+            for y in range(geometry.height + 1):
+                painter.drawLine(int(left), int(top + y * cell), int(left + cell * geometry.width), int(top + y * cell))
+
+        # Coordinate labels like the original grid, while there is room for them
+        if self.show_coordinates and cell >= 40:
+            painter.setFont(QFont("Consolas", 9))
+            for y in range(geometry.height):
+                bits = geometry.row(self.frame, y)
+                for x in range(geometry.width):
+                    painter.setPen(self.OFF_COLOR if bits >> x & 1 else self.ON_COLOR)
+                    painter.drawText(QRectF(left + x * cell + 4, top + y * cell + 4, cell, cell),
+                                     Qt.AlignTop | Qt.AlignLeft, f"{x} {y}")
+        painter.end()
+        if self.on_first_paint is not None:
+            callback, self.on_first_paint = self.on_first_paint, None
+            callback()
\ No newline at end of file
@@ -0,0 +1,166 @@
+import argparse
+import math
+import sys
+from PyQt5.QtWidgets import QApplication, QWidget
+from PyQt5.QtCore import Qt, QRectF, QTimer
+from PyQt5.QtGui import QPainter, QColor, QFont, QImage
+from em_framebuffer import get_geometry
+from em_fusion import split_programs
+from em_wall import WallScheduler
+
+class DisplayWall(QWidget):
+    """Many programs side by side in one widget, driven by one timer.
+
+    A single QTimer ticks the WallScheduler, which steps every emulator
+    and returns the tiles whose frame changed; only their rectangles are
+    invalidated and Qt paints them all in one paintEvent. Each frame is
+    drawn as a 1-bit QImage scaled onto its tile, so a tile costs one
+    drawImage() however large its matrix is, and the image is only
+    rebuilt when the frame changes.
+    """
+    BACKGROUND = QColor("#1E1E1E")
+    OFF_COLOR = QColor("black")
+    ON_COLOR = QColor("white")
+    ERROR_COLOR = QColor("#F48771")
+    LABEL_COLOR = QColor("#DCDCDC")
+    LABEL_HEIGHT = 14  # Name strip above each tile, when tiles are large enough
+    SPACING = 4
+
+    def __init__(self, hz=120, fps=60, metrics=None, parent=None):
+        super().__init__(parent)
+        self.scheduler = WallScheduler(hz, metrics)
+        self.metrics = metrics
+        self.images = {}  # Tile -> (frame, QImage)
+        self.columns = 1
+        self.cell = 0.0
+        self.colors = [self.OFF_COLOR.rgb(), self.ON_COLOR.rgb()]
+        self.setAttribute(Qt.WA_OpaquePaintEvent)  # paintEvent fills every pixel it is asked for
+        self.setMinimumSize(200, 200)
+        self.timer = QTimer(self)
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.setInterval(max(int(1000 / fps), 1))
+        self.timer.timeout.connect(self.tick)
+
+    @property
+    def tiles(self):
+        return self.scheduler.tiles
+
+    def add_program(self, code, name="", ram_size=64, timing="legacy", geometry=None):
+        tile = self.scheduler.add(code, name, ram_size, timing, geometry)
+        self._layout()
+        self.update()
+        return tile
+
+    def remove_tile(self, tile):
+        self.scheduler.remove(tile)
+        self.images.pop(tile, None)
+        self._layout()
+        self.update()
+
+    def start(self):
+        self.scheduler.start()
+        self.timer.start()
+
+    def stop(self):
+        self.timer.stop()
+
+    def tick(self):
+        for index in self.scheduler.tick():
+            self.update(self.tile_rect(index).toAlignedRect())
+
+    def _layout(self):
+        """Choose the column count that gives the largest square cells"""
+        count = len(self.tiles)
+        if count == 0:
+            return
+        width, height = max(self.width(), 1), max(self.height(), 1)
+        best = None
+        for columns in range(1, count + 1):
+            rows = math.ceil(count / columns)
+            cell = min(width / columns, height / rows)
+            if best is None or cell > best[0]:
+                best = (cell, columns)
+        self.cell, self.columns = best
+
+    def resizeEvent(self, event):
+        self._layout()
+        super().resizeEvent(event)
+
+    def tile_rect(self, index):
+        row, column = divmod(index, self.columns)
+        return QRectF(column * self.cell, row * self.cell, self.cell, self.cell)
+
+    def frame_image(self, tile):
+        """The tile's frame as a width x height 1-bit image, cached until the frame changes"""
+        frame = tile.emulator.framebuffer
+        cached = self.images.get(tile)
+        if cached is not None and cached[0] == frame:
+            return cached[1]
+        geometry = tile.emulator.geometry
+        stride = (geometry.width + 31) // 32 * 4  # QImage rows are 32-bit aligned
+        data = b"".join(row.to_bytes(stride, "little") for row in geometry.rows(frame))
+        image = QImage(data, geometry.width, geometry.height, stride, QImage.Format_MonoLSB).copy()
+        image.setColorTable(self.colors)
+        self.images[tile] = (frame, image)
+        return image
+
+    def paintEvent(self, event):
+        if self.metrics is not None:
+            self.metrics.frames.inc()
+        painter = QPainter(self)
+        dirty = QRectF(event.rect())
+        painter.fillRect(event.rect(), self.BACKGROUND)
+        labels = self.cell >= 48
+        if labels:
+            painter.setFont(QFont("Consolas", 8))
+        for index, tile in enumerate(self.tiles):
+            rect = self.tile_rect(index)
+            if not rect.intersects(dirty):
+                continue
+            area = rect.adjusted(self.SPACING, self.SPACING, -self.SPACING, -self.SPACING)
+            if labels:
+                painter.setPen(self.ERROR_COLOR if tile.error else self.LABEL_COLOR)
+                text = f"{tile.name}: {tile.error}" if tile.error else tile.name
+                painter.drawText(QRectF(area.x(), area.y(), area.width(), self.LABEL_HEIGHT),
+                                 Qt.AlignLeft | Qt.AlignVCenter, text)
+                area.setTop(area.top() + self.LABEL_HEIGHT)
+            geometry = tile.emulator.geometry
+            pixel = max(min(area.width() / geometry.width, area.height() / geometry.height), 0.0)
+            target = QRectF(area.x() + (area.width() - pixel * geometry.width) / 2,
+                            area.y() + (area.height() - pixel * geometry.height) / 2,
+                            pixel * geometry.width, pixel * geometry.height)
+            if tile.error and not labels:
+                painter.fillRect(target, self.ERROR_COLOR)
+            else:
+                painter.drawImage(target, self.frame_image(tile))
+        painter.end()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run many Forgematrix programs side by side on one display wall.")
+    parser.add_argument("files", nargs="+", help="Source files; programs within a file are separated by blank lines")
+    parser.add_argument("--copies", type=int, default=1, help="Instances of every program (default 1)")
+    parser.add_argument("--ram", type=int, default=64)
+    parser.add_argument("--timing", default="legacy")
+    parser.add_argument("--display", default="4x4", type=get_geometry, metavar="WxH")
+    parser.add_argument("--hz", type=int, default=120, help="Clock rate of every program (default 120)")
+    parser.add_argument("--fps", type=int, default=60, help="Wall refresh rate (default 60)")
+    args = parser.parse_args(argv)
+
+    app = QApplication(sys.argv[:1])
+    wall = DisplayWall(hz=args.hz, fps=args.fps)
+    wall.setWindowTitle("Forgematrix Wall")
+    for path in args.files:
+        with open(path) as f:
+            programs = split_programs(f.read())
+        for number, code in enumerate(programs, 1):
+            name = path if len(programs) == 1 else f"{path}#{number}"
+            for copy in range(args.copies):
+                wall.add_program(code, name if args.copies == 1 else f"{name} ({copy + 1})",
+                                 args.ram, args.timing, args.display)
+    wall.resize(1200, 800)
+    wall.show()
+    wall.start()
+    return app.exec_()
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,156 @@
+import asyncio
+from collections import namedtuple
+
+# A frame presented by the program, and the cycle it appeared at
+FrameEvent = namedtuple("FrameEvent", "cycle frame")
+# End of a run: kind is "halted", "error" or "stopped"
+RunnerEvent = namedtuple("RunnerEvent", "kind cycle pc error")
+
+class Subscription:
+    """Async iterator over a runner's frames or events.
+
+    It is registered when created, not when iteration starts, so nothing
+    presented after frames()/events() returns is missed. Items are queued
+    up to maxsize; when a consumer falls behind the oldest items are
+    dropped. Iteration ends when the program stops.
+    """
+    def __init__(self, subscribers, maxsize=256):
+        self.queue = asyncio.Queue(maxsize)
+        self._subscribers = subscribers
+        subscribers.append(self.queue)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        item = await self.queue.get()
+        if item is None:
+            self.close()
+            raise StopAsyncIteration
+        return item
+
+    def close(self):
+        if self.queue in self._subscribers:
+            self._subscribers.remove(self.queue)
+
+def _publish(queues, item):
+    for queue in queues:
+        if queue.full():
+            queue.get_nowait()  # Drop the oldest; a slow consumer still sees the latest state
+        queue.put_nowait(item)
+
+class _FrameTap:
+    """Display sink that reports frames to the runner and forwards them"""
+    def __init__(self, runner, display):
+        self.runner = runner
+        self.target = display
+
+    def set_frame(self, frame):
+        if self.runner.frame_queues:
+            _publish(self.runner.frame_queues, FrameEvent(self.runner.emulator.cycles, frame))
+        if self.target is not None:
+            self.target.set_frame(frame)
+
+    def clear_all(self):
+        if self.runner.frame_queues:
+            _publish(self.runner.frame_queues, FrameEvent(self.runner.emulator.cycles, 0))
+        if self.target is not None:
+            self.target.clear_all()
+
+class AsyncRunner:
+    """Drives an Emulator from an asyncio event loop, without threads.
+
+    run() executes at most batch cycles at a time and awaits between
+    batches, so one loop can host hundreds of programs. Busy and WAIT
+    cycles are fast-forwarded (Emulator.skip_idle) instead of stepped.
+    With realtime=True each await sleeps until the wall clock catches up
+    with the virtual time at hz, so a WAIT costs a single sleep; with
+    realtime=False the runner just yields and runs as fast as it can.
+    Each batch is recorded in metrics (an em_metrics.Metrics) if given.
+    """
+    def __init__(self, emulator, hz=120, batch=None, realtime=True, metrics=None):
+        self.emulator = emulator
+        self.metrics = metrics
+        self.hz = hz
+        self.realtime = realtime
+        self.batch = batch or (max(hz // 60, 1) if realtime else 1000)
+        self.frame_queues = []
+        self.event_queues = []
+        self.finished = None  # RunnerEvent once the program stopped
+        self._stopping = False
+        emulator.display = _FrameTap(self, emulator.display)
+
+    def frames(self, maxsize=256):
+        """Async iterator of FrameEvent for every frame the program presents"""
+        subscription = Subscription(self.frame_queues, maxsize)
+        if self.finished is not None:
+            subscription.queue.put_nowait(None)
+        return subscription
+
+    def events(self, maxsize=16):
+        """Async iterator of RunnerEvent (halted/error/stopped)"""
+        subscription = Subscription(self.event_queues, maxsize)
+        if self.finished is not None:
+            subscription.queue.put_nowait(self.finished)
+            subscription.queue.put_nowait(None)
+        return subscription
+
+    def stop(self):
+        """Ask run() to return after the current batch"""
+        self._stopping = True
+
+    async def run(self, cycles=None):
+        """Run until the program halts or errors, cycles elapse or stop() is called.
+
+        Returns the number of cycles executed.
+        """
+        em = self.emulator
+        metrics = self.metrics
+        loop = asyncio.get_running_loop()
+        step = em.step_function
+        self._stopping = False
+        self.finished = None
+        start_time = loop.time()
+        start_cycles = em.cycles
+        limit = None if cycles is None else start_cycles + cycles
+        while em.running and not self._stopping:
+            end = em.cycles + self.batch if limit is None else min(em.cycles + self.batch, limit)
+            if end <= em.cycles:
+                break
+            if metrics is not None:
+                batch_start, batch_cycles = loop.time(), em.cycles
+            if em.hooks is not None:
+                em.run(end - em.cycles)  # Instrumented loop, which delivers the hook events
+                if em.hook_stop:
+                    self._stopping = True
+            while em.running and em.cycles < end and not self._stopping:
+                if em.busy or em.delay:
+                    em.skip_idle(end - em.cycles)
+                else:
+                    step(em)
+            if metrics is not None:
+                now = loop.time()
+                lag = metrics.clock_lag(now - start_time, self.hz, em.cycles - start_cycles) if self.realtime else 0
+                metrics.batch(em.cycles - batch_cycles, now - batch_start, lag)
+            if self._stopping:
+                break
+            if self.realtime:
+                if em.busy or em.delay:  # Sleep through the whole WAIT in one go
+                    em.skip_idle(em.busy + em.delay if limit is None else limit - em.cycles)
+                wake = start_time + (em.cycles - start_cycles) / self.hz
+                await asyncio.sleep(max(wake - loop.time(), 0))
+            else:
+                await asyncio.sleep(0)
+
+        if not em.running:
+            self._finish("error" if em.error else "halted")
+        elif self._stopping:
+            self._finish("stopped")
+        return em.cycles - start_cycles
+
+    def _finish(self, kind):
+        em = self.emulator
+        self.finished = RunnerEvent(kind, em.cycles, em.pc, em.error)
+        _publish(self.event_queues, self.finished)
+        _publish(self.event_queues, None)
+        _publish(self.frame_queues, None)
\ No newline at end of file
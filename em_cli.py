@@ -0,0 +1,112 @@
+"""Headless command-line runner: assemble a program and run it without Qt.
+
+    python em_cli.py program.2b --cycles 1000 --break 5 --watch "RAM[40]"
+"""
+import time
+_START = time.perf_counter()
+
+import argparse
+import sys
+from em_core import Emulator
+from em_debug import parse_watchpoint, resolve_breakpoints, WatchpointSet, format_watch_hit
+from em_timing import TIMING_PROFILES
+from em_recorder import DisplayRecorder
+from em_framebuffer import get_geometry
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Run a Forgematrix program headless.")
+    parser.add_argument("program", help="Source file (.2b)")
+    parser.add_argument("--ram", type=int, default=64,
+                        help="RAM size in bytes (default 64; up to 65536, above 256 implies --wide)")
+    parser.add_argument("--wide", action="store_true", default=None,
+                        help="Wide address mode: 2-byte RAM addresses and jump targets")
+    parser.add_argument("--timing", default="legacy", choices=sorted(TIMING_PROFILES))
+    parser.add_argument("--display", default="4x4", type=get_geometry, metavar="WxH",
+                        help="Display size, e.g. 8x8 (default 4x4)")
+    parser.add_argument("--cycles", type=int, default=10000, help="Maximum cycles to run (default 10000)")
+    parser.add_argument("--break", dest="breakpoints", action="append", default=[], metavar="LINE[:COND]",
+                        help="Stop at a source line, optionally when a condition holds (e.g. 5:RAM[40]==3)")
+    parser.add_argument("--watch", action="append", default=[], metavar="SPEC",
+                        help="Watchpoint such as RAM[40], RAM[8:16] RW or SCRATCH[2] == 5")
+    parser.add_argument("--dump", action="store_true", help="Print RAM and scratchpad at the end")
+    parser.add_argument("--heatmap", metavar="FILE",
+                        help="Count reads/writes per address and save them as CSV, or JSON for *.json")
+    parser.add_argument("--record", metavar="FILE",
+                        help="Record the display as .gif, .png (APNG) or a binary frame stream (.fmxs)")
+    parser.add_argument("--hz", type=int, default=120, help="Clock rate used for recording delays (default 120)")
+    parser.add_argument("--timings", action="store_true", help="Report startup and run times on stderr")
+    parser.add_argument("--fuse", action="store_true",
+                        help="Execute common instruction pairs as superinstructions (byte address mode)")
+    return parser
+
+def main(argv=None, out=sys.stdout):
+    args = build_parser().parse_args(argv)
+    ready = time.perf_counter()
+
+    with open(args.program) as f:
+        code = f.read().split('\n')
+    try:
+        emulator = Emulator(None, ram_size=args.ram, timing=args.timing, geometry=args.display, wide=args.wide)
+    except ValueError as e:
+        print(f"Error: {e}", file=out)
+        return 2
+    if not emulator.parse_and_load_program(code):
+        print(emulator.error, file=out)
+        return 1
+
+    lines, conditions = set(), {}
+    try:
+        for spec in args.breakpoints:
+            line, _, condition = spec.partition(":")
+            lines.add(int(line))
+            if condition:
+                conditions[int(line)] = condition
+        breakpoints = resolve_breakpoints(emulator.pc_to_line, lines, conditions)
+        watchpoints = WatchpointSet(parse_watchpoint(spec) for spec in args.watch)
+    except ValueError as e:
+        print(f"Error: {e}", file=out)
+        return 2
+
+    if args.heatmap:
+        emulator.enable_heatmap()
+    if args.fuse:
+        emulator.enable_fusion()
+    recorder = DisplayRecorder.attach(emulator, hz=args.hz) if args.record else None
+    emulator.running = True
+    started = time.perf_counter()
+    emulator.run(args.cycles, breakpoints, watchpoints)
+    finished = time.perf_counter()
+
+    if emulator.error:
+        print(f"Error: {emulator.error} (PC {emulator.pc})", file=out)
+    elif emulator.watch_hit is not None:
+        print(format_watch_hit(emulator.watch_hit), file=out)
+    elif emulator.breakpoint_hit is not None:
+        print(f"Breakpoint at line {emulator.pc_to_line.get(emulator.pc)} (PC {emulator.pc})", file=out)
+    elif not emulator.running:
+        print(f"Halted at PC {emulator.pc}", file=out)
+    else:
+        print(f"Still running at PC {emulator.pc}", file=out)
+    print(f"Cycles: {emulator.cycles}", file=out)
+    for row in emulator.geometry.render_text(emulator.framebuffer):
+        print(row, file=out)
+
+    if args.dump:
+        for start in range(0, emulator.ram_size, 16):
+            print(f"{start:04X}: " + " ".join(f"{b:02X}" for b in emulator.ram[start:start + 16]), file=out)
+        print("Scratchpad: " + " ".join(f"{b:02X}" for b in emulator.scratchpad), file=out)
+
+    if args.heatmap:
+        emulator.heatmap.save(args.heatmap)
+    if recorder is not None:
+        recorder.finish()
+        recorder.save(args.record)
+
+    if args.timings:
+        print(f"startup {1000 * (ready - _START):.1f} ms, "
+              f"load {1000 * (started - ready):.1f} ms, "
+              f"run {1000 * (finished - started):.1f} ms", file=sys.stderr)
+    return 1 if emulator.error else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
@@ -22,4 +22,107 @@ NOT = 0x20
 SUB = 0x21
 SHL = 0x22
 SHR = 0x23
-EP = 0x24
\ No newline at end of file
+EP = 0x24
+SETMASK = 0x25
+CLEARMASK = 0x26
+TOGGLEMASK = 0x27
+LOADMASK = 0x28
+SETMASK_RAM = 0x29
+CLEARMASK_RAM = 0x2A
+TOGGLEMASK_RAM = 0x2B
+LOADMASK_RAM = 0x2C
+MEMCPY = 0x2D
+MEMSET = 0x2E
+SCRATCH_LOAD_BLOCK = 0x2F
+SCRATCH_COPY_BLOCK = 0x30
+ADDI = 0x31
+SUBI = 0x32
+ANDI = 0x33
+ORI = 0x34
+XORI = 0x35
+SHLI = 0x36
+SHRI = 0x37
+DJNZ = 0x38
+
+# Pixel mask instructions: the 16-bit mask is bit y*width+x, so it only
+# covers displays of at most MASK_PIXELS pixels (the default 4x4)
+MASK_OPCODES = (SETMASK, CLEARMASK, TOGGLEMASK, LOADMASK, SETMASK_RAM, CLEARMASK_RAM, TOGGLEMASK_RAM, LOADMASK_RAM)
+MASK_PIXELS = 16
+
+# Operand kinds used by the instruction table
+OPERAND_TARGET = "target"        # Jump target (RAM address)
+OPERAND_RAM_READ = "ram_read"    # RAM address that is read
+OPERAND_RAM_WRITE = "ram_write"  # RAM address that is written
+OPERAND_RAM_MODIFY = "ram_modify"  # RAM address that is read and written
+OPERAND_SCRATCH_READ = "scratch_read"
+OPERAND_SCRATCH_WRITE = "scratch_write"
+OPERAND_IMMEDIATE = "imm"        # Literal byte value
+OPERAND_PAIRS = "pairs"          # Count byte followed by x/y pairs
+OPERAND_MASK = "mask"            # 16-bit pixel mask, low byte first
+OPERAND_RAM_READ_WORD = "ram_read_word"  # RAM address of a 2-byte value
+OPERAND_COUNT = "count"          # Block length for the instruction's address operands
+
+# Encoded size of each operand kind in bytes (default 1)
+OPERAND_SIZES = {
+    OPERAND_MASK: 2,
+}
+
+# Wide address mode: RAM beyond 256 bytes. Address operands are 2 bytes,
+# low byte first; scratchpad addresses, immediates, counts and pixel
+# coordinates stay 1 byte.
+BYTE_ADDRESS_LIMIT = 0x100
+WIDE_ADDRESS_LIMIT = 0x10000
+WIDE_OPERAND_SIZES = dict(OPERAND_SIZES, **{
+    OPERAND_TARGET: 2,
+    OPERAND_RAM_READ: 2,
+    OPERAND_RAM_WRITE: 2,
+    OPERAND_RAM_MODIFY: 2,
+    OPERAND_RAM_READ_WORD: 2,
+})
+
+# Instruction table: opcode -> (mnemonic, operand kinds)
+INSTRUCTIONS = {
+    SET: ("SET", (OPERAND_PAIRS,)),
+    CLEAR: ("CLEAR", (OPERAND_PAIRS,)),
+    WAIT: ("WAIT", (OPERAND_IMMEDIATE,)),
+    LOOP: ("LOOP", ()),
+    STORE: ("STORE", (OPERAND_RAM_WRITE, OPERAND_IMMEDIATE)),
+    LOAD: ("LOAD", (OPERAND_RAM_READ,)),
+    JUMP: ("JUMP", (OPERAND_TARGET,)),
+    JUMPIF: ("JUMPIF", (OPERAND_TARGET, OPERAND_RAM_READ)),
+    ADD: ("ADD", (OPERAND_RAM_READ, OPERAND_RAM_READ, OPERAND_RAM_WRITE)),
+    SETALL: ("SETALL", ()),
+    SETNONE: ("SETNONE", ()),
+    SCRATCH_STORE: ("SCRATCH_STORE", (OPERAND_SCRATCH_WRITE, OPERAND_IMMEDIATE)),
+    SCRATCH_LOAD: ("SCRATCH_LOAD", (OPERAND_SCRATCH_READ, OPERAND_RAM_WRITE)),
+    SCRATCH_ADD: ("SCRATCH_ADD", (OPERAND_SCRATCH_READ, OPERAND_SCRATCH_READ, OPERAND_SCRATCH_WRITE)),
+    SCRATCH_COPY: ("SCRATCH_COPY", (OPERAND_RAM_READ, OPERAND_SCRATCH_WRITE)),
+    SCRATCH_JUMPIF: ("SCRATCH_JUMPIF", (OPERAND_TARGET, OPERAND_SCRATCH_READ)),
+    AND: ("AND", (OPERAND_RAM_READ, OPERAND_RAM_READ, OPERAND_RAM_WRITE)),
+    OR: ("OR", (OPERAND_RAM_READ, OPERAND_RAM_READ, OPERAND_RAM_WRITE)),
+    XOR: ("XOR", (OPERAND_RAM_READ, OPERAND_RAM_READ, OPERAND_RAM_WRITE)),
+    NOT: ("NOT", (OPERAND_RAM_READ, OPERAND_RAM_WRITE)),
+    SUB: ("SUB", (OPERAND_RAM_READ, OPERAND_RAM_READ, OPERAND_RAM_WRITE)),
+    SHL: ("SHL", (OPERAND_RAM_READ, OPERAND_RAM_WRITE)),
+    SHR: ("SHR", (OPERAND_RAM_READ, OPERAND_RAM_WRITE)),
+    SETMASK: ("SETMASK", (OPERAND_MASK,)),
+    CLEARMASK: ("CLEARMASK", (OPERAND_MASK,)),
+    TOGGLEMASK: ("TOGGLEMASK", (OPERAND_MASK,)),
+    LOADMASK: ("LOADMASK", (OPERAND_MASK,)),
+    SETMASK_RAM: ("SETMASK_RAM", (OPERAND_RAM_READ_WORD,)),
+    CLEARMASK_RAM: ("CLEARMASK_RAM", (OPERAND_RAM_READ_WORD,)),
+    TOGGLEMASK_RAM: ("TOGGLEMASK_RAM", (OPERAND_RAM_READ_WORD,)),
+    LOADMASK_RAM: ("LOADMASK_RAM", (OPERAND_RAM_READ_WORD,)),
+    MEMCPY: ("MEMCPY", (OPERAND_RAM_READ, OPERAND_RAM_WRITE, OPERAND_COUNT)),
+    MEMSET: ("MEMSET", (OPERAND_RAM_WRITE, OPERAND_IMMEDIATE, OPERAND_COUNT)),
+    SCRATCH_LOAD_BLOCK: ("SCRATCH_LOAD_BLOCK", (OPERAND_SCRATCH_READ, OPERAND_RAM_WRITE, OPERAND_COUNT)),
+    SCRATCH_COPY_BLOCK: ("SCRATCH_COPY_BLOCK", (OPERAND_RAM_READ, OPERAND_SCRATCH_WRITE, OPERAND_COUNT)),
+    ADDI: ("ADDI", (OPERAND_RAM_READ, OPERAND_IMMEDIATE, OPERAND_RAM_WRITE)),
+    SUBI: ("SUBI", (OPERAND_RAM_READ, OPERAND_IMMEDIATE, OPERAND_RAM_WRITE)),
+    ANDI: ("ANDI", (OPERAND_RAM_READ, OPERAND_IMMEDIATE, OPERAND_RAM_WRITE)),
+    ORI: ("ORI", (OPERAND_RAM_READ, OPERAND_IMMEDIATE, OPERAND_RAM_WRITE)),
+    XORI: ("XORI", (OPERAND_RAM_READ, OPERAND_IMMEDIATE, OPERAND_RAM_WRITE)),
+    SHLI: ("SHLI", (OPERAND_RAM_READ, OPERAND_IMMEDIATE, OPERAND_RAM_WRITE)),
+    SHRI: ("SHRI", (OPERAND_RAM_READ, OPERAND_IMMEDIATE, OPERAND_RAM_WRITE)),
+    DJNZ: ("DJNZ", (OPERAND_RAM_MODIFY, OPERAND_TARGET)),
+}
\ No newline at end of file
@@ -3,47 +3,263 @@ import pickle
 from em_constants import (
     SET, CLEAR, WAIT, LOOP, STORE, LOAD, JUMP, JUMPIF, ADD, SETALL, SETNONE,
     SCRATCH_STORE, SCRATCH_LOAD, SCRATCH_ADD, SCRATCH_COPY, SCRATCH_JUMPIF,
-    AND, OR, XOR, NOT, SUB, SHL, SHR
+    AND, OR, XOR, NOT, SUB, SHL, SHR,
+    SETMASK, CLEARMASK, TOGGLEMASK, LOADMASK,
+    SETMASK_RAM, CLEARMASK_RAM, TOGGLEMASK_RAM, LOADMASK_RAM,
+    MEMCPY, MEMSET, SCRATCH_LOAD_BLOCK, SCRATCH_COPY_BLOCK,
+    ADDI, SUBI, ANDI, ORI, XORI, SHLI, SHRI, DJNZ,
+    BYTE_ADDRESS_LIMIT, WIDE_ADDRESS_LIMIT
 )
 from em_parser import parse_and_load_program
-from em_instructions import step as execute_step
+from em_instructions import step as execute_step, step_wide
 from em_storage import save_scratchpad, load_scratchpad
+from em_disasm import disassemble
+from em_timing import get_timing
+from em_heatmap import AccessCounters
+from em_hooks import HookSet, EVENT_KINDS
+from em_fusion import FusionTable, run_fused
+from em_framebuffer import get_geometry
+
+ZERO_PAGE = memoryview(bytes(WIDE_ADDRESS_LIMIT))  # reset() zero-fills RAM from here without allocating
+
+def address_mode(ram_size, wide=None):
+    """Resolve wide (None picks the mode from ram_size); raises ValueError if ram_size does not fit"""
+    if wide is None:
+        wide = ram_size > BYTE_ADDRESS_LIMIT  # Only programs that need the room pay for 2-byte addresses
+    if not 0 < ram_size <= (WIDE_ADDRESS_LIMIT if wide else BYTE_ADDRESS_LIMIT):
+        raise ValueError(f"RAM size {ram_size} out of range for the {'wide' if wide else 'byte'} address mode")
+    return wide
 
 class Emulator:
-    def __init__(self, display, ram_size=64):  # Add ram_size parameter
+    def __init__(self, display, ram_size=64, timing="legacy", geometry=None, wide=None, scratchpad=None):  # Add ram_size parameter
+        wide = address_mode(ram_size, wide)
         self.pc = 0
         self.delay = 0
         self.display = display
         self.running = False
         self.ram_size = ram_size  # Use parameter
+        self.wide = wide  # Wide address mode: 2-byte address operands, up to 64 KB of RAM
+        self.step_function = step_wide if wide else execute_step
         self.ram = bytearray(self.ram_size)
         self.scratchpad_size = 8
-        self.scratchpad = bytearray(self.scratchpad_size)
         self.error = None
-        self.load_scratchpad()
+        if scratchpad is None:
+            self.scratchpad = bytearray(self.scratchpad_size)
+            self.load_scratchpad()
+        else:
+            self.scratchpad = scratchpad  # Used as is (e.g. shared between cores), scratchpad.dat is not read
         self.entry_point = 0
         self.active_delay = 0
+        self.pc_to_line = {}
+        self.instructions = None  # InstructionIndex for the loaded image
+        self.geometry = get_geometry(geometry)  # Display size, e.g. "8x8"
+        self.framebuffer = 0  # Pixel (x, y) is bit y*width+x
+        self.timing = get_timing(timing)
+        self.cycles = 0  # Cycles elapsed since reset
+        self.busy = 0    # Remaining cycles of the current multi-cycle instruction
+        self.breakpoint_hit = None  # PC of the breakpoint that stopped run()
+        self.watch_hit = None       # em_debug.WatchHit that stopped run()
+        self.hook_stop = False      # True when a hook asked run() to stop
+        self.heatmap = None         # AccessCounters while heatmap collection is on
+        self.fusion = None          # em_fusion.FusionTable while superinstructions are on
+        self.hooks = None           # em_hooks.HookSet while execution hooks are attached
+        self.metrics = None         # em_metrics.Metrics counting scratchpad flushes
 
     def parse_and_load_program(self, code):
         return parse_and_load_program(self, code)
 
+    def load_image(self, image, entry_point=0):
+        """Load a raw RAM image (no source) and index its instructions"""
+        if len(image) > self.ram_size:
+            self.error = "Image larger than RAM"
+            return False
+        if not 0 <= entry_point < self.ram_size:
+            self.error = "Entry point out of range"
+            return False
+        self.entry_point = entry_point
+        self.reset()
+        self.ram[:len(image)] = image
+        self.disassemble()
+        return True
+
+    def disassemble(self):
+        """Rebuild the instruction index from the current RAM contents"""
+        self.instructions = disassemble(self.ram, self.ram_size, self.entry_point, self.wide)
+        return self.instructions
+
+    def instruction_at(self, address=None):
+        """Decoded instruction at address (default: PC), or None"""
+        if self.instructions is None:
+            return None
+        if address is None:
+            address = self.pc
+        return self.instructions.at(address)
+
+    def set_timing(self, timing):
+        """Switch cycle cost model (profile name or TimingModel)"""
+        self.timing = get_timing(timing)
+
     def step(self):
-        execute_step(self)
+        if self.hooks is None:
+            self.step_function(self)
+        else:
+            self.run(1)  # Through the instrumented loop, so hooks see single steps
+
+    def run(self, cycles, breakpoints=None, watchpoints=None, resume=False):
+        """Execute up to cycles steps in a tight loop; returns steps executed.
+
+        Stops early when the program halts or errors, or when the PC is on
+        an address in breakpoints at an instruction boundary, including
+        before the first step. breakpoints is any container of addresses; if
+        it has a hit(emulator) method (see em_debug.BreakpointSet) that is
+        consulted before stopping, so conditional breakpoints cost nothing
+        until the PC matches. resume executes the instruction at the PC even
+        if it has a breakpoint, to continue from the breakpoint that stopped
+        the last run.
+
+        watchpoints (an em_debug.WatchpointSet) stops right after an
+        instruction touches a watched byte and records it in watch_hit.
+        Hooks (add_hook) receive their batched events and can stop the run
+        too. Without breakpoints, watchpoints, hooks or a heatmap no
+        per-step checks are made.
+        """
+        self.breakpoint_hit = None
+        self.watch_hit = None
+        self.hook_stop = False
+        step = self.step_function
+        executed = 0
+        counters = self.heatmap
+        hooks = self.hooks
+        if not breakpoints and not watchpoints and counters is None and hooks is None:
+            if self.fusion is not None and not self.wide:
+                return run_fused(self, cycles)
+            while executed < cycles and self.running:
+                step(self)
+                executed += 1
+            return executed
+
+        breakpoints = breakpoints or ()
+        hit = getattr(breakpoints, "hit", None)
+        if not resume and self.pc in breakpoints and self.busy == 0 and self.delay == 0:
+            if hit is None or hit(self):
+                self.breakpoint_hit = self.pc
+                return executed
+        before = watchpoints.before if watchpoints else None
+        while executed < cycles and self.running:
+            pending = None
+            observed = None
+            if self.busy == 0 and self.delay == 0:
+                if counters is not None:
+                    counters.record(self)
+                if before is not None:
+                    pending = before(self)
+                if hooks is not None:
+                    observed = hooks.before(self)
+            step(self)
+            executed += 1
+            if observed is not None and hooks.after(self, observed):
+                self.hook_stop = True
+                break
+            if pending is not None:
+                self.watch_hit = watchpoints.after(self, pending)
+                if self.watch_hit is not None:
+                    break
+            if self.pc in breakpoints and self.busy == 0 and self.delay == 0:
+                if hit is None or hit(self):
+                    self.breakpoint_hit = self.pc
+                    break
+        if hooks is not None and hooks.flush():
+            self.hook_stop = True
+        return executed
+
+    def skip_idle(self, max_cycles):
+        """Fast-forward through pending busy and WAIT cycles, at most max_cycles.
+
+        Equivalent to calling step() while the core is only counting down,
+        without executing the cycles one by one. Returns the cycles skipped.
+        """
+        busy = min(self.busy, max_cycles)
+        self.busy -= busy
+        delay = min(self.delay, max_cycles - busy)
+        if delay:
+            self.delay -= delay
+            if self.delay == 0:
+                self.active_delay = 0
+        self.cycles += busy + delay
+        return busy + delay
+
+    def enable_fusion(self, enabled=True):
+        """Execute common instruction pairs as superinstructions in run() (see em_fusion)"""
+        self.fusion = FusionTable() if enabled else None
+
+    def add_hook(self, hook, kinds=EVENT_KINDS, batch=None):
+        """Call hook(kind, events) with batches of execution events of the given kinds (see em_hooks)"""
+        if self.hooks is None:
+            self.hooks = HookSet() if batch is None else HookSet(batch)
+        elif batch is not None:
+            self.hooks.batch = batch
+        return self.hooks.add(hook, kinds)
+
+    def remove_hook(self, hook):
+        """Detach hook; without hooks run() is back on its uninstrumented loop"""
+        if self.hooks is not None:
+            self.hooks.flush()
+            self.hooks.remove(hook)
+            if not self.hooks:
+                self.hooks = None
+
+    def enable_heatmap(self, enabled=True):
+        """Start (with fresh counters) or stop counting reads/writes per address"""
+        self.heatmap = AccessCounters(self.ram_size, self.scratchpad_size) if enabled else None
 
     def save_scratchpad(self):
+        if self.metrics is not None:
+            self.metrics.scratchpad_flushes.inc()
         save_scratchpad(self)
 
     def load_scratchpad(self):
         load_scratchpad(self)
 
+    def resize(self, ram_size, geometry=None, wide=None):
+        """Change the RAM size (and display size) in place, keeping the scratchpad in memory.
+
+        The program is cleared as by reset(); RAM is resized without
+        reallocating and scratchpad.dat is not read again.
+        """
+        wide = address_mode(ram_size, wide)
+        if ram_size > len(self.ram):
+            self.ram.extend(ZERO_PAGE[:ram_size - len(self.ram)])
+        else:
+            del self.ram[ram_size:]
+        self.ram_size = ram_size
+        self.wide = wide
+        self.step_function = step_wide if wide else execute_step
+        if geometry is not None:
+            self.geometry = get_geometry(geometry)
+        self.entry_point = 0
+        if self.heatmap is not None:
+            self.enable_heatmap()  # Counters sized for the new RAM
+        self.reset()
+
     def reset(self):
         self.pc = self.entry_point
         self.delay = 0
-        self.ram = bytearray(self.ram_size)
-        self.display.clear_all()
+        self.active_delay = 0
+        self.cycles = 0
+        self.busy = 0
+        self.ram[:] = ZERO_PAGE[:self.ram_size]
+        self.framebuffer = 0
+        if self.display is not None:
+            self.display.clear_all()
         self.running = False
         self.error = None
+        self.breakpoint_hit = None
+        self.watch_hit = None
+        self.hook_stop = False
+        if self.heatmap is not None:
+            self.heatmap.clear()
         self.pc_to_line = {}
+        self.instructions = None
 
     # Assign constants from em_constants
     SET = SET
@@ -68,4 +284,24 @@ class Emulator:
     NOT = NOT
     SUB = SUB
     SHL = SHL
-    SHR = SHR
\ No newline at end of file
+    SHR = SHR
+    SETMASK = SETMASK
+    CLEARMASK = CLEARMASK
+    TOGGLEMASK = TOGGLEMASK
+    LOADMASK = LOADMASK
+    SETMASK_RAM = SETMASK_RAM
+    CLEARMASK_RAM = CLEARMASK_RAM
+    TOGGLEMASK_RAM = TOGGLEMASK_RAM
+    LOADMASK_RAM = LOADMASK_RAM
+    MEMCPY = MEMCPY
+    MEMSET = MEMSET
+    SCRATCH_LOAD_BLOCK = SCRATCH_LOAD_BLOCK
+    SCRATCH_COPY_BLOCK = SCRATCH_COPY_BLOCK
+    ADDI = ADDI
+    SUBI = SUBI
+    ANDI = ANDI
+    ORI = ORI
+    XORI = XORI
+    SHLI = SHLI
+    SHRI = SHRI
+    DJNZ = DJNZ
\ No newline at end of file
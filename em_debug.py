@@ -0,0 +1,250 @@
+import operator
+import re
+from collections import namedtuple
+from em_disasm import decode, memory_accesses
+
+CONDITION_OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+_CONDITION_RE = re.compile(
+    r"^\s*(RAM|SCRATCH|S)\s*\[\s*(\w+)\s*\]\s*(?:(==|!=|<=|>=|<|>)\s*(\w+))?\s*$",
+    re.IGNORECASE)
+
+class Condition:
+    """A test on one RAM or scratchpad byte, e.g. RAM[10] == 5"""
+    def __init__(self, space, address, op="!=", value=0):
+        if space not in ("ram", "scratch"):
+            raise ValueError(f"Unknown memory space: {space}")
+        if op not in CONDITION_OPERATORS:
+            raise ValueError(f"Unknown comparison: {op}")
+        self.space = space
+        self.address = address
+        self.op = op
+        self.value = value
+        self._compare = CONDITION_OPERATORS[op]
+
+    def holds(self, emulator):
+        memory = emulator.ram if self.space == "ram" else emulator.scratchpad
+        if not 0 <= self.address < len(memory):
+            return False
+        return self._compare(memory[self.address], self.value)
+
+    def __repr__(self):
+        space = "RAM" if self.space == "ram" else "SCRATCH"
+        return f"{space}[{self.address}] {self.op} {self.value}"
+
+def parse_condition(text):
+    """Parse 'RAM[a] op v' or 'SCRATCH[s] op v' (S[s] for short); a bare RAM[a] means != 0"""
+    match = _CONDITION_RE.match(text)
+    if not match:
+        raise ValueError(f"Invalid breakpoint condition: {text!r}")
+    space, address, op, value = match.groups()
+    space = "ram" if space.upper() == "RAM" else "scratch"
+    if op is None:
+        return Condition(space, int(address, 0))
+    return Condition(space, int(address, 0), op, int(value, 0))
+
+def line_addresses(pc_to_line):
+    """Invert pc_to_line into line -> sorted list of instruction addresses"""
+    lines = {}
+    for address, line in pc_to_line.items():
+        lines.setdefault(line, []).append(address)
+    for addresses in lines.values():
+        addresses.sort()
+    return lines
+
+class BreakpointSet:
+    """Instruction addresses to stop at, with optional conditions.
+
+    Membership (pc in breakpoints) is a plain set lookup so execution loops
+    can test it every step; hit() is only called once the PC matches.
+    """
+    def __init__(self, addresses=()):
+        self.addresses = set(addresses)
+        self.conditions = {}  # address -> Condition
+        self.lines = {}       # address -> source line, for reporting
+
+    def add(self, address, condition=None, line=None):
+        self.addresses.add(address)
+        if condition is not None:
+            self.conditions[address] = condition
+        else:
+            self.conditions.pop(address, None)
+        if line is not None:
+            self.lines[address] = line
+
+    def remove(self, address):
+        self.addresses.discard(address)
+        self.conditions.pop(address, None)
+        self.lines.pop(address, None)
+
+    def __contains__(self, address):
+        return address in self.addresses
+
+    def __len__(self):
+        return len(self.addresses)
+
+    def __iter__(self):
+        return iter(sorted(self.addresses))
+
+    def hit(self, emulator):
+        """True if the breakpoint at the current PC should stop execution"""
+        condition = self.conditions.get(emulator.pc)
+        return condition is None or condition.holds(emulator)
+
+def resolve_breakpoints(pc_to_line, lines, conditions=None):
+    """Build a BreakpointSet from source line numbers.
+
+    A line without code (blank, comment, EP) resolves to the next line that
+    has an instruction. conditions maps line -> Condition or condition text.
+    """
+    by_line = line_addresses(pc_to_line)
+    code_lines = sorted(by_line)
+    conditions = conditions or {}
+    breakpoints = BreakpointSet()
+    for line in lines:
+        target = next((code_line for code_line in code_lines if code_line >= line), None)
+        if target is None:
+            continue
+        condition = conditions.get(line)
+        if isinstance(condition, str):
+            condition = parse_condition(condition)
+        # Only the first address of a line: execution enters the line there
+        breakpoints.add(by_line[target][0], condition, line)
+    return breakpoints
+
+
+WATCH_READ = 1
+WATCH_WRITE = 2
+
+WatchHit = namedtuple("WatchHit", "pc line space address kind old new")
+
+_WATCH_RE = re.compile(
+    r"^\s*(RAM|SCRATCH|S)\s*\[\s*(\w+)\s*(?::\s*(\w+)\s*)?\]"
+    r"\s*(?:(RW|R|W)|(==|!=|<=|>=|<|>)\s*(\w+))?\s*$",
+    re.IGNORECASE)
+
+class Watchpoint:
+    """Watch the RAM or scratchpad bytes start..end-1 for reads and/or writes.
+
+    With a condition (op, value) only writes that leave a byte satisfying it
+    count as a hit, e.g. stop when RAM[40] becomes 5.
+    """
+    def __init__(self, space, start, end=None, read=False, write=True, op=None, value=0):
+        if space not in ("ram", "scratch"):
+            raise ValueError(f"Unknown memory space: {space}")
+        if op is not None and op not in CONDITION_OPERATORS:
+            raise ValueError(f"Unknown comparison: {op}")
+        self.space = space
+        self.start = start
+        self.end = start + 1 if end is None else end
+        self.read = read
+        self.write = write or op is not None
+        self.op = op
+        self.value = value
+        self._compare = CONDITION_OPERATORS.get(op)
+
+    def matches(self, space, kind, address, new):
+        if space != self.space or not self.start <= address < self.end:
+            return False
+        if kind == "read":
+            return self.read
+        if not self.write:
+            return False
+        return self._compare is None or self._compare(new, self.value)
+
+    def __repr__(self):
+        space = "RAM" if self.space == "ram" else "SCRATCH"
+        where = f"{space}[{self.start}]" if self.end == self.start + 1 else f"{space}[{self.start}:{self.end}]"
+        if self.op is not None:
+            return f"{where} {self.op} {self.value}"
+        return f"{where} {'R' if self.read else ''}{'W' if self.write else ''}"
+
+def parse_watchpoint(text):
+    """Parse RAM[a], RAM[a:b] or SCRATCH[s] followed by R, W, RW or a condition like == 5.
+
+    Without a suffix the watchpoint stops on writes.
+    """
+    match = _WATCH_RE.match(text)
+    if not match:
+        raise ValueError(f"Invalid watchpoint: {text!r}")
+    space, start, end, access, op, value = match.groups()
+    space = "ram" if space.upper() == "RAM" else "scratch"
+    start = int(start, 0)
+    end = int(end, 0) if end is not None else None
+    if end is not None and end <= start:
+        raise ValueError(f"Empty watchpoint range: {text!r}")
+    if op is not None:
+        return Watchpoint(space, start, end, op=op, value=int(value, 0))
+    access = (access or "W").upper()
+    return Watchpoint(space, start, end, read="R" in access, write="W" in access)
+
+class WatchpointSet:
+    """Watchpoints plus a per-address flag bitmap for each memory space.
+
+    Emulator.run() only takes the instrumented path when a WatchpointSet is
+    non-empty. Before each instruction, before() decodes it and looks its
+    data accesses up in the bitmap; only when a watched byte is touched does
+    it remember the old values so after() can report the change.
+    """
+    def __init__(self, watchpoints=()):
+        self.watchpoints = []
+        self.flags = {"ram": bytearray(), "scratch": bytearray()}
+        for watchpoint in watchpoints:
+            self.add(watchpoint)
+
+    def add(self, watchpoint):
+        flags = self.flags[watchpoint.space]
+        if len(flags) < watchpoint.end:
+            flags.extend(bytes(watchpoint.end - len(flags)))
+        bits = (WATCH_READ if watchpoint.read else 0) | (WATCH_WRITE if watchpoint.write else 0)
+        for address in range(watchpoint.start, watchpoint.end):
+            flags[address] |= bits
+        self.watchpoints.append(watchpoint)
+        return watchpoint
+
+    def __len__(self):
+        return len(self.watchpoints)
+
+    def __iter__(self):
+        return iter(self.watchpoints)
+
+    def before(self, emulator):
+        """Watched accesses the instruction at PC is about to make, or None"""
+        instruction = decode(emulator.ram, emulator.pc, emulator.ram_size, emulator.wide)
+        if instruction is None:
+            return None
+        pending = []
+        for space, kind, start, end in memory_accesses(instruction):
+            flags = self.flags[space]
+            bit = WATCH_READ if kind == "read" else WATCH_WRITE
+            memory = emulator.ram if space == "ram" else emulator.scratchpad
+            for address in range(start, min(end, len(flags), len(memory))):
+                if flags[address] & bit:
+                    pending.append((space, kind, address, memory[address]))
+        return (emulator.pc, pending) if pending else None
+
+    def after(self, emulator, pending):
+        """WatchHit for the first watchpoint the executed instruction triggered, or None"""
+        pc, accesses = pending
+        for space, kind, address, old in accesses:
+            memory = emulator.ram if space == "ram" else emulator.scratchpad
+            new = memory[address]
+            for watchpoint in self.watchpoints:
+                if watchpoint.matches(space, kind, address, new):
+                    return WatchHit(pc, emulator.pc_to_line.get(pc), space, address, kind, old, new)
+        return None
+
+def format_watch_hit(hit):
+    """One-line description of a WatchHit for status bars and logs"""
+    space = "RAM" if hit.space == "ram" else "SCRATCH"
+    where = f"PC {hit.pc}" if hit.line is None else f"PC {hit.pc} (line {hit.line})"
+    if hit.kind == "read":
+        return f"Watchpoint: {space}[{hit.address}] read ({hit.new}) at {where}"
+    return f"Watchpoint: {space}[{hit.address}] written {hit.old} -> {hit.new} at {where}"
\ No newline at end of file
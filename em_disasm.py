@@ -0,0 +1,317 @@
+from collections import namedtuple
+from functools import lru_cache
+from em_constants import (
+    INSTRUCTIONS, OPERAND_PAIRS, OPERAND_MASK, OPERAND_SIZES, WIDE_OPERAND_SIZES, OPERAND_COUNT,
+    OPERAND_RAM_READ, OPERAND_RAM_WRITE, OPERAND_RAM_MODIFY, OPERAND_RAM_READ_WORD,
+    OPERAND_SCRATCH_READ, OPERAND_SCRATCH_WRITE,
+    LOOP, JUMP, JUMPIF, SCRATCH_JUMPIF, DJNZ
+)
+
+# One decoded instruction. operands holds one value per operand (16-bit
+# masks are combined), except for SET/CLEAR where it holds (x, y) pairs.
+Instruction = namedtuple("Instruction", "address opcode name operands length")
+
+HALT = "HALT"  # Pseudo-mnemonic for the 0x00 byte that stops execution
+
+
+@lru_cache(maxsize=None)
+def instruction_length(opcode, wide=False):
+    """Encoded length of the instruction (SET/CLEAR: opcode and count, without the pairs)"""
+    kinds = INSTRUCTIONS[opcode][1]
+    if kinds == (OPERAND_PAIRS,):
+        return 2
+    sizes = WIDE_OPERAND_SIZES if wide else OPERAND_SIZES
+    return 1 + sum(sizes.get(kind, 1) for kind in kinds)
+
+
+def decode(ram, address, ram_size=None, wide=False):
+    """Decode the instruction at address, or return None if it is invalid or truncated.
+
+    wide selects the wide address mode, where address operands take 2 bytes.
+    """
+    if ram_size is None:
+        ram_size = len(ram)
+    if not 0 <= address < ram_size:
+        return None
+
+    opcode = ram[address]
+    if opcode == 0:
+        return Instruction(address, 0, HALT, (), 1)
+
+    entry = INSTRUCTIONS.get(opcode)
+    if entry is None:
+        return None
+    name, kinds = entry
+
+    if kinds == (OPERAND_PAIRS,):
+        if address + 1 >= ram_size:
+            return None
+        count = ram[address + 1]
+        length = 2 + 2 * count
+        if address + length > ram_size:
+            return None
+        pairs = tuple((ram[address + 2 + 2 * i], ram[address + 3 + 2 * i]) for i in range(count))
+        return Instruction(address, opcode, name, pairs, length)
+
+    length = instruction_length(opcode, wide)
+    if address + length > ram_size:
+        return None
+    sizes = WIDE_OPERAND_SIZES if wide else OPERAND_SIZES
+    operands = []
+    ptr = address + 1
+    for kind in kinds:
+        if sizes.get(kind, 1) == 2:
+            operands.append(ram[ptr] | (ram[ptr + 1] << 8))
+            ptr += 2
+        else:
+            operands.append(ram[ptr])
+            ptr += 1
+    return Instruction(address, opcode, name, tuple(operands), length)
+
+
+def changed_ranges(old, new):
+    """List of (start, end) ranges where two equal-length buffers differ"""
+    if old == new:
+        return []
+    ranges = []
+    size = min(len(old), len(new))
+    addr = 0
+    while addr < size:
+        if not addr % 64 and old[addr:addr + 64] == new[addr:addr + 64]:
+            addr += 64  # Whole unchanged block; keeps 64 KB images cheap to diff
+            continue
+        if old[addr] == new[addr]:
+            addr += 1
+            continue
+        end = addr + 1
+        while end < size and old[end] != new[end]:
+            end += 1
+        ranges.append((addr, end))
+        addr = end
+    if len(old) != len(new):
+        ranges.append((size, max(len(old), len(new))))
+    return ranges
+
+
+def successors(instruction, entry_point):
+    """Addresses control can reach after executing instruction"""
+    opcode = instruction.opcode
+    if opcode == 0:
+        return ()
+    if opcode == LOOP:
+        return (entry_point,)
+    if opcode == JUMP:
+        return (instruction.operands[0],)
+    if opcode in (JUMPIF, SCRATCH_JUMPIF):
+        return (instruction.operands[0], instruction.address + instruction.length)
+    if opcode == DJNZ:
+        return (instruction.operands[1], instruction.address + instruction.length)
+    return (instruction.address + instruction.length,)
+
+
+def memory_accesses(instruction):
+    """Data accesses the instruction makes, as (space, kind, start, end) tuples.
+
+    space is "ram" or "scratch", kind is "read" or "write". Block
+    instructions cover count bytes from each address operand.
+    """
+    if instruction.opcode == 0:
+        return []
+    kinds = INSTRUCTIONS[instruction.opcode][1]
+    count = 1
+    if OPERAND_COUNT in kinds:
+        count = instruction.operands[kinds.index(OPERAND_COUNT)]
+    accesses = []
+    for kind, value in zip(kinds, instruction.operands):
+        if kind == OPERAND_RAM_READ:
+            accesses.append(("ram", "read", value, value + count))
+        elif kind == OPERAND_RAM_WRITE:
+            accesses.append(("ram", "write", value, value + count))
+        elif kind == OPERAND_RAM_MODIFY:
+            accesses.append(("ram", "read", value, value + 1))
+            accesses.append(("ram", "write", value, value + 1))
+        elif kind == OPERAND_RAM_READ_WORD:
+            accesses.append(("ram", "read", value, value + 2))
+        elif kind == OPERAND_SCRATCH_READ:
+            accesses.append(("scratch", "read", value, value + count))
+        elif kind == OPERAND_SCRATCH_WRITE:
+            accesses.append(("scratch", "write", value, value + count))
+    return accesses
+
+
+def format_instruction(instruction):
+    """Render a decoded instruction in assembler syntax"""
+    if instruction.opcode != 0 and INSTRUCTIONS[instruction.opcode][1] == (OPERAND_PAIRS,):
+        return f"{instruction.name} " + ", ".join(f"{x} {y}" for x, y in instruction.operands)
+    if instruction.opcode != 0 and INSTRUCTIONS[instruction.opcode][1] == (OPERAND_MASK,):
+        return f"{instruction.name} 0x{instruction.operands[0]:04X}"
+    return " ".join([instruction.name] + [str(op) for op in instruction.operands])
+
+
+class InstructionIndex:
+    """Address -> Instruction map built by recursive traversal plus a linear sweep.
+
+    Addresses reached from the entry point are decoded by following control
+    flow; bytes that traversal never reaches are swept linearly so data-only
+    regions and dead code still get an entry where they decode cleanly.
+
+    update() keeps the index equal to a fresh disassemble() of the same RAM.
+    Reachability is traced again from the entry point when a write touches
+    reachable code or a jump target that did not decode; the sweep is redone
+    from the changed bytes until it falls back into step with the old one.
+    """
+
+    def __init__(self, ram, ram_size=None, entry_point=0, wide=False):
+        self.ram = ram
+        self.ram_size = len(ram) if ram_size is None else ram_size
+        self.entry_point = entry_point
+        self.wide = wide
+        self.instructions = {}
+        self.reachable = set()
+        self._dead = set()  # Reached addresses that do not decode
+        self._covered = [0] * self.ram_size  # byte -> reachable instructions covering it
+        self._swept = [-1] * self.ram_size   # byte -> start of the swept instruction covering it
+        self._image = bytes(ram[:self.ram_size])
+        regions = self._retrace()
+        self._resweep(regions + [(0, self.ram_size)])
+
+    def at(self, address):
+        """Instruction starting at address, or None"""
+        return self.instructions.get(address)
+
+    def __len__(self):
+        return len(self.instructions)
+
+    def __iter__(self):
+        for address in sorted(self.instructions):
+            yield self.instructions[address]
+
+    def _trace(self, stale=None):
+        """Instructions reachable from the entry point and the reached addresses that do not decode.
+
+        Decoded instructions are reused unless they overlap the range stale.
+        """
+        found = {}
+        dead = set()
+        worklist = [self.entry_point]
+        while worklist:
+            address = worklist.pop()
+            if address in found or address in dead or not 0 <= address < self.ram_size:
+                continue
+            instruction = self.instructions.get(address)
+            if instruction is None or (stale is not None and address < stale[1]
+                                       and address + instruction.length > stale[0]):
+                instruction = decode(self.ram, address, self.ram_size, self.wide)
+                if instruction is None:
+                    dead.add(address)
+                    continue
+            found[address] = instruction
+            worklist.extend(successors(instruction, self.entry_point))
+        return found, dead
+
+    def _retrace(self, stale=None):
+        """Bring the reachable instructions up to date; returns the byte ranges whose coverage changed"""
+        found, self._dead = self._trace(stale)
+        regions = []
+        for address in list(self.reachable):
+            instruction = self.instructions[address]
+            if found.get(address) != instruction:
+                self.reachable.discard(address)
+                del self.instructions[address]
+                self._cover(instruction, -1)
+                regions.append((address, address + instruction.length))
+        for address, instruction in found.items():
+            if address in self.reachable:
+                continue
+            if self._swept[address] == address:
+                regions.append((address, self._unsweep(address)))
+            self.reachable.add(address)
+            self.instructions[address] = instruction
+            self._cover(instruction, 1)
+            regions.append((address, address + instruction.length))
+        return regions
+
+    def _cover(self, instruction, delta):
+        covered = self._covered
+        for addr in range(instruction.address, instruction.address + instruction.length):
+            covered[addr] += delta
+
+    def _unsweep(self, address):
+        """Drop the swept instruction at address; returns its end"""
+        instruction = self.instructions.pop(address)
+        end = address + instruction.length
+        self._swept[address:end] = [-1] * instruction.length
+        return end
+
+    def _resweep(self, regions):
+        """Redo the linear sweep over regions whose bytes or coverage changed.
+
+        The old sweep examined every byte except the interiors of its own
+        instructions, so once the new sweep is past the changed bytes at a
+        byte the old one also examined, the rest of the sweep is unchanged.
+        """
+        ram, size = self.ram, self.ram_size
+        covered, swept = self._covered, self._swept
+        regions = sorted((max(lo, 0), min(hi, size)) for lo, hi in regions if lo < hi)
+        i = 0
+        while i < len(regions):
+            lo, hi = regions[i]
+            if lo >= size:
+                break
+            if swept[lo] != -1:
+                lo = swept[lo]  # Start where the old sweep examined a byte
+            old_end = 0  # End of the old swept instructions dropped so far
+            address = lo
+            while address < size:
+                while i + 1 < len(regions) and regions[i + 1][0] <= address:
+                    i += 1
+                    hi = max(hi, regions[i][1])
+                if address >= hi and address >= old_end and swept[address] in (-1, address):
+                    break
+                if swept[address] == address:
+                    old_end = max(old_end, self._unsweep(address))
+                if covered[address] or ram[address] == 0:
+                    address += 1
+                    continue
+                instruction = decode(ram, address, size, self.wide)
+                if instruction is None:
+                    address += 1
+                    continue
+                end = address + instruction.length
+                for addr in range(address + 1, end):
+                    if swept[addr] != -1:
+                        old_end = max(old_end, self._unsweep(swept[addr]))
+                self.instructions[address] = instruction
+                swept[address:end] = [address] * instruction.length
+                address = end
+            i += 1
+
+    def update(self, start, end=None):
+        """Re-decode after RAM[start:end] was written"""
+        if end is None:
+            end = start + 1
+        start = max(start, 0)
+        end = min(end, self.ram_size)
+        if start >= end:
+            return
+        self._image = bytes(self.ram[:self.ram_size])
+        # Whether an address fails to decode depends only on its opcode and, for SET/CLEAR, the count after it
+        regions = [(start - 1, end)]
+        # Control flow only changes if reachable code, or a target that did not decode, was written
+        if any(self._covered[start:end]) or any(start - 1 <= address < end for address in self._dead):
+            regions += self._retrace((start, end))
+        self._resweep(regions)
+
+    def sync(self, ram=None):
+        """Pick up any writes since the last update; returns True if RAM changed"""
+        if ram is not None:
+            self.ram = ram
+        ranges = changed_ranges(self._image, self.ram[:self.ram_size])
+        for start, end in ranges:
+            self.update(start, end)
+        return bool(ranges)
+
+
+def disassemble(ram, ram_size=None, entry_point=0, wide=False):
+    """Build an InstructionIndex for a RAM image"""
+    return InstructionIndex(ram, ram_size, entry_point, wide)
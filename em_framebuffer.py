@@ -0,0 +1,60 @@
+class DisplayGeometry:
+    """Size of the LED matrix and operations on its packed framebuffer.
+
+    A frame is a Python int used as a bit plane: pixel (x, y) is bit
+    y*width + x, so row y is the width-bit field starting at bit y*width.
+    Whole-row and whole-frame updates are single shifts and masks instead
+    of per-pixel loops.
+    """
+    def __init__(self, width=4, height=4):
+        if not (1 <= width <= 256 and 1 <= height <= 256):
+            raise ValueError(f"Unsupported display size {width}x{height}")
+        self.width = width
+        self.height = height
+        self.pixels = width * height
+        self.row_mask = (1 << width) - 1
+        self.full = (1 << self.pixels) - 1  # Every pixel lit
+
+    def contains(self, x, y):
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def bit(self, x, y):
+        return 1 << (y * self.width + x)
+
+    def row(self, frame, y):
+        """Row y of frame as a width-bit int (bit x = pixel x)"""
+        return (frame >> (y * self.width)) & self.row_mask
+
+    def rows(self, frame):
+        return [self.row(frame, y) for y in range(self.height)]
+
+    def render_text(self, frame, on="#", off="."):
+        """Frame as text rows, one character per pixel"""
+        return ["".join(on if bits >> x & 1 else off for x in range(self.width))
+                for bits in self.rows(frame)]
+
+    def __eq__(self, other):
+        return isinstance(other, DisplayGeometry) and (self.width, self.height) == (other.width, other.height)
+
+    def __hash__(self):
+        return hash((self.width, self.height))
+
+    def __repr__(self):
+        return f"DisplayGeometry({self.width}, {self.height})"
+
+DEFAULT_GEOMETRY = DisplayGeometry(4, 4)
+
+def get_geometry(geometry):
+    """Resolve None, 'WxH', (width, height) or a DisplayGeometry to a DisplayGeometry"""
+    if geometry is None:
+        return DEFAULT_GEOMETRY
+    if isinstance(geometry, DisplayGeometry):
+        return geometry
+    if isinstance(geometry, str):
+        try:
+            width, height = (int(part) for part in geometry.lower().split("x"))
+        except ValueError:
+            raise ValueError(f"Invalid display size: {geometry!r} (expected WIDTHxHEIGHT)")
+        return DisplayGeometry(width, height)
+    width, height = geometry
+    return DisplayGeometry(width, height)
\ No newline at end of file
@@ -0,0 +1,249 @@
+"""Superinstructions: common instruction pairs executed by one fused handler.
+
+run_fused() is Emulator.run()'s loop for the byte address mode with one
+change: when the PC is at the first instruction of a fused pair (see
+FUSED_PAIRS) both instructions run from a single dispatch. Each half
+still does exactly what step() does, cycle accounting included: the first
+instruction's busy cycles are added before the second starts, and the
+pair is only fused when the batch has room for all of them, so state at
+the end of run() is identical to stepping. Busy and WAIT cycles are
+fast-forwarded with Emulator.skip_idle() rather than stepped one by one.
+
+Pairs are found in the InstructionIndex of the loaded image. Operands are
+read from RAM when the pair executes and both opcodes are checked first,
+so self-modifying code is handled: a pair whose opcodes were overwritten
+is dropped from the table (de-fused) and runs through step() again.
+Anything unusual (an instruction that would fail, PC at the end of RAM)
+also goes through step(), which reports the error exactly as always.
+
+    python em_fusion.py em_examples.2b --cycles 10000
+
+prints how often each instruction pair executes in a corpus (programs
+separated by blank lines), to find the pairs worth fusing.
+"""
+import argparse
+import sys
+from collections import Counter
+from em_constants import INSTRUCTIONS, SET, CLEAR, WAIT, STORE, SUB, JUMPIF
+from em_instructions import step, present
+
+FUSED_PAIRS = ((STORE, STORE), (SET, WAIT), (SUB, JUMPIF), (CLEAR, SET))
+
+# Executors: step() for one instruction at the start of its first cycle, or
+# False without touching any state if it would fail
+
+def _store(emulator, ram, pc):
+    size = emulator.ram_size
+    if pc + 2 >= size or ram[pc + 1] >= size:
+        return False
+    emulator.cycles += 1
+    emulator.busy = emulator.timing.extra_cycles(ram, pc, STORE)
+    ram[ram[pc + 1]] = ram[pc + 2]
+    emulator.pc = pc + 3
+    return True
+
+def _wait(emulator, ram, pc):
+    if pc + 1 >= emulator.ram_size:
+        return False
+    emulator.cycles += 1
+    emulator.busy = emulator.timing.extra_cycles(ram, pc, WAIT)
+    emulator.delay = emulator.active_delay = ram[pc + 1]
+    emulator.pc = pc + 2
+    return True
+
+def _sub(emulator, ram, pc):
+    size = emulator.ram_size
+    if pc + 3 >= size:
+        return False
+    addr1, addr2, addr_result = ram[pc + 1], ram[pc + 2], ram[pc + 3]
+    if addr1 >= size or addr2 >= size or addr_result >= size:
+        return False
+    emulator.cycles += 1
+    emulator.busy = emulator.timing.extra_cycles(ram, pc, SUB)
+    ram[addr_result] = (ram[addr1] - ram[addr2]) & 0xFF
+    emulator.pc = pc + 4
+    return True
+
+def _jumpif(emulator, ram, pc):
+    size = emulator.ram_size
+    if pc + 2 >= size:
+        return False
+    addr, ram_addr = ram[pc + 1], ram[pc + 2]
+    if addr >= size or ram_addr >= size:
+        return False
+    emulator.cycles += 1
+    emulator.busy = emulator.timing.extra_cycles(ram, pc, JUMPIF)
+    emulator.pc = addr if ram[ram_addr] > 0 else pc + 3
+    return True
+
+def _pairs(opcode):
+    """SET/CLEAR executor"""
+    state = opcode == SET
+    def execute(emulator, ram, pc):
+        if pc + 1 >= emulator.ram_size:
+            return False
+        end = pc + 2 + 2 * ram[pc + 1]
+        if end > emulator.ram_size:
+            return False
+        width, height = emulator.geometry.width, emulator.geometry.height
+        frame = emulator.framebuffer
+        for addr in range(pc + 2, end, 2):
+            x, y = ram[addr], ram[addr + 1]
+            if x >= width or y >= height:
+                return False
+            if state:
+                frame |= 1 << (y * width + x)
+            else:
+                frame &= ~(1 << (y * width + x))
+        emulator.cycles += 1
+        emulator.busy = emulator.timing.extra_cycles(ram, pc, opcode)
+        if frame != emulator.framebuffer:
+            present(emulator, frame)
+        emulator.pc = end
+        return True
+    return execute
+
+EXECUTORS = {STORE: _store, WAIT: _wait, SUB: _sub, JUMPIF: _jumpif, SET: _pairs(SET), CLEAR: _pairs(CLEAR)}
+
+class FusionTable:
+    """Fused pairs of the loaded image: address of the first instruction -> (opcode, executor, opcode, executor)"""
+    def __init__(self, pairs=FUSED_PAIRS):
+        self.pairs = frozenset(pairs)
+        self.table = {}
+        self.instructions = None  # InstructionIndex the table was built from
+        self.defused = 0          # Pairs dropped because the code was overwritten
+
+    def rebuild(self, instructions):
+        self.instructions = instructions
+        self.table = {}
+        if instructions is None:
+            return
+        for first in instructions:
+            second = instructions.at(first.address + first.length)
+            if second is not None and (first.opcode, second.opcode) in self.pairs:
+                self.table[first.address] = (first.opcode, EXECUTORS[first.opcode],
+                                             second.opcode, EXECUTORS[second.opcode])
+
+def run_fused(emulator, cycles):
+    """Emulator.run() without breakpoints/watchpoints/heatmap, executing fused pairs in one dispatch"""
+    fusion = emulator.fusion
+    if fusion.instructions is not emulator.instructions:
+        fusion.rebuild(emulator.instructions)  # A new image was loaded
+    table = fusion.table
+    ram = emulator.ram
+    start = emulator.cycles
+    end = start + cycles
+    while emulator.running and emulator.cycles < end:
+        busy = emulator.busy
+        if busy:  # skip_idle() inlined for the common short stretches
+            if emulator.cycles + busy >= end:
+                emulator.busy = busy - (end - emulator.cycles)
+                emulator.cycles = end
+                break
+            emulator.cycles += busy
+            emulator.busy = 0
+        if emulator.delay:
+            emulator.skip_idle(end - emulator.cycles)
+            continue
+        pc = emulator.pc
+        entry = table.get(pc)
+        if entry is None:
+            step(emulator)
+            continue
+        first_opcode, first, second_opcode, second = entry
+        if ram[pc] != first_opcode:
+            del table[pc]  # Overwritten: de-fuse
+            fusion.defused += 1
+            step(emulator)
+            continue
+        if not first(emulator, ram, pc):
+            step(emulator)  # Reports the error
+            continue
+        next_pc = emulator.pc
+        if next_pc >= emulator.ram_size or ram[next_pc] != second_opcode:
+            table.pop(pc, None)  # Second instruction overwritten: de-fuse
+            fusion.defused += 1
+            continue
+        busy = emulator.busy
+        if emulator.cycles + busy >= end:
+            continue  # No room for the second instruction in this batch
+        emulator.cycles += busy
+        emulator.busy = 0
+        second(emulator, ram, next_pc)  # If it would fail, the loop steps it
+    return emulator.cycles - start
+
+# Statistics
+
+def split_programs(text):
+    """Programs in a corpus file, separated by blank lines"""
+    programs, current = [], []
+    for line in text.splitlines():
+        if line.strip():
+            current.append(line)
+        elif current:
+            programs.append(current)
+            current = []
+    if current:
+        programs.append(current)
+    return programs
+
+def pair_statistics(emulator, cycles):
+    """Run the loaded program with step() and count executed fall-through instruction pairs.
+
+    Returns (Counter of (opcode, opcode), instructions executed).
+    """
+    pairs = Counter()
+    executed = 0
+    previous = None  # (opcode, address of the following instruction)
+    for _ in range(cycles):
+        if not emulator.running:
+            break
+        if emulator.busy == 0 and emulator.delay == 0:
+            pc = emulator.pc
+            instruction = emulator.instruction_at(pc)
+            if instruction is not None and instruction.opcode:
+                executed += 1
+                if previous is not None and previous[1] == pc:
+                    pairs[previous[0], instruction.opcode] += 1
+                previous = (instruction.opcode, pc + instruction.length)
+        step(emulator)
+    return pairs, executed
+
+def corpus_statistics(programs, cycles=10000, timing="legacy", ram_size=256):
+    """pair_statistics() summed over programs (lists of source lines); unloadable programs are skipped"""
+    from em_core import Emulator
+    totals = Counter()
+    executed = 0
+    for code in programs:
+        emulator = Emulator(None, ram_size=ram_size, timing=timing, scratchpad=bytearray(8))
+        emulator.save_scratchpad = lambda: None
+        if not emulator.parse_and_load_program(code):
+            continue
+        emulator.running = True
+        pairs, count = pair_statistics(emulator, cycles)
+        totals.update(pairs)
+        executed += count
+    return totals, executed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Count executed instruction pairs to find fusion candidates.")
+    parser.add_argument("files", nargs="*", default=["em_examples.2b"], help="Corpus files (default em_examples.2b)")
+    parser.add_argument("--cycles", type=int, default=10000, help="Cycles to run each program (default 10000)")
+    parser.add_argument("--timing", default="legacy", help="Timing profile (legacy or realistic)")
+    parser.add_argument("--top", type=int, default=20, help="Pairs to list (default 20)")
+    args = parser.parse_args(argv)
+    programs = []
+    for path in args.files:
+        with open(path) as f:
+            programs += split_programs(f.read())
+    pairs, executed = corpus_statistics(programs, args.cycles, args.timing)
+    print(f"{len(programs)} programs, {executed} instructions executed")
+    fused = set(FUSED_PAIRS)
+    for (first, second), count in pairs.most_common(args.top):
+        share = 100.0 * count / executed if executed else 0.0
+        marker = "  fused" if (first, second) in fused else ""
+        print(f"{INSTRUCTIONS[first][0]:>18} {INSTRUCTIONS[second][0]:<18} {count:>10} {share:6.2f}%{marker}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
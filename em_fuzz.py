@@ -0,0 +1,434 @@
+"""Differential fuzzer for the execution engines.
+
+Every engine has to agree exactly with the reference interpreter,
+em_instructions.step: same PC, cycle count, busy/delay/active_delay,
+running flag, error string, framebuffer, RAM and scratchpad. fuzz()
+generates random programs and raw RAM images, runs each on the reference
+and on every registered engine in lockstep, compares the full state after
+every chunk of 1..CHUNK cycles and shrinks any divergence to a minimal
+case. Valid generated programs are also rendered as source and must
+assemble back to the same image ("assembler").
+
+    python em_fuzz.py --seconds 60           # on all cores
+    python em_fuzz.py --cases 5000 --seed 7 --workers 1
+
+Engines that use the byte encoding run the reference's image. Engines
+registered with wide=True run the wide encoding of the same generated
+program: their PC is compared as an instruction index and RAM only over
+the data region, where both encodings keep the same addresses.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import time
+from collections import namedtuple
+from em_constants import (
+    INSTRUCTIONS, OPERAND_SIZES, WIDE_OPERAND_SIZES,
+    OPERAND_TARGET, OPERAND_RAM_READ, OPERAND_RAM_WRITE, OPERAND_RAM_MODIFY, OPERAND_RAM_READ_WORD,
+    OPERAND_SCRATCH_READ, OPERAND_SCRATCH_WRITE, OPERAND_PAIRS, OPERAND_MASK, OPERAND_COUNT
+)
+from em_core import Emulator
+from em_instructions import step as reference_step
+from em_disasm import decode, format_instruction
+from em_fusion import FUSED_PAIRS
+
+# advance(emulator, cycles) executes exactly cycles cycles, or fewer if the program stops
+Engine = namedtuple("Engine", "name advance wide")
+# program is a tuple of (opcode, operands) with jump targets as Label(instruction index);
+# image cases have program None and a raw RAM image instead
+Label = namedtuple("Label", "index")
+Case = namedtuple("Case", "seed program image ram_size timing scratchpad")
+Divergence = namedtuple("Divergence", "engine case cycle fields expected actual")
+FuzzReport = namedtuple("FuzzReport", "cases steps seconds divergences")
+
+ASSEMBLER = "assembler"  # Pseudo-engine: source rendered from a program must assemble to its image
+CHUNK = 16               # Longest run of cycles between two state comparisons
+MAX_CYCLES = 400         # Cycles per case
+DATA_START = 128         # Generated code stays below this in both encodings ...
+RAM_SIZE = 192           # ... and data between here and RAM_SIZE; higher byte addresses are invalid
+SCRATCHPAD_SIZE = 8
+STATE_FIELDS = ("pc", "cycles", "busy", "delay", "active_delay", "running", "error", "framebuffer",
+                "ram", "scratchpad")
+OPCODES = sorted(INSTRUCTIONS)
+RAM_KINDS = (OPERAND_RAM_READ, OPERAND_RAM_WRITE, OPERAND_RAM_MODIFY)
+SCRATCH_KINDS = (OPERAND_SCRATCH_READ, OPERAND_SCRATCH_WRITE)
+
+def _advance_run(emulator, cycles):
+    emulator.run(cycles)
+
+def _advance_skip_idle(emulator, cycles):
+    """The AsyncRunner loop: busy and WAIT cycles are fast-forwarded, not stepped"""
+    end = emulator.cycles + cycles
+    step = emulator.step_function
+    while emulator.running and emulator.cycles < end:
+        if emulator.busy or emulator.delay:
+            emulator.skip_idle(end - emulator.cycles)
+        else:
+            step(emulator)
+
+ENGINES = {}
+
+def register_engine(name, advance, wide=False):
+    """Add an engine to compare against the reference (see Engine)"""
+    ENGINES[name] = Engine(name, advance, wide)
+
+def _advance_fused(emulator, cycles):
+    if emulator.fusion is None:
+        emulator.enable_fusion()
+    emulator.run(cycles)
+
+register_engine("run", _advance_run)
+register_engine("skip_idle", _advance_skip_idle)
+register_engine("wide", _advance_run, wide=True)
+register_engine("fused", _advance_fused)
+
+def _no_save():
+    """Fuzzed emulators never write scratchpad.dat"""
+
+# Case generation
+
+def _operand(rng, kind, length, bad, low=DATA_START):
+    """Random operand; bad picks an out-of-range value, data addresses start at low"""
+    if kind in RAM_KINDS:
+        return rng.randrange(RAM_SIZE, 256) if bad else rng.randrange(low, RAM_SIZE)
+    if kind == OPERAND_RAM_READ_WORD:
+        return rng.randrange(RAM_SIZE - 1, 256) if bad else rng.randrange(low, RAM_SIZE - 1)
+    if kind in SCRATCH_KINDS:
+        return rng.randrange(SCRATCHPAD_SIZE, 256) if bad else rng.randrange(SCRATCHPAD_SIZE)
+    if kind == OPERAND_TARGET:
+        return rng.randrange(RAM_SIZE, 256) if bad else Label(rng.randrange(length + 1))
+    if kind == OPERAND_COUNT:
+        return rng.randrange(SCRATCHPAD_SIZE + 1, 256) if bad else rng.randrange(SCRATCHPAD_SIZE + 1)
+    if kind == OPERAND_MASK:
+        return rng.randrange(0x10000)
+    return rng.choice((0, 1, 2, 7, 8, 255, rng.randrange(256)))  # Immediate
+
+def _pairs(rng, bad):
+    return tuple((rng.randrange(4, 256) if bad else rng.randrange(4), rng.randrange(4))
+                 for _ in range(rng.randrange(5)))
+
+def _program(rng, p_bad, low=DATA_START):
+    """Up to 12 random instructions; often the pairs em_fusion executes as superinstructions"""
+    length = rng.randint(1, 12)
+    opcodes = []
+    while len(opcodes) < length:
+        if length - len(opcodes) >= 2 and rng.random() < 0.3:
+            opcodes += rng.choice(FUSED_PAIRS)
+        else:
+            opcodes.append(rng.choice(OPCODES))
+    program = []
+    for opcode in opcodes:
+        kinds = INSTRUCTIONS[opcode][1]
+        if kinds == (OPERAND_PAIRS,):
+            operands = (_pairs(rng, rng.random() < p_bad),)
+        else:
+            operands = tuple(_operand(rng, kind, length, rng.random() < p_bad, low) for kind in kinds)
+        program.append((opcode, operands))
+    return tuple(program)
+
+def generate(seed):
+    """Random Case for seed: usually a program, sometimes a raw or self-modifying image"""
+    rng = random.Random(seed)
+    timing = rng.choice(("legacy", "realistic"))
+    scratchpad = bytes(rng.randrange(256) for _ in range(SCRATCHPAD_SIZE))
+    kind = rng.random()
+    if kind < 0.15:
+        ram_size = rng.choice((16, 32, 64, 192, 256))
+        image = bytes(rng.choice(OPCODES) if rng.random() < 0.5 else rng.randrange(256)
+                      for _ in range(rng.randrange(1, ram_size + 1)))
+        return Case(seed, None, image, ram_size, timing, scratchpad)
+    if kind < 0.3:  # Writes may land anywhere, including the code
+        image, _ = encode(_program(rng, 0.0, low=0))
+        return Case(seed, None, image, RAM_SIZE, timing, scratchpad)
+    return Case(seed, _program(rng, rng.choice((0.0, 0.0, 0.05))), None, RAM_SIZE, timing, scratchpad)
+
+def encode(program, wide=False):
+    """RAM image of a program and the address of each instruction (plus the end of the code)"""
+    sizes = WIDE_OPERAND_SIZES if wide else OPERAND_SIZES
+    addresses = [0]
+    for opcode, operands in program:
+        kinds = INSTRUCTIONS[opcode][1]
+        if kinds == (OPERAND_PAIRS,):
+            length = 2 + 2 * len(operands[0])
+        else:
+            length = 1 + sum(sizes.get(kind, 1) for kind in kinds)
+        addresses.append(addresses[-1] + length)
+    image = bytearray()
+    for opcode, operands in program:
+        image.append(opcode)
+        kinds = INSTRUCTIONS[opcode][1]
+        if kinds == (OPERAND_PAIRS,):
+            image.append(len(operands[0]))
+            for pair in operands[0]:
+                image.extend(pair)
+            continue
+        for kind, value in zip(kinds, operands):
+            if isinstance(value, Label):
+                value = addresses[min(value.index, len(program))]
+            image += value.to_bytes(sizes.get(kind, 1), "little")
+    return bytes(image), addresses
+
+def render(program, wide=False):
+    """Assembler source for a program"""
+    image, addresses = encode(program, wide)
+    return [format_instruction(decode(image, address, len(image), wide)) for address in addresses[:-1]]
+
+def _assemblable(program):
+    """True if every operand is in range, so the assembler has to accept the source"""
+    for opcode, operands in program:
+        kinds = INSTRUCTIONS[opcode][1]
+        count = operands[kinds.index(OPERAND_COUNT)] if OPERAND_COUNT in kinds else 1
+        for kind, value in zip(kinds, operands):
+            if kind == OPERAND_PAIRS:
+                if not value or any(x >= 4 or y >= 4 for x, y in value):
+                    return False
+            elif kind == OPERAND_TARGET:
+                if not isinstance(value, Label) and value >= RAM_SIZE:
+                    return False
+            elif kind in RAM_KINDS:
+                if value + max(count, 1) > RAM_SIZE:
+                    return False
+            elif kind == OPERAND_RAM_READ_WORD:
+                if value >= RAM_SIZE - 1:
+                    return False
+            elif kind in SCRATCH_KINDS and value + max(count, 1) > SCRATCHPAD_SIZE:
+                return False
+            elif kind == OPERAND_COUNT and value > SCRATCHPAD_SIZE:
+                return False
+    return True
+
+# Lockstep execution
+
+def _emulator(case, image, wide=False):
+    emulator = Emulator(None, ram_size=case.ram_size, timing=case.timing, wide=wide,
+                        scratchpad=bytearray(case.scratchpad))
+    emulator.save_scratchpad = _no_save
+    emulator.load_image(image)
+    emulator.running = True
+    return emulator
+
+def _state(emulator, addresses=None):
+    """Full state; with addresses (both-encodings comparison) PC as instruction index and data RAM only"""
+    pc, ram = emulator.pc, bytes(emulator.ram)
+    if addresses is not None:
+        pc = addresses.index(pc) if pc in addresses else f"@{pc}"
+        ram = ram[DATA_START:]
+    return (pc, emulator.cycles, emulator.busy, emulator.delay, emulator.active_delay, emulator.running,
+            emulator.error, emulator.framebuffer, ram, bytes(emulator.scratchpad))
+
+def _check_assembler(case, wide):
+    image, _ = encode(case.program, wide)
+    emulator = Emulator(None, ram_size=case.ram_size, wide=wide, scratchpad=bytearray(SCRATCHPAD_SIZE))
+    if not emulator.parse_and_load_program(render(case.program, wide)):
+        return Divergence(ASSEMBLER, case, 0, ["error"], None, emulator.error)
+    assembled = bytes(emulator.ram[:len(image)])
+    if assembled != image or any(emulator.ram[len(image):]):
+        return Divergence(ASSEMBLER, case, 0, ["ram"], image.hex(), bytes(emulator.ram).rstrip(b"\0").hex())
+    return None
+
+def check(case, engines=None, max_cycles=MAX_CYCLES):
+    """Run case on the reference and engines in lockstep; returns (divergences, cycles simulated)"""
+    names = list(ENGINES) + [ASSEMBLER] if engines is None else engines
+    divergences = []
+    if case.program is not None and ASSEMBLER in names and _assemblable(case.program):
+        for wide in (False, True):
+            divergence = _check_assembler(case, wide)
+            if divergence is not None:
+                divergences.append(divergence)
+                break
+
+    engines = [ENGINES[name] for name in names if name in ENGINES]
+    if case.program is None:
+        image, byte_addresses = case.image, None
+        engines = [engine for engine in engines if not engine.wide]
+    else:
+        image, byte_addresses = encode(case.program)
+    reference = _emulator(case, image)
+    runs = []
+    for engine in engines:
+        if engine.wide:
+            wide_image, addresses = encode(case.program, True)
+            runs.append((engine, _emulator(case, wide_image, True), addresses))
+        else:
+            runs.append((engine, _emulator(case, image), None))
+
+    rng = random.Random(case.seed)
+    while runs:
+        chunk = min(rng.randint(1, CHUNK), max_cycles - reference.cycles)
+        if chunk <= 0:
+            break
+        for _ in range(chunk):
+            if not reference.running:
+                break
+            reference_step(reference)
+        full = _state(reference)
+        mapped = _state(reference, byte_addresses) if byte_addresses is not None else None
+        for run in list(runs):
+            engine, emulator, addresses = run
+            engine.advance(emulator, chunk)
+            actual = _state(emulator, addresses)
+            expected = full if addresses is None else mapped
+            fields = [field for field, want, got in zip(STATE_FIELDS, expected, actual) if want != got]
+            if fields:
+                divergences.append(Divergence(engine.name, case, reference.cycles, fields, expected, actual))
+                runs.remove(run)
+        if not reference.running:
+            break
+    return divergences, reference.cycles * (1 + len(engines))
+
+# Shrinking
+
+def _without(program, start, end):
+    """program minus instructions start..end, with jump targets renumbered"""
+    removed = end - start
+    def target(value):
+        if not isinstance(value, Label) or value.index < start:
+            return value
+        return Label(max(value.index - removed, start))
+    return tuple((opcode, tuple(target(value) for value in operands))
+                 for opcode, operands in program[:start] + program[end:])
+
+def _simpler_operands(program):
+    for index, (opcode, operands) in enumerate(program):
+        for position, value in enumerate(operands):
+            if isinstance(value, Label):
+                continue
+            if isinstance(value, tuple):  # SET/CLEAR pairs
+                candidates = [value[:i] + value[i + 1:] for i in range(len(value))]
+            elif value:
+                candidates = [0, value // 2] if value > 1 else [0]
+            else:
+                continue
+            for candidate in candidates:
+                changed = operands[:position] + (candidate,) + operands[position + 1:]
+                yield program[:index] + ((opcode, changed),) + program[index + 1:]
+
+def _smaller(case):
+    """Candidate cases strictly simpler than case, roughly largest cuts first"""
+    if case.program is not None:
+        program = case.program
+        size = len(program) // 2
+        while size >= 1:
+            for start in range(0, len(program) - size + 1, size):
+                if len(program) > size:
+                    yield case._replace(program=_without(program, start, start + size))
+            size //= 2
+        for candidate in _simpler_operands(program):
+            yield case._replace(program=candidate)
+    else:
+        image = case.image
+        size = len(image) // 2
+        while size >= 1:
+            for start in range(0, len(image) - size + 1, size):
+                if len(image) > size:
+                    yield case._replace(image=image[:start] + image[start + size:])
+            size //= 2
+        for index, value in enumerate(image):
+            if value:
+                yield case._replace(image=image[:index] + b"\0" + image[index + 1:])
+    if case.timing != "legacy":
+        yield case._replace(timing="legacy")
+    if any(case.scratchpad):
+        yield case._replace(scratchpad=bytes(SCRATCHPAD_SIZE))
+
+def shrink(divergence):
+    """Minimal variant of the divergence's case that still makes the same engine diverge"""
+    engine = divergence.engine
+    limit = divergence.cycle + CHUNK
+
+    def diverging(case):
+        found, _ = check(case, [engine], limit)
+        return found[0] if found else None
+
+    best = divergence
+    progress = True
+    while progress:
+        progress = False
+        for candidate in _smaller(best.case):
+            found = diverging(candidate)
+            if found is not None:
+                best = found
+                progress = True
+                break
+    return best
+
+def describe(divergence):
+    """Readable reproducer: the case and the fields that differ"""
+    case = divergence.case
+    lines = [f"{divergence.engine} diverges at cycle {divergence.cycle} "
+             f"(seed {case.seed}, RAM {case.ram_size}, {case.timing} timing, scratchpad {case.scratchpad.hex()})"]
+    if case.program is not None:
+        lines += ["    " + line for line in render(case.program)]
+    else:
+        lines.append("    image " + case.image.hex())
+    if divergence.engine == ASSEMBLER:
+        lines.append(f"    expected {divergence.expected}")
+        lines.append(f"    got      {divergence.actual}")
+        return "\n".join(lines)
+    for field in divergence.fields:
+        index = STATE_FIELDS.index(field)
+        want, got = divergence.expected[index], divergence.actual[index]
+        if field == "ram":
+            want = {addr: value for addr, value in enumerate(want) if value != got[addr]}
+            got = {addr: got[addr] for addr in want}
+        lines.append(f"    {field}: reference {want!r}, {divergence.engine} {got!r}")
+    return "\n".join(lines)
+
+# Driver
+
+def _fuzz_worker(job):
+    names, first_seed, stride, cases, seconds, max_divergences = job
+    deadline = None if seconds is None else time.monotonic() + seconds
+    done = steps = 0
+    found = []
+    seed = first_seed
+    while (cases is None or done < cases) and (deadline is None or time.monotonic() < deadline):
+        divergences, simulated = check(generate(seed), names)
+        steps += simulated
+        done += 1
+        seed += stride
+        for divergence in divergences:
+            if len(found) < max_divergences:
+                found.append(shrink(divergence))
+    return done, steps, found
+
+def fuzz(cases=None, seconds=None, workers=None, seed=0, engines=None, max_divergences=10):
+    """Fuzz for cases cases and/or seconds seconds on workers processes (default: all cores)"""
+    if cases is None and seconds is None:
+        raise ValueError("Give a number of cases or seconds")
+    workers = workers or os.cpu_count() or 1
+    jobs = []
+    for index in range(workers):
+        share = None if cases is None else cases // workers + (index < cases % workers)
+        jobs.append((engines, seed + index, workers, share, seconds, max_divergences))
+    start = time.perf_counter()
+    if workers == 1:
+        results = [_fuzz_worker(jobs[0])]
+    else:
+        with multiprocessing.Pool(workers) as pool:
+            results = pool.map(_fuzz_worker, jobs)
+    divergences = [divergence for _, _, found in results for divergence in found][:max_divergences]
+    return FuzzReport(sum(done for done, _, _ in results), sum(steps for _, steps, _ in results),
+                      time.perf_counter() - start, divergences)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Differential fuzzing of the Forgematrix execution engines.")
+    parser.add_argument("--cases", type=int, help="Number of cases to run")
+    parser.add_argument("--seconds", type=float, help="Time to fuzz for (default 10 without --cases)")
+    parser.add_argument("--workers", type=int, help="Processes to use (default: all cores)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--engine", action="append", choices=sorted(ENGINES) + [ASSEMBLER],
+                        help="Engine to compare (repeatable; default all)")
+    args = parser.parse_args(argv)
+    seconds = args.seconds if args.seconds is not None or args.cases is not None else 10.0
+    report = fuzz(args.cases, seconds, args.workers, args.seed, args.engine)
+    rate = report.steps / report.seconds * 60 if report.seconds else 0
+    print(f"{report.cases} cases, {report.steps} steps in {report.seconds:.1f} s ({rate / 1e6:.1f} M steps/min)")
+    for divergence in report.divergences:
+        print(describe(divergence))
+    return 1 if report.divergences else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
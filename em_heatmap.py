@@ -0,0 +1,128 @@
+import csv
+import json
+import math
+from array import array
+from em_disasm import decode, memory_accesses, changed_ranges
+
+class AccessCounters:
+    """Per-address read and write counters for RAM and the scratchpad.
+
+    Each counter is an array of unsigned 64-bit ints indexed by address.
+    Emulator.run() only calls record() while an AccessCounters is attached
+    (Emulator.enable_heatmap), so collection costs nothing when it is off.
+    """
+    def __init__(self, ram_size=64, scratchpad_size=8):
+        self.ram_reads = array("Q", bytes(8 * ram_size))
+        self.ram_writes = array("Q", bytes(8 * ram_size))
+        self.scratch_reads = array("Q", bytes(8 * scratchpad_size))
+        self.scratch_writes = array("Q", bytes(8 * scratchpad_size))
+        self._counters = {
+            ("ram", "read"): self.ram_reads,
+            ("ram", "write"): self.ram_writes,
+            ("scratch", "read"): self.scratch_reads,
+            ("scratch", "write"): self.scratch_writes,
+        }
+        self._totals = None  # Copies made by totals(), until the counters change
+
+    def record(self, emulator):
+        """Count the data accesses of the instruction about to execute at PC"""
+        instruction = decode(emulator.ram, emulator.pc, emulator.ram_size, emulator.wide)
+        if instruction is None:
+            return
+        for space, kind, start, end in memory_accesses(instruction):
+            counter = self._counters[space, kind]
+            for address in range(start, min(end, len(counter))):
+                counter[address] += 1
+            self._totals = None
+
+    def clear(self):
+        for counter in self._counters.values():
+            counter[:] = array("Q", bytes(8 * len(counter)))
+        self._totals = None
+
+    def totals(self):
+        """Copies of (ram_reads, ram_writes, scratch_reads, scratch_writes) as arrays.
+
+        The same copies are returned until the counters change, so a reader
+        can tell that nothing was accessed by identity.
+        """
+        if self._totals is None:
+            self._totals = (array("Q", self.ram_reads), array("Q", self.ram_writes),
+                            array("Q", self.scratch_reads), array("Q", self.scratch_writes))
+        return self._totals
+
+    def rows(self):
+        """(space, address, reads, writes) for every address"""
+        for space, reads, writes in (("ram", self.ram_reads, self.ram_writes),
+                                     ("scratch", self.scratch_reads, self.scratch_writes)):
+            for address in range(len(reads)):
+                yield space, address, reads[address], writes[address]
+
+    def write_csv(self, f):
+        writer = csv.writer(f)
+        writer.writerow(["space", "address", "reads", "writes"])
+        writer.writerows(self.rows())
+
+    def to_json(self):
+        return json.dumps({
+            "ram": {"reads": list(self.ram_reads), "writes": list(self.ram_writes)},
+            "scratch": {"reads": list(self.scratch_reads), "writes": list(self.scratch_writes)},
+        })
+
+    def save(self, path):
+        """Write the counters to path as JSON (.json) or CSV (anything else)"""
+        with open(path, "w", newline="") as f:
+            if path.lower().endswith(".json"):
+                f.write(self.to_json())
+            else:
+                self.write_csv(f)
+
+class HeatDecay:
+    """Turns growing access counts into decaying heat levels for display.
+
+    Every update() adds the accesses since the previous call and decays the
+    old heat, so an address cools down once the program stops touching it.
+    Levels run from 0 (cold) to levels - 1 on a log scale. Only warm
+    addresses are kept in heat, and new accesses are found by diffing the
+    counts in blocks, so an update costs what the program touched rather
+    than the size of memory.
+    """
+    def __init__(self, size, decay=0.9, levels=16):
+        self.decay = decay
+        self.levels = levels
+        self.reset(size)
+
+    def reset(self, size=None):
+        self.size = self.size if size is None else size
+        self.heat = {}  # address -> heat, warm addresses only
+        self.level = bytearray(self.size)
+        self._previous = None
+
+    def update(self, *counts):
+        """Feed total counts per address (e.g. reads, writes); returns the addresses whose level changed"""
+        if len(counts[0]) != self.size:
+            self.reset(len(counts[0]))
+        previous = self._previous
+        self._previous = counts
+        decay = self.decay
+        heat = {address: value * decay for address, value in self.heat.items()}
+        if previous is not None:
+            for new, old in zip(counts, previous):
+                if new is old:
+                    continue  # Same copy: nothing was accessed
+                for start, end in changed_ranges(old, new):
+                    for address in range(start, end):
+                        heat[address] = heat.get(address, 0.0) + max(new[address] - old[address], 0)
+        changed = []
+        level = self.level
+        top = self.levels - 1
+        for address, value in list(heat.items()):
+            if value < 0.05:
+                del heat[address]
+                value = 0.0
+            new_level = min(top, int(math.log2(1 + value) * 2))
+            if new_level != level[address]:
+                level[address] = new_level
+                changed.append(address)
+        self.heat = heat
+        return changed
\ No newline at end of file
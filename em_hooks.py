@@ -0,0 +1,173 @@
+"""Execution hooks: observe a running program through batched event records.
+
+    counts = Counter()
+    def profile(kind, events):
+        counts.update(event.pc for event in events)
+    emulator.add_hook(profile, [INSTRUCTION])
+
+Hooks are called as hook(kind, events) with a list of records of one kind,
+in execution order, once batch records of any kind are pending and when
+run() returns, so the cost is one Python call per batch rather than per
+event. Records of different kinds can be merged by their cycle field.
+Event kinds and their records:
+
+    INSTRUCTION    InstructionEvent(cycle, pc, opcode), one per executed instruction
+    RAM_WRITE      WriteEvent(cycle, pc, address, old, new) per byte written
+    SCRATCH_WRITE  WriteEvent(...) per scratchpad byte written
+    PIXELS         PixelEvent(cycle, pc, old, new) when a frame changes (old ^ new are the changed pixels)
+    HALT, ERROR    StopEvent(cycle, pc, error)
+
+cycle is Emulator.cycles when the instruction started. Instructions that
+fail are reported as an ERROR event only. A hook returning a true value
+stops run() after the current instruction; with batch=1 that is the
+instruction that produced the event, so watchpoints can be hooks too.
+
+Emulator.run() chooses its loop when it starts: without hooks (and
+without breakpoints, watchpoints or a heatmap) it runs the plain loop and
+hooks cost nothing.
+"""
+from collections import namedtuple
+from em_disasm import decode, memory_accesses
+
+INSTRUCTION = "instruction"
+RAM_WRITE = "ram_write"
+SCRATCH_WRITE = "scratch_write"
+PIXELS = "pixels"
+HALT = "halt"
+ERROR = "error"
+EVENT_KINDS = (INSTRUCTION, RAM_WRITE, SCRATCH_WRITE, PIXELS, HALT, ERROR)
+
+InstructionEvent = namedtuple("InstructionEvent", "cycle pc opcode")
+WriteEvent = namedtuple("WriteEvent", "cycle pc address old new")
+PixelEvent = namedtuple("PixelEvent", "cycle pc old new")
+StopEvent = namedtuple("StopEvent", "cycle pc error")
+
+_WRITE_KINDS = {"ram": RAM_WRITE, "scratch": SCRATCH_WRITE}
+
+class HookSet:
+    """Hooks attached to an emulator and the records waiting to be delivered.
+
+    before() runs at an instruction boundary and after() once the
+    instruction has executed; together they record only the kinds some
+    hook subscribed to. Writes are found by decoding the instruction
+    (em_disasm.memory_accesses) only while a write hook is attached.
+    """
+    def __init__(self, batch=1024):
+        self.batch = batch
+        self.hooks = {kind: [] for kind in EVENT_KINDS}
+        self.buffers = {kind: [] for kind in EVENT_KINDS}
+        self.pending = 0
+        self._update()
+
+    def add(self, hook, kinds=EVENT_KINDS):
+        for kind in kinds:
+            if kind not in self.hooks:
+                raise ValueError(f"Unknown event kind: {kind}")
+        for kind in kinds:
+            if hook not in self.hooks[kind]:
+                self.hooks[kind].append(hook)
+        self._update()
+        return hook
+
+    def remove(self, hook):
+        for hooks in self.hooks.values():
+            if hook in hooks:
+                hooks.remove(hook)
+        self._update()
+
+    def __len__(self):
+        return len({id(hook) for hooks in self.hooks.values() for hook in hooks})
+
+    def _update(self):
+        hooks = self.hooks
+        self._instructions = bool(hooks[INSTRUCTION])
+        self._writes = {space for space, kind in _WRITE_KINDS.items() if hooks[kind]}
+        self._pixels = bool(hooks[PIXELS])
+        self._stops = bool(hooks[HALT] or hooks[ERROR])
+
+    def before(self, emulator):
+        """State the instruction at PC is about to change: (cycle, pc, opcode, frame, writes)"""
+        pc = emulator.pc
+        ram = emulator.ram
+        opcode = ram[pc] if pc < emulator.ram_size else None
+        writes = None
+        if self._writes and opcode is not None:
+            instruction = decode(ram, pc, emulator.ram_size, emulator.wide)
+            if instruction is not None:
+                writes = []
+                for space, kind, start, end in memory_accesses(instruction):
+                    if kind == "write" and space in self._writes:
+                        memory = ram if space == "ram" else emulator.scratchpad
+                        for address in range(start, min(end, len(memory))):
+                            writes.append((space, address, memory[address]))
+        return emulator.cycles, pc, opcode, emulator.framebuffer, writes
+
+    def after(self, emulator, observed):
+        """Record what the instruction did; returns True if a hook asked to stop"""
+        cycle, pc, opcode, frame, writes = observed
+        buffers = self.buffers
+        added = 0
+        error = None if emulator.running else emulator.error
+        if error is None:
+            if self._instructions:
+                buffers[INSTRUCTION].append(InstructionEvent(cycle, pc, opcode))
+                added += 1
+            if writes:
+                for space, address, old in writes:
+                    memory = emulator.ram if space == "ram" else emulator.scratchpad
+                    buffers[_WRITE_KINDS[space]].append(WriteEvent(cycle, pc, address, old, memory[address]))
+                added += len(writes)
+            if self._pixels and emulator.framebuffer != frame:
+                buffers[PIXELS].append(PixelEvent(cycle, pc, frame, emulator.framebuffer))
+                added += 1
+        if not emulator.running and self._stops:
+            buffers[ERROR if error is not None else HALT].append(StopEvent(cycle, pc, error))
+            added += 1
+        self.pending += added
+        if self.pending >= self.batch:
+            return self.flush()
+        return False
+
+    def flush(self):
+        """Deliver pending records; returns True if a hook asked to stop"""
+        stop = False
+        if self.pending:
+            self.pending = 0
+            for kind in EVENT_KINDS:
+                events = self.buffers[kind]
+                if events:
+                    self.buffers[kind] = []
+                    for hook in self.hooks[kind]:
+                        if hook(kind, events):
+                            stop = True
+        return stop
+
+class InstructionProfile:
+    """Hook counting executed instructions per address: a profile and a coverage map.
+
+        profile = emulator.add_hook(InstructionProfile(), [INSTRUCTION])
+    """
+    def __init__(self):
+        self.counts = {}
+
+    def __call__(self, kind, events):
+        counts = self.counts
+        for event in events:
+            counts[event.pc] = counts.get(event.pc, 0) + 1
+
+    def covered(self):
+        """Addresses of instructions that executed at least once"""
+        return set(self.counts)
+
+    def uncovered(self, instructions):
+        """Addresses in an InstructionIndex that never executed, in order"""
+        return [instruction.address for instruction in instructions if instruction.address not in self.counts]
+
+    def lines(self, pc_to_line):
+        """Executions per source line"""
+        lines = {}
+        for pc, count in self.counts.items():
+            line = pc_to_line.get(pc)
+            if line is not None:
+                lines[line] = lines.get(line, 0) + count
+        return lines
\ No newline at end of file
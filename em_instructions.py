@@ -1,4 +1,27 @@
+import operator
+from em_constants import (
+    SET, CLEAR, WAIT, LOOP, STORE, LOAD, JUMP, JUMPIF, ADD, SETALL, SETNONE,
+    SCRATCH_STORE, SCRATCH_LOAD, SCRATCH_ADD, SCRATCH_COPY, SCRATCH_JUMPIF,
+    AND, OR, XOR, NOT, SUB, SHL, SHR,
+    SETMASK, CLEARMASK, TOGGLEMASK, LOADMASK,
+    SETMASK_RAM, CLEARMASK_RAM, TOGGLEMASK_RAM, LOADMASK_RAM,
+    MEMCPY, MEMSET, SCRATCH_LOAD_BLOCK, SCRATCH_COPY_BLOCK,
+    ADDI, SUBI, ANDI, ORI, XORI, SHLI, SHRI, DJNZ, MASK_PIXELS
+)
+from em_disasm import instruction_length
+
+def present(emulator, frame):
+    """Commit a new framebuffer and push it to the display in one bulk update"""
+    emulator.framebuffer = frame
+    if emulator.display is not None:
+        emulator.display.set_frame(frame)
+
 def step(emulator):
+    emulator.cycles += 1
+    if emulator.busy > 0:  # Still paying for a multi-cycle instruction
+        emulator.busy -= 1
+        return
+
     if emulator.delay > 0:
         emulator.delay -= 1
         if emulator.delay == 0:
@@ -11,62 +34,14 @@ def step(emulator):
         return
         
     opcode = emulator.ram[emulator.pc]
+    emulator.busy = emulator.timing.extra_cycles(emulator.ram, emulator.pc, opcode)
     
     if opcode == 0:
         emulator.running = False
         return
 
-    elif opcode == emulator.SET:
-        current_pc = emulator.pc + 1  # Points to count byte
-        if current_pc >= emulator.ram_size:
-            emulator.error = "Missing count in SET"
-            emulator.running = False
-            return
-        count = emulator.ram[current_pc]
-        current_pc += 1  # Now points to first pair
-        error = None
-        for _ in range(count):
-            if current_pc + 1 >= emulator.ram_size:
-                error = "Incomplete pair in SET"
-                break
-            x = emulator.ram[current_pc]
-            y = emulator.ram[current_pc + 1]
-            if not (0 <= x < 4 and 0 <= y < 4):
-                error = f"Invalid SET coordinates ({x}, {y})"
-                break
-            emulator.display.update_pixel(x, y, True)
-            current_pc += 2
-        if error:
-            emulator.error = error
-            emulator.running = False
-        else:
-            emulator.pc = current_pc
-        
-    elif opcode == emulator.CLEAR:
-        current_pc = emulator.pc + 1  # Points to count byte
-        if current_pc >= emulator.ram_size:
-            emulator.error = "Missing count in CLEAR"
-            emulator.running = False
-            return
-        count = emulator.ram[current_pc]
-        current_pc += 1  # Now points to first pair
-        error = None
-        for _ in range(count):
-            if current_pc + 1 >= emulator.ram_size:
-                error = "Incomplete pair in CLEAR"
-                break
-            x = emulator.ram[current_pc]
-            y = emulator.ram[current_pc + 1]
-            if not (0 <= x < 4 and 0 <= y < 4):
-                error = f"Invalid CLEAR coordinates ({x}, {y})"
-                break
-            emulator.display.update_pixel(x, y, False)
-            current_pc += 2
-        if error:
-            emulator.error = error
-            emulator.running = False
-        else:
-            emulator.pc = current_pc
+    elif opcode == emulator.SET or opcode == emulator.CLEAR:
+        draw_pairs(emulator, opcode == emulator.SET)
         
     elif opcode == emulator.WAIT:
         if emulator.pc + 1 >= emulator.ram_size:
@@ -83,15 +58,11 @@ def step(emulator):
         emulator.pc = emulator.entry_point
 
     elif opcode == emulator.SETALL:
-        for y in range(4):
-            for x in range(4):
-                emulator.display.update_pixel(x, y, True)
+        present(emulator, emulator.geometry.full)
         emulator.pc += 1
         
     elif opcode == emulator.SETNONE:
-        for y in range(4):
-            for x in range(4):
-                emulator.display.update_pixel(x, y, False)
+        present(emulator, 0)
         emulator.pc += 1
         
     elif opcode == emulator.STORE:
@@ -121,7 +92,10 @@ def step(emulator):
         addr = emulator.ram[emulator.pc + 1]
         
         if 0 <= addr < emulator.ram_size:
-            emulator.display.update_pixel(0, 0, emulator.ram[addr] > 0)
+            if emulator.ram[addr] > 0:
+                present(emulator, emulator.framebuffer | 1)
+            else:
+                present(emulator, emulator.framebuffer & ~1)
         else:
             emulator.running = False
             emulator.error = f"Invalid RAM address: {addr}"
@@ -381,7 +355,480 @@ def step(emulator):
             return
         emulator.ram[addr_result] = (emulator.ram[addr] >> 1) & 0xFF
         emulator.pc += 3
+
+    elif opcode in (emulator.SETMASK, emulator.CLEARMASK, emulator.TOGGLEMASK, emulator.LOADMASK):
+        if emulator.pc + 2 >= emulator.ram_size:
+            emulator.running = False
+            emulator.error = "Instruction arguments out of range"
+            return
+        mask = emulator.ram[emulator.pc + 1] | (emulator.ram[emulator.pc + 2] << 8)
+        if not apply_mask(emulator, opcode, mask):
+            return
+        emulator.pc += 3
+
+    elif opcode in (emulator.SETMASK_RAM, emulator.CLEARMASK_RAM, emulator.TOGGLEMASK_RAM, emulator.LOADMASK_RAM):
+        if emulator.pc + 1 >= emulator.ram_size:
+            emulator.running = False
+            emulator.error = "Instruction arguments out of range"
+            return
+        addr = emulator.ram[emulator.pc + 1]
+        if not (0 <= addr and addr + 1 < emulator.ram_size):
+            emulator.running = False
+            emulator.error = f"Invalid RAM address: {addr}"
+            return
+        mask = emulator.ram[addr] | (emulator.ram[addr + 1] << 8)
+        if not apply_mask(emulator, opcode, mask):
+            return
+        emulator.pc += 2
+
+    elif opcode == emulator.MEMCPY:
+        if emulator.pc + 3 >= emulator.ram_size:
+            emulator.running = False
+            emulator.error = "Instruction arguments out of range"
+            return
+        src = emulator.ram[emulator.pc + 1]
+        dst = emulator.ram[emulator.pc + 2]
+        count = emulator.ram[emulator.pc + 3]
+        if not (src + count <= emulator.ram_size and dst + count <= emulator.ram_size):
+            emulator.running = False
+            emulator.error = "Invalid RAM range"
+            return
+        emulator.ram[dst:dst + count] = emulator.ram[src:src + count]
+        emulator.pc += 4
+
+    elif opcode == emulator.MEMSET:
+        if emulator.pc + 3 >= emulator.ram_size:
+            emulator.running = False
+            emulator.error = "Instruction arguments out of range"
+            return
+        dst = emulator.ram[emulator.pc + 1]
+        value = emulator.ram[emulator.pc + 2]
+        count = emulator.ram[emulator.pc + 3]
+        if not dst + count <= emulator.ram_size:
+            emulator.running = False
+            emulator.error = "Invalid RAM range"
+            return
+        emulator.ram[dst:dst + count] = bytes((value,)) * count
+        emulator.pc += 4
+
+    elif opcode == emulator.SCRATCH_LOAD_BLOCK:
+        if emulator.pc + 3 >= emulator.ram_size:
+            emulator.running = False
+            emulator.error = "Instruction arguments out of range"
+            return
+        scratch_addr = emulator.ram[emulator.pc + 1]
+        ram_addr = emulator.ram[emulator.pc + 2]
+        count = emulator.ram[emulator.pc + 3]
+        if not (scratch_addr + count <= emulator.scratchpad_size and ram_addr + count <= emulator.ram_size):
+            emulator.running = False
+            emulator.error = "Invalid scratchpad or RAM range"
+            return
+        emulator.ram[ram_addr:ram_addr + count] = emulator.scratchpad[scratch_addr:scratch_addr + count]
+        emulator.pc += 4
+
+    elif opcode == emulator.SCRATCH_COPY_BLOCK:
+        if emulator.pc + 3 >= emulator.ram_size:
+            emulator.running = False
+            emulator.error = "Instruction arguments out of range"
+            return
+        ram_addr = emulator.ram[emulator.pc + 1]
+        scratch_addr = emulator.ram[emulator.pc + 2]
+        count = emulator.ram[emulator.pc + 3]
+        if not (ram_addr + count <= emulator.ram_size and scratch_addr + count <= emulator.scratchpad_size):
+            emulator.running = False
+            emulator.error = "Invalid RAM or scratchpad range"
+            return
+        emulator.scratchpad[scratch_addr:scratch_addr + count] = emulator.ram[ram_addr:ram_addr + count]
+        emulator.save_scratchpad()  # One flush for the whole block
+        emulator.pc += 4
+
+    elif emulator.ADDI <= opcode <= emulator.SHRI:
+        if emulator.pc + 3 >= emulator.ram_size:
+            emulator.running = False
+            emulator.error = "Instruction arguments out of range"
+            return
+        addr = emulator.ram[emulator.pc + 1]
+        value = emulator.ram[emulator.pc + 2]
+        addr_result = emulator.ram[emulator.pc + 3]
+        if not (0 <= addr < emulator.ram_size and 0 <= addr_result < emulator.ram_size):
+            emulator.running = False
+            emulator.error = "Invalid RAM address"
+            return
+        operand = emulator.ram[addr]
+        if opcode == emulator.ADDI:
+            result = operand + value
+        elif opcode == emulator.SUBI:
+            result = operand - value
+        elif opcode == emulator.ANDI:
+            result = operand & value
+        elif opcode == emulator.ORI:
+            result = operand | value
+        elif opcode == emulator.XORI:
+            result = operand ^ value
+        elif opcode == emulator.SHLI:
+            result = operand << value if value < 8 else 0
+        else:
+            result = operand >> value
+        emulator.ram[addr_result] = result & 0xFF
+        emulator.pc += 4
+
+    elif opcode == emulator.DJNZ:
+        if emulator.pc + 2 >= emulator.ram_size:
+            emulator.running = False
+            emulator.error = "Instruction arguments out of range"
+            return
+        ram_addr = emulator.ram[emulator.pc + 1]
+        addr = emulator.ram[emulator.pc + 2]
+        if not (0 <= addr < emulator.ram_size and 0 <= ram_addr < emulator.ram_size):
+            emulator.running = False
+            emulator.error = "Invalid jump address or RAM address"
+            return
+        value = (emulator.ram[ram_addr] - 1) & 0xFF
+        emulator.ram[ram_addr] = value
+        if value:
+            emulator.pc = addr
+        else:
+            emulator.pc += 3
             
     else:
         emulator.running = False
-        emulator.error = f"Unknown opcode: {opcode}"
\ No newline at end of file
+        emulator.error = f"Unknown opcode: {opcode}"
+
+def apply_mask(emulator, opcode, mask):
+    """Combine a 16-bit pixel mask (bit y*width+x) with the framebuffer; returns False on error.
+
+    A mask cannot cover a display of more than 16 pixels, so it is an error there.
+    """
+    if emulator.geometry.pixels > MASK_PIXELS:
+        emulator.running = False
+        emulator.error = f"Pixel masks need a display of at most {MASK_PIXELS} pixels"
+        return False
+    frame = emulator.framebuffer
+    if opcode in (emulator.SETMASK, emulator.SETMASK_RAM):
+        frame |= mask
+    elif opcode in (emulator.CLEARMASK, emulator.CLEARMASK_RAM):
+        frame &= ~mask
+    elif opcode in (emulator.TOGGLEMASK, emulator.TOGGLEMASK_RAM):
+        frame ^= mask
+    else:
+        frame = mask
+    frame &= emulator.geometry.full
+    if frame != emulator.framebuffer:
+        present(emulator, frame)
+    return True
+
+def draw_pairs(emulator, state):
+    """SET (state True) or CLEAR the count-prefixed x/y pairs following the opcode"""
+    name = "SET" if state else "CLEAR"
+    current_pc = emulator.pc + 1  # Points to count byte
+    if current_pc >= emulator.ram_size:
+        emulator.error = f"Missing count in {name}"
+        emulator.running = False
+        return
+    ram = emulator.ram
+    count = ram[current_pc]
+    current_pc += 1  # Now points to first pair
+    error = None
+    frame = emulator.framebuffer
+    width, height = emulator.geometry.width, emulator.geometry.height
+    for _ in range(count):
+        if current_pc + 1 >= emulator.ram_size:
+            error = f"Incomplete pair in {name}"
+            break
+        x = ram[current_pc]
+        y = ram[current_pc + 1]
+        if not (x < width and y < height):
+            error = f"Invalid {name} coordinates ({x}, {y})"
+            break
+        if state:
+            frame |= 1 << (y * width + x)
+        else:
+            frame &= ~(1 << (y * width + x))
+        current_pc += 2
+    if frame != emulator.framebuffer:
+        present(emulator, frame)
+    if error:
+        emulator.error = error
+        emulator.running = False
+    else:
+        emulator.pc = current_pc
+
+# Wide address mode. Address operands are 2 bytes, low byte first (see
+# em_constants.WIDE_OPERAND_SIZES). Instead of step()'s if/elif chain every
+# opcode has a handler taking (emulator, ram, pc); step_wide() checks the
+# instruction fits in RAM once, so handlers only validate operand values.
+# Data accesses are still plain bytearray indexing.
+
+def _fail(emulator, message):
+    emulator.running = False
+    emulator.error = message
+
+def _wide_pairs(state):
+    def handler(emulator, ram, pc):
+        draw_pairs(emulator, state)
+    return handler
+
+def _wide_wait(emulator, ram, pc):
+    emulator.delay = emulator.active_delay = ram[pc + 1]
+    emulator.pc = pc + 2
+
+def _wide_loop(emulator, ram, pc):
+    emulator.pc = emulator.entry_point
+
+def _wide_setall(emulator, ram, pc):
+    present(emulator, emulator.geometry.full)
+    emulator.pc = pc + 1
+
+def _wide_setnone(emulator, ram, pc):
+    present(emulator, 0)
+    emulator.pc = pc + 1
+
+def _wide_store(emulator, ram, pc):
+    addr = ram[pc + 1] | ram[pc + 2] << 8
+    if addr >= emulator.ram_size:
+        return _fail(emulator, f"Invalid RAM address: {addr}")
+    ram[addr] = ram[pc + 3]
+    emulator.pc = pc + 4
+
+def _wide_load(emulator, ram, pc):
+    addr = ram[pc + 1] | ram[pc + 2] << 8
+    if addr >= emulator.ram_size:
+        return _fail(emulator, f"Invalid RAM address: {addr}")
+    if ram[addr] > 0:
+        present(emulator, emulator.framebuffer | 1)
+    else:
+        present(emulator, emulator.framebuffer & ~1)
+    emulator.pc = pc + 3
+
+def _wide_jump(emulator, ram, pc):
+    addr = ram[pc + 1] | ram[pc + 2] << 8
+    if addr >= emulator.ram_size:
+        return _fail(emulator, f"Invalid jump address: {addr}")
+    emulator.pc = addr
+
+def _wide_jumpif(emulator, ram, pc):
+    addr = ram[pc + 1] | ram[pc + 2] << 8
+    ram_addr = ram[pc + 3] | ram[pc + 4] << 8
+    if addr >= emulator.ram_size or ram_addr >= emulator.ram_size:
+        return _fail(emulator, "Invalid jump address or RAM address")
+    emulator.pc = addr if ram[ram_addr] > 0 else pc + 5
+
+def _wide_binary(function):
+    """ADD/SUB/AND/OR/XOR: two source addresses and a result address"""
+    def handler(emulator, ram, pc):
+        addr1 = ram[pc + 1] | ram[pc + 2] << 8
+        addr2 = ram[pc + 3] | ram[pc + 4] << 8
+        addr_result = ram[pc + 5] | ram[pc + 6] << 8
+        size = emulator.ram_size
+        if addr1 >= size or addr2 >= size or addr_result >= size:
+            return _fail(emulator, "Invalid RAM address")
+        ram[addr_result] = function(ram[addr1], ram[addr2]) & 0xFF
+        emulator.pc = pc + 7
+    return handler
+
+def _wide_unary(function):
+    """NOT/SHL/SHR: source and result address"""
+    def handler(emulator, ram, pc):
+        addr = ram[pc + 1] | ram[pc + 2] << 8
+        addr_result = ram[pc + 3] | ram[pc + 4] << 8
+        if addr >= emulator.ram_size or addr_result >= emulator.ram_size:
+            return _fail(emulator, "Invalid RAM address")
+        ram[addr_result] = function(ram[addr]) & 0xFF
+        emulator.pc = pc + 5
+    return handler
+
+def _wide_immediate(function):
+    """ADDI..SHRI: source address, immediate byte, result address"""
+    def handler(emulator, ram, pc):
+        addr = ram[pc + 1] | ram[pc + 2] << 8
+        addr_result = ram[pc + 4] | ram[pc + 5] << 8
+        if addr >= emulator.ram_size or addr_result >= emulator.ram_size:
+            return _fail(emulator, "Invalid RAM address")
+        ram[addr_result] = function(ram[addr], ram[pc + 3]) & 0xFF
+        emulator.pc = pc + 6
+    return handler
+
+def _wide_scratch_store(emulator, ram, pc):
+    scratch_addr = ram[pc + 1]
+    if scratch_addr >= emulator.scratchpad_size:
+        return _fail(emulator, f"Invalid scratchpad address: {scratch_addr}")
+    emulator.scratchpad[scratch_addr] = ram[pc + 2]
+    emulator.save_scratchpad()
+    emulator.pc = pc + 3
+
+def _wide_scratch_load(emulator, ram, pc):
+    scratch_addr = ram[pc + 1]
+    ram_addr = ram[pc + 2] | ram[pc + 3] << 8
+    if scratch_addr >= emulator.scratchpad_size or ram_addr >= emulator.ram_size:
+        return _fail(emulator, "Invalid scratchpad or RAM address")
+    ram[ram_addr] = emulator.scratchpad[scratch_addr]
+    emulator.pc = pc + 4
+
+def _wide_scratch_add(emulator, ram, pc):
+    scratchpad = emulator.scratchpad
+    size = emulator.scratchpad_size
+    addr1, addr2, result = ram[pc + 1], ram[pc + 2], ram[pc + 3]
+    if addr1 >= size or addr2 >= size or result >= size:
+        return _fail(emulator, "Invalid scratchpad address")
+    scratchpad[result] = (scratchpad[addr1] + scratchpad[addr2]) & 0xFF
+    emulator.save_scratchpad()
+    emulator.pc = pc + 4
+
+def _wide_scratch_copy(emulator, ram, pc):
+    ram_addr = ram[pc + 1] | ram[pc + 2] << 8
+    scratch_addr = ram[pc + 3]
+    if ram_addr >= emulator.ram_size or scratch_addr >= emulator.scratchpad_size:
+        return _fail(emulator, "Invalid RAM or scratchpad address")
+    emulator.scratchpad[scratch_addr] = ram[ram_addr]
+    emulator.save_scratchpad()
+    emulator.pc = pc + 4
+
+def _wide_scratch_jumpif(emulator, ram, pc):
+    addr = ram[pc + 1] | ram[pc + 2] << 8
+    scratch_addr = ram[pc + 3]
+    if addr >= emulator.ram_size or scratch_addr >= emulator.scratchpad_size:
+        return _fail(emulator, "Invalid jump address or scratchpad address")
+    emulator.pc = addr if emulator.scratchpad[scratch_addr] > 0 else pc + 4
+
+def _wide_mask(emulator, ram, pc):
+    if apply_mask(emulator, ram[pc], ram[pc + 1] | ram[pc + 2] << 8):
+        emulator.pc = pc + 3
+
+def _wide_mask_ram(emulator, ram, pc):
+    addr = ram[pc + 1] | ram[pc + 2] << 8
+    if addr + 1 >= emulator.ram_size:
+        return _fail(emulator, f"Invalid RAM address: {addr}")
+    if apply_mask(emulator, ram[pc], ram[addr] | ram[addr + 1] << 8):
+        emulator.pc = pc + 3
+
+def _wide_memcpy(emulator, ram, pc):
+    src = ram[pc + 1] | ram[pc + 2] << 8
+    dst = ram[pc + 3] | ram[pc + 4] << 8
+    count = ram[pc + 5]
+    if src + count > emulator.ram_size or dst + count > emulator.ram_size:
+        return _fail(emulator, "Invalid RAM range")
+    ram[dst:dst + count] = ram[src:src + count]
+    emulator.pc = pc + 6
+
+def _wide_memset(emulator, ram, pc):
+    dst = ram[pc + 1] | ram[pc + 2] << 8
+    count = ram[pc + 4]
+    if dst + count > emulator.ram_size:
+        return _fail(emulator, "Invalid RAM range")
+    ram[dst:dst + count] = bytes((ram[pc + 3],)) * count
+    emulator.pc = pc + 5
+
+def _wide_scratch_load_block(emulator, ram, pc):
+    scratch_addr = ram[pc + 1]
+    ram_addr = ram[pc + 2] | ram[pc + 3] << 8
+    count = ram[pc + 4]
+    if scratch_addr + count > emulator.scratchpad_size or ram_addr + count > emulator.ram_size:
+        return _fail(emulator, "Invalid scratchpad or RAM range")
+    ram[ram_addr:ram_addr + count] = emulator.scratchpad[scratch_addr:scratch_addr + count]
+    emulator.pc = pc + 5
+
+def _wide_scratch_copy_block(emulator, ram, pc):
+    ram_addr = ram[pc + 1] | ram[pc + 2] << 8
+    scratch_addr = ram[pc + 3]
+    count = ram[pc + 4]
+    if ram_addr + count > emulator.ram_size or scratch_addr + count > emulator.scratchpad_size:
+        return _fail(emulator, "Invalid RAM or scratchpad range")
+    emulator.scratchpad[scratch_addr:scratch_addr + count] = ram[ram_addr:ram_addr + count]
+    emulator.save_scratchpad()  # One flush for the whole block
+    emulator.pc = pc + 5
+
+def _wide_djnz(emulator, ram, pc):
+    ram_addr = ram[pc + 1] | ram[pc + 2] << 8
+    addr = ram[pc + 3] | ram[pc + 4] << 8
+    if addr >= emulator.ram_size or ram_addr >= emulator.ram_size:
+        return _fail(emulator, "Invalid jump address or RAM address")
+    value = (ram[ram_addr] - 1) & 0xFF
+    ram[ram_addr] = value
+    emulator.pc = addr if value else pc + 5
+
+WIDE_HANDLERS = {
+    SET: _wide_pairs(True),
+    CLEAR: _wide_pairs(False),
+    WAIT: _wide_wait,
+    LOOP: _wide_loop,
+    STORE: _wide_store,
+    LOAD: _wide_load,
+    JUMP: _wide_jump,
+    JUMPIF: _wide_jumpif,
+    ADD: _wide_binary(operator.add),
+    SETALL: _wide_setall,
+    SETNONE: _wide_setnone,
+    SCRATCH_STORE: _wide_scratch_store,
+    SCRATCH_LOAD: _wide_scratch_load,
+    SCRATCH_ADD: _wide_scratch_add,
+    SCRATCH_COPY: _wide_scratch_copy,
+    SCRATCH_JUMPIF: _wide_scratch_jumpif,
+    AND: _wide_binary(operator.and_),
+    OR: _wide_binary(operator.or_),
+    XOR: _wide_binary(operator.xor),
+    NOT: _wide_unary(operator.invert),
+    SUB: _wide_binary(operator.sub),
+    SHL: _wide_unary(lambda value: value << 1),
+    SHR: _wide_unary(lambda value: value >> 1),
+    SETMASK: _wide_mask,
+    CLEARMASK: _wide_mask,
+    TOGGLEMASK: _wide_mask,
+    LOADMASK: _wide_mask,
+    SETMASK_RAM: _wide_mask_ram,
+    CLEARMASK_RAM: _wide_mask_ram,
+    TOGGLEMASK_RAM: _wide_mask_ram,
+    LOADMASK_RAM: _wide_mask_ram,
+    MEMCPY: _wide_memcpy,
+    MEMSET: _wide_memset,
+    SCRATCH_LOAD_BLOCK: _wide_scratch_load_block,
+    SCRATCH_COPY_BLOCK: _wide_scratch_copy_block,
+    ADDI: _wide_immediate(operator.add),
+    SUBI: _wide_immediate(operator.sub),
+    ANDI: _wide_immediate(operator.and_),
+    ORI: _wide_immediate(operator.or_),
+    XORI: _wide_immediate(operator.xor),
+    SHLI: _wide_immediate(lambda value, shift: value << shift if shift < 8 else 0),
+    SHRI: _wide_immediate(operator.rshift),
+    DJNZ: _wide_djnz,
+}
+
+# Length check done by step_wide() before dispatch; draw_pairs() reports
+# truncated SET/CLEAR itself
+WIDE_LENGTHS = {opcode: instruction_length(opcode, True) for opcode in WIDE_HANDLERS}
+WIDE_LENGTHS[SET] = WIDE_LENGTHS[CLEAR] = 1
+
+def step_wide(emulator):
+    """step() for the wide address mode"""
+    emulator.cycles += 1
+    if emulator.busy > 0:  # Still paying for a multi-cycle instruction
+        emulator.busy -= 1
+        return
+
+    if emulator.delay > 0:
+        emulator.delay -= 1
+        if emulator.delay == 0:
+            emulator.active_delay = 0
+        return
+
+    pc = emulator.pc
+    if pc >= emulator.ram_size:
+        emulator.running = False
+        emulator.error = "Program counter out of range"
+        return
+
+    ram = emulator.ram
+    opcode = ram[pc]
+    emulator.busy = emulator.timing.extra_cycles(ram, pc, opcode, True)
+    if opcode == 0:
+        emulator.running = False
+        return
+    handler = WIDE_HANDLERS.get(opcode)
+    if handler is None:
+        emulator.running = False
+        emulator.error = f"Unknown opcode: {opcode}"
+        return
+    if pc + WIDE_LENGTHS[opcode] > emulator.ram_size:
+        emulator.running = False
+        emulator.error = "Instruction arguments out of range"
+        return
+    handler(emulator, ram, pc)
\ No newline at end of file
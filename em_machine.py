@@ -0,0 +1,151 @@
+from em_core import Emulator
+from em_storage import save_scratchpad, load_scratchpad
+from em_framebuffer import get_geometry
+
+class SharedDisplay:
+    """Display sink the cores of a Machine present through.
+
+    Every core keeps its own framebuffer attribute (SETMASK and friends
+    read it), so a frame presented by one core is copied to all of them
+    before it is forwarded to the real display.
+    """
+    def __init__(self, machine):
+        self.machine = machine
+        self.target = None
+
+    def set_frame(self, frame):
+        machine = self.machine
+        machine.framebuffer = frame
+        for core in machine.cores:
+            core.framebuffer = frame
+        if self.target is not None:
+            self.target.set_frame(frame)
+
+    def update_pixel(self, x, y, state):
+        bit = self.machine.geometry.bit(x, y)
+        frame = self.machine.framebuffer
+        self.set_frame((frame | bit) if state else (frame & ~bit))
+
+    def clear_all(self):
+        self.set_frame(0)
+
+class Machine:
+    """Several Forgematrix cores sharing one scratchpad and one display.
+
+    Each core is an Emulator with its own PC, RAM, delay and timing state.
+    run() schedules them deterministically: core 0, 1, ... each run for
+    quantum cycles, then the machine synchronizes (flushes the shared
+    scratchpad to scratchpad.dat once, if it changed). quantum=1 is exact
+    cycle interleaving; larger quanta run each core in Emulator.run()'s
+    tight loop between synchronization points, so a core only sees other
+    cores' scratchpad and display writes from earlier batches or earlier
+    in the same round.
+    """
+    def __init__(self, display=None, cores=2, ram_size=64, timing="legacy", geometry=None,
+                 wide=None, quantum=1):
+        if cores < 1:
+            raise ValueError("A machine needs at least one core")
+        if quantum < 1:
+            raise ValueError("Quantum must be at least one cycle")
+        self.quantum = quantum
+        self.geometry = get_geometry(geometry)
+        self.framebuffer = 0
+        self.cycles = 0  # Machine cycles; every running core advances by this much
+        self.scratchpad_size = 8
+        self.scratchpad = bytearray(self.scratchpad_size)
+        self.load_scratchpad()
+        self.scratchpad_dirty = False
+        self.shared_display = SharedDisplay(self)
+        self.shared_display.target = display
+        self.cores = []
+        for _ in range(cores):
+            core = Emulator(self.shared_display, ram_size=ram_size, timing=timing,
+                            geometry=self.geometry, wide=wide, scratchpad=self.scratchpad)
+            core.save_scratchpad = self._scratchpad_written  # Written back at sync points
+            self.cores.append(core)
+
+    @property
+    def display(self):
+        return self.shared_display.target
+
+    @display.setter
+    def display(self, display):
+        """Replace the real display (e.g. DisplayRecorder.attach(machine))"""
+        self.shared_display.target = display
+
+    @property
+    def running(self):
+        return any(core.running for core in self.cores)
+
+    @property
+    def error(self):
+        """First core error as "Core n: message", or None"""
+        for index, core in enumerate(self.cores):
+            if core.error:
+                return f"Core {index}: {core.error}"
+        return None
+
+    def load(self, index, code):
+        """Assemble program text into core index and mark it running"""
+        core = self.cores[index]
+        if not core.parse_and_load_program(code):
+            return False
+        core.running = True
+        return True
+
+    def load_image(self, index, image, entry_point=0):
+        """Load a raw RAM image into core index and mark it running"""
+        core = self.cores[index]
+        if not core.load_image(image, entry_point):
+            return False
+        core.running = True
+        return True
+
+    def run(self, cycles):
+        """Run every core for up to cycles cycles; returns machine cycles executed.
+
+        Stops early once no core is running or any core reports an error.
+        """
+        executed = 0
+        quantum = self.quantum
+        cores = self.cores
+        while executed < cycles:
+            batch = min(quantum, cycles - executed)
+            if batch == 1:
+                for core in cores:
+                    if core.running and core.hooks is None:
+                        core.step_function(core)
+                    elif core.running:
+                        core.step()  # Through the instrumented loop
+            else:
+                for core in cores:
+                    if core.running:
+                        core.run(batch)
+            executed += batch
+            self.cycles += batch
+            self.sync()
+            if not self.running or self.error:
+                break
+        return executed
+
+    def sync(self):
+        """Synchronization point: write the shared scratchpad back if a core changed it"""
+        if self.scratchpad_dirty:
+            self.scratchpad_dirty = False
+            self.save_scratchpad()
+
+    def _scratchpad_written(self):
+        self.scratchpad_dirty = True
+
+    def save_scratchpad(self):
+        save_scratchpad(self)
+
+    def load_scratchpad(self):
+        load_scratchpad(self)
+
+    def reset(self):
+        """Reset every core (programs are cleared) and the shared display"""
+        for core in self.cores:
+            core.reset()
+        self.cycles = 0
+        self.sync()
\ No newline at end of file
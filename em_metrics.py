@@ -0,0 +1,209 @@
+"""Runtime metrics: is the emulator keeping up with real time?
+
+A Metrics object holds counters, gauges and histograms that the run loops
+update once per batch (EmulatorWorker, AsyncRunner), the display updates
+per paint and the GUI per refresh. Read them from Python (values(),
+sample()), as Prometheus text (render()) from a localhost endpoint
+(serve_metrics) or a periodically rewritten file (MetricsFile):
+
+    metrics = Metrics()
+    server = serve_metrics(metrics, port=9108)   # http://127.0.0.1:9108/metrics
+    writer = MetricsFile(metrics, "/var/lib/node_exporter/forgematrix.prom").start()
+
+Nothing is recorded while no Metrics is attached.
+"""
+import os
+import threading
+import time
+from collections import namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds in seconds for the duration histograms
+DURATION_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+class Counter:
+    """Monotonically increasing value"""
+    kind = "counter"
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def samples(self):
+        yield self.name, "", self.value
+
+class Gauge(Counter):
+    """Value that goes up and down"""
+    kind = "gauge"
+
+    def set(self, value):
+        self.value = value
+
+class Histogram:
+    """Observations counted in cumulative buckets, plus their sum and count"""
+    kind = "histogram"
+
+    def __init__(self, name, help, buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()  # Readers on other threads see sum and count agree
+
+    def observe(self, value):
+        index = 0
+        for bound in self.buckets:
+            if value <= bound:
+                break
+            index += 1
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def samples(self):
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        cumulative = 0
+        for bound, bucket in zip(self.buckets + ("+Inf",), counts):
+            cumulative += bucket
+            yield self.name + "_bucket", f'{{le="{bound}"}}', cumulative
+        yield self.name + "_sum", "", total
+        yield self.name + "_count", "", count
+
+# Metrics at one moment; two of them give rates for a HUD
+MetricsSample = namedtuple("MetricsSample",
+                           "time cycles lag batch_sum batch_count frames gui_sum gui_count scratchpad_flushes")
+
+class Metrics:
+    """The emulator's runtime metrics"""
+    def __init__(self, prefix="forgematrix"):
+        self.cycles = Counter(f"{prefix}_cycles_total", "Emulated cycles executed")
+        self.lag = Gauge(f"{prefix}_cycle_lag", "Cycles the emulation is behind the wall clock after the last batch")
+        self.batch_seconds = Histogram(f"{prefix}_batch_seconds", "Wall time spent executing one batch of cycles")
+        self.frames = Counter(f"{prefix}_frames_painted_total", "Display frames painted")
+        self.gui_seconds = Histogram(f"{prefix}_gui_handler_seconds", "Wall time of one GUI refresh handler")
+        self.scratchpad_flushes = Counter(f"{prefix}_scratchpad_flushes_total", "Scratchpad writes to scratchpad.dat")
+        self.metrics = [self.cycles, self.lag, self.batch_seconds, self.frames, self.gui_seconds,
+                        self.scratchpad_flushes]
+
+    def batch(self, cycles, seconds, lag=0):
+        """Record a batch of cycles run in seconds, leaving the emulation lag cycles behind"""
+        self.cycles.inc(cycles)
+        self.batch_seconds.observe(seconds)
+        self.lag.set(max(lag, 0))
+
+    @staticmethod
+    def clock_lag(elapsed, hz, cycles):
+        """Cycles an emulation that has run cycles is behind a clock that has run elapsed seconds at hz"""
+        return max(int(elapsed * hz) - cycles, 0)
+
+    def values(self):
+        """{sample name: value} for every sample, histogram buckets included"""
+        return {name + labels: value for metric in self.metrics for name, labels, value in metric.samples()}
+
+    def sample(self):
+        return MetricsSample(time.perf_counter(), self.cycles.value, self.lag.value,
+                             self.batch_seconds.sum, self.batch_seconds.count, self.frames.value,
+                             self.gui_seconds.sum, self.gui_seconds.count, self.scratchpad_flushes.value)
+
+    def render(self):
+        """Prometheus text exposition format"""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Replace path with the current exposition in one rename, so readers never see half a file"""
+        temporary = f"{path}.tmp"
+        with open(temporary, "w") as f:
+            f.write(self.render())
+        os.replace(temporary, path)
+
+def format_hud(previous, current):
+    """HUD lines with the rates between two MetricsSamples"""
+    elapsed = max(current.time - previous.time, 1e-9)
+    batches = current.batch_count - previous.batch_count
+    refreshes = current.gui_count - previous.gui_count
+    batch_ms = 1000 * (current.batch_sum - previous.batch_sum) / batches if batches else 0.0
+    gui_ms = 1000 * (current.gui_sum - previous.gui_sum) / refreshes if refreshes else 0.0
+    return [
+        f"steps/s {(current.cycles - previous.cycles) / elapsed:9.0f}",
+        f"lag     {current.lag:9d} cycles",
+        f"batch   {batch_ms:9.3f} ms",
+        f"paint   {(current.frames - previous.frames) / elapsed:9.1f} fps",
+        f"gui     {gui_ms:9.3f} ms",
+        f"flushes {current.scratchpad_flushes:9d}",
+    ]
+
+class MetricsFile:
+    """Rewrites a Prometheus text file every interval seconds on a daemon thread.
+
+    A failed write leaves the OSError in error (cleared by the next
+    successful write) and is passed to on_error(error), on the thread, if
+    given; the thread keeps trying. stop() raises it for the final write.
+    """
+    def __init__(self, metrics, path, interval=5.0, on_error=None):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.on_error = on_error
+        self.error = None  # OSError of the last write, None after a successful one
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="metrics-file", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            try:
+                self.metrics.write(self.path)
+                self.error = None
+            except OSError as e:
+                self.error = e
+                if self.on_error is not None:
+                    self.on_error(e)
+            if self._stop.wait(self.interval):
+                return
+
+    def stop(self):
+        """Stop the thread after writing the file one last time"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.metrics.write(self.path)
+
+def serve_metrics(metrics, port=9108, host="127.0.0.1"):
+    """Serve render() at http://host:port/metrics from a daemon thread; returns the server (call shutdown())"""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = metrics.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Scrapes are not worth a line each
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
\ No newline at end of file
@@ -1,472 +1,174 @@
+import re
+from functools import lru_cache
+from em_constants import (
+    INSTRUCTIONS, OPERAND_TARGET, OPERAND_RAM_READ, OPERAND_RAM_WRITE, OPERAND_RAM_MODIFY,
+    OPERAND_RAM_READ_WORD, OPERAND_SCRATCH_READ, OPERAND_SCRATCH_WRITE, OPERAND_IMMEDIATE,
+    OPERAND_PAIRS, OPERAND_MASK, OPERAND_COUNT, OPERAND_SIZES, WIDE_OPERAND_SIZES,
+    MASK_OPCODES, MASK_PIXELS
+)
+from em_disasm import instruction_length
+from em_framebuffer import get_geometry
+
+# Mnemonic -> operand kinds, in source order; EP is a directive, not an opcode
+SOURCE_SYNTAX = {name: kinds for name, kinds in INSTRUCTIONS.values()}
+SOURCE_SYNTAX["EP"] = (OPERAND_TARGET,)
+OPCODES = {name: opcode for opcode, (name, kinds) in INSTRUCTIONS.items()}
+MASK_COMMANDS = {INSTRUCTIONS[opcode][0] for opcode in MASK_OPCODES}
+
+def parse_number(token):
+    """Parse a decimal, 0x hex or 0b binary literal"""
+    try:
+        return int(token, 0)
+    except ValueError:
+        return int(token)  # Decimal with leading zeros
+
+def encoded_length(cmd, pairs=0, wide=False):
+    """RAM bytes an instruction takes; pairs is the SET/CLEAR pair count"""
+    return instruction_length(OPCODES[cmd], wide) + 2 * pairs
+
+def _operand_value(cmd, kind, token):
+    # Immediates and masks accept 0x/0b literals; WAIT and addresses are plain integers
+    if kind in (OPERAND_IMMEDIATE, OPERAND_MASK) and cmd != "WAIT":
+        return parse_number(token)
+    return int(token)
+
 def parse_and_load_program(emulator, code):
-    """Parse program text and load directly into RAM"""
+    """Parse program text and load directly into RAM.
+
+    Lines are checked with diagnose_line(), so the editor and the assembler
+    agree, then encoded from the instruction table. In the wide address
+    mode (emulator.wide) address operands take 2 bytes, low byte first.
+    """
     emulator.error = None
     emulator.reset()
     emulator.pc_to_line = {}
-    
+    sizes = WIDE_OPERAND_SIZES if emulator.wide else OPERAND_SIZES
     ram_ptr = 0  # Current position in RAM
-    
     for line_num, line in enumerate(code, 1):
-        line = line.strip().upper()
-        if not line or line.startswith('#'):  # Skip empty lines and comments
+        problems = diagnose_line(line, emulator.ram_size, emulator.scratchpad_size, emulator.geometry)
+        if problems:
+            emulator.error = f"Error on line {line_num}: {problems[0][2]}"
+            return False
+        parts = line.strip().upper().split()
+        if not parts or parts[0].startswith('#'):  # Skip empty lines and comments
             continue
-            
-        parts = line.split()
         cmd = parts[0]
-        
-        try:
-            if cmd == "EP":
-                current_address = ram_ptr
-                emulator.pc_to_line[current_address] = line_num
-                entry_point = int(parts[1])
-                if entry_point >= emulator.ram_size:
-                    emulator.error = f"Error on line {line_num}: Entry point out of range"
-                    return False
-                
-                # Set the entry point AND adjust the load position
-                emulator.entry_point = entry_point
-                emulator.entry_point = entry_point
-                ram_ptr = entry_point
- 
-            elif cmd == "SET":
-                current_address = ram_ptr
-                emulator.pc_to_line[current_address] = line_num
-                params_str = ' '.join(parts[1:])
-                pairs = []
-                for pair in params_str.split(','):
-                    pair = pair.strip()
-                    if not pair:
-                        continue
-                    try:
-                        x, y = pair.split()
-                        pairs.append((int(x), int(y)))  # Fix extra parenthesis here
-                    except:
-                        emulator.error = f"Error on line {line_num}: Invalid pair '{pair}'"
-                        return False
-                if not pairs:
-                    emulator.error = f"Error on line {line_num}: SET requires pairs"
-                    return False
-                required_bytes = 1 + 1 + 2 * len(pairs)  # opcode + count + pairs
-                if ram_ptr + required_bytes > emulator.ram_size:
-                    emulator.error = f"Error on line {line_num}: Not enough RAM"
-                    return False
-                emulator.ram[ram_ptr] = emulator.SET
-                emulator.ram[ram_ptr + 1] = len(pairs)  # Write count
-                ptr = ram_ptr + 2
-                for x, y in pairs:
-                    emulator.ram[ptr] = x
-                    emulator.ram[ptr + 1] = y
-                    ptr += 2
-                ram_ptr += required_bytes
-
-            elif cmd == "CLEAR":
-                current_address = ram_ptr
-                emulator.pc_to_line[current_address] = line_num
-                params_str = ' '.join(parts[1:])
-                pairs = []
-                for pair in params_str.split(','):
-                    pair = pair.strip()
-                    if not pair:
-                        continue
-                    try:
-                        x, y = pair.split()
-                        pairs.append((int(x), int(y)))  # Fix here too
-                    except:
-                        emulator.error = f"Error on line {line_num}: Invalid pair '{pair}'"
-                        return False
-                if not pairs:
-                    emulator.error = f"Error on line {line_num}: CLEAR requires pairs"
-                    return False
-                required_bytes = 1 + 1 + 2 * len(pairs)  # opcode + count + pairs
-                if ram_ptr + required_bytes > emulator.ram_size:
-                    emulator.error = f"Error on line {line_num}: Not enough RAM"
-                    return False
-                emulator.ram[ram_ptr] = emulator.CLEAR
-                emulator.ram[ram_ptr + 1] = len(pairs)  # Write count
-                ptr = ram_ptr + 2
-                for x, y in pairs:
-                    emulator.ram[ptr] = x
-                    emulator.ram[ptr + 1] = y
-                    ptr += 2
-                ram_ptr += required_bytes
-                
-            elif cmd == "WAIT":
-                current_address = ram_ptr
-                emulator.pc_to_line[current_address] = line_num
-                if ram_ptr + 2 > emulator.ram_size:
-                    emulator.error = f"Error on line {line_num}: Not enough RAM"
-                    return False
-                emulator.ram[ram_ptr] = emulator.WAIT
-                emulator.ram[ram_ptr + 1] = int(parts[1])  # cycles
-                required_bytes = 2
-                ram_ptr += 2
-                
-            elif cmd == "LOOP":
-                emulator.pc = emulator.entry_point
-                current_address = ram_ptr
-                emulator.pc_to_line[current_address] = line_num
-                if ram_ptr + 1 > emulator.ram_size:
-                    emulator.error = f"Error on line {line_num}: Not enough RAM"
-                    return False
-                emulator.ram[ram_ptr] = emulator.LOOP
-                required_bytes = 1
-                ram_ptr += required_bytes
-                
-            elif cmd == "STORE":
-                current_address = ram_ptr
-                emulator.pc_to_line[current_address] = line_num
-                if ram_ptr + 3 > emulator.ram_size:
-                    emulator.error = f"Error on line {line_num}: Not enough RAM"
-                    return False
-                addr = int(parts[1])
-                value = int(parts[2])
-                
-                if addr >= emulator.ram_size:
-                    emulator.error = f"Error on line {line_num}: Address {addr} out of range"
-                    return False
-                    
-                emulator.ram[ram_ptr] = emulator.STORE
-                emulator.ram[ram_ptr + 1] = addr
-                emulator.ram[ram_ptr + 2] = value & 0xFF
-                emulator.pc_to_line[current_address] = line_num
-                required_bytes = 3
-                ram_ptr += required_bytes
-                
-            elif cmd == "LOAD":
-                current_address = ram_ptr
-                emulator.pc_to_line[current_address] = line_num
-                if ram_ptr + 2 > emulator.ram_size:
-                    emulator.error = f"Error on line {line_num}: Not enough RAM"
-                    return False
-                addr = int(parts[1])
-                
-                if addr >= emulator.ram_size:
-                    emulator.error = f"Error on line {line_num}: Address {addr} out of range"
-                    return False
-                    
-                emulator.ram[ram_ptr] = emulator.LOAD
-                emulator.ram[ram_ptr + 1] = addr
-                required_bytes = 2
-                ram_ptr += required_bytes
-                
-            elif cmd == "JUMP":
-                current_address = ram_ptr
-                emulator.pc_to_line[current_address] = line_num
-                if ram_ptr + 2 > emulator.ram_size:
-                    emulator.error = f"Error on line {line_num}: Not enough RAM"
-                    return False
-                addr = int(parts[1])
-                
-                if addr >= emulator.ram_size:
-                    emulator.error = f"Error on line {line_num}: Address {addr} out of range"
-                    return False
-                    
-                emulator.ram[ram_ptr] = emulator.JUMP
-                emulator.ram[ram_ptr + 1] = addr
-                required_bytes = 2
-                ram_ptr += required_bytes
-            
-            elif cmd == "ADD":
-                current_address = ram_ptr
-                emulator.pc_to_line[current_address] = line_num
-                if ram_ptr + 4 > emulator.ram_size:
-                    emulator.error = f"Error on line {line_num}: Not enough RAM"
-                    return False
-                addr1 = int(parts[1])
-                addr2 = int(parts[2])
-                addr_result = int(parts[3])
-
-                if addr1 >= emulator.ram_size or addr2 >= emulator.ram_size or addr_result >= emulator.ram_size:
-                    emulator.error = f"Error on line {line_num}: Address out of range"
-                    return False
-
-                emulator.ram[ram_ptr] = emulator.ADD
-                emulator.ram[ram_ptr + 1] = addr1
-                emulator.ram[ram_ptr + 2] = addr2
-                emulator.ram[ram_ptr + 3] = addr_result
-                required_bytes = 4
-                ram_ptr += required_bytes
-                
-            elif cmd == "JUMPIF":
-                current_address = ram_ptr
-                emulator.pc_to_line[current_address] = line_num
-                if ram_ptr + 3 > emulator.ram_size:
-                    emulator.error = f"Error on line {line_num}: Not enough RAM"
-                    return False
-                addr = int(parts[1])
-                ram_addr = int(parts[2])
-                
-                if addr >= emulator.ram_size or ram_addr >= emulator.ram_size:
-                    emulator.error = f"Error on line {line_num}: Address out of range"
-                    return False
-                    
-                emulator.ram[ram_ptr] = emulator.JUMPIF
-                emulator.ram[ram_ptr + 1] = addr
-                emulator.ram[ram_ptr + 2] = ram_addr
-                required_bytes = 3
-                ram_ptr += required_bytes
-                
-            elif cmd == "SETALL":
-                current_address = ram_ptr
-                emulator.pc_to_line[current_address] = line_num
-                if ram_ptr + 1 > emulator.ram_size:
-                    emulator.error = f"Error on line {line_num}: Not enough RAM"
-                    return False
-                emulator.ram[ram_ptr] = emulator.SETALL
-                required_bytes = 1
-                ram_ptr += required_bytes
-                
-            elif cmd == "SETNONE":
-                current_address = ram_ptr
-                emulator.pc_to_line[current_address] = line_num
-                if ram_ptr + 1 > emulator.ram_size:
-                    emulator.error = f"Error on line {line_num}: Not enough RAM"
-                    return False
-                emulator.ram[ram_ptr] = emulator.SETNONE
-                required_bytes = 1
-                ram_ptr += required_bytes
-                
-            elif cmd == "SCRATCH_STORE":
-                current_address = ram_ptr
-                emulator.pc_to_line[current_address] = line_num
-                if ram_ptr + 3 > emulator.ram_size:
-                    emulator.error = f"Error on line {line_num}: Not enough RAM"
-                    return False
-                scratch_addr = int(parts[1])
-                value = int(parts[2])
-                
-                if scratch_addr >= emulator.scratchpad_size:
-                    emulator.error = f"Error on line {line_num}: Scratchpad address {scratch_addr} out of range"
-                    return False
-                    
-                emulator.ram[ram_ptr] = emulator.SCRATCH_STORE
-                emulator.ram[ram_ptr + 1] = scratch_addr
-                emulator.ram[ram_ptr + 2] = value & 0xFF
-                required_bytes = 3
-                ram_ptr += required_bytes
-                
-            elif cmd == "SCRATCH_LOAD":
-                current_address = ram_ptr
-                emulator.pc_to_line[current_address] = line_num
-                if ram_ptr + 3 > emulator.ram_size:
-                    emulator.error = f"Error on line {line_num}: Not enough RAM"
-                    return False
-                scratch_addr = int(parts[1])
-                ram_addr = int(parts[2])
-                
-                if scratch_addr >= emulator.scratchpad_size:
-                    emulator.error = f"Error on line {line_num}: Scratchpad address {scratch_addr} out of range"
-                    return False
-                if ram_addr >= emulator.ram_size:
-                    emulator.error = f"Error on line {line_num}: RAM address {ram_addr} out of range"
-                    return False
-                    
-                emulator.ram[ram_ptr] = emulator.SCRATCH_LOAD
-                emulator.ram[ram_ptr + 1] = scratch_addr
-                emulator.ram[ram_ptr + 2] = ram_addr
-                required_bytes = 3
-                ram_ptr += required_bytes
-                
-            elif cmd == "SCRATCH_ADD":
-                current_address = ram_ptr
-                emulator.pc_to_line[current_address] = line_num
-                if ram_ptr + 4 > emulator.ram_size:
-                    emulator.error = f"Error on line {line_num}: Not enough RAM"
-                    return False
-                scratch_addr1 = int(parts[1])
-                scratch_addr2 = int(parts[2])
-                scratch_result = int(parts[3])
-                
-                if scratch_addr1 >= emulator.scratchpad_size or scratch_addr2 >= emulator.scratchpad_size or scratch_result >= emulator.scratchpad_size:
-                    emulator.error = f"Error on line {line_num}: Scratchpad address out of range"
-                    return False
-                    
-                emulator.ram[ram_ptr] = emulator.SCRATCH_ADD
-                emulator.ram[ram_ptr + 1] = scratch_addr1
-                emulator.ram[ram_ptr + 2] = scratch_addr2
-                emulator.ram[ram_ptr + 3] = scratch_result
-                required_bytes = 4
-                ram_ptr += required_bytes
-                
-            elif cmd == "SCRATCH_COPY":
-                current_address = ram_ptr
-                emulator.pc_to_line[current_address] = line_num
-                required_bytes = 3
-                if ram_ptr + required_bytes > emulator.ram_size:
-                    emulator.error = f"Error on line {line_num}: Not enough RAM"
-                    return False
-                ram_addr = int(parts[1])
-                scratch_addr = int(parts[2])
-    
-                if ram_addr >= emulator.ram_size:
-                    emulator.error = f"Error on line {line_num}: RAM address {ram_addr} out of range"
-                    return False
-                if scratch_addr >= emulator.scratchpad_size:
-                    emulator.error = f"Error on line {line_num}: Scratchpad address {scratch_addr} out of range"
-                    return False
-        
-                emulator.ram[ram_ptr] = emulator.SCRATCH_COPY
-                emulator.ram[ram_ptr + 1] = ram_addr
-                emulator.ram[ram_ptr + 2] = scratch_addr
-                ram_ptr += required_bytes
-                
-            elif cmd == "SCRATCH_JUMPIF":
-                current_address = ram_ptr
-                emulator.pc_to_line[current_address] = line_num
-                if ram_ptr + 3 > emulator.ram_size:
-                    emulator.error = f"Error on line {line_num}: Not enough RAM"
-                    return False
-                addr = int(parts[1])
-                scratch_addr = int(parts[2])
-                
-                if addr >= emulator.ram_size:
-                    emulator.error = f"Error on line {line_num}: Jump address {addr} out of range"
-                    return False
-                if scratch_addr >= emulator.scratchpad_size:
-                    emulator.error = f"Error on line {line_num}: Scratchpad address {scratch_addr} out of range"
-                    return False
-                    
-                emulator.ram[ram_ptr] = emulator.SCRATCH_JUMPIF
-                emulator.ram[ram_ptr + 1] = addr
-                emulator.ram[ram_ptr + 2] = scratch_addr
-                required_bytes = 3
-                ram_ptr += required_bytes
+        if cmd == "EP":  # Sets the entry point and moves the load position; no code of its own
+            emulator.entry_point = ram_ptr = int(parts[1])
+            continue
+        kinds = SOURCE_SYNTAX[cmd]
+        encoded = bytearray((OPCODES[cmd],))
+        if kinds == (OPERAND_PAIRS,):
+            pairs = [pair.split() for pair in ' '.join(parts[1:]).split(',') if pair.strip()]
+            encoded.append(len(pairs))
+            encoded += bytes(int(coord) for pair in pairs for coord in pair)
+        else:
+            for kind, token in zip(kinds, parts[1:]):
+                size = sizes.get(kind, 1)
+                value = _operand_value(cmd, kind, token) & ((1 << 8 * size) - 1)
+                encoded += value.to_bytes(size, "little")
+        if ram_ptr + len(encoded) > emulator.ram_size:
+            emulator.error = f"Error on line {line_num}: Not enough RAM"
+            return False
+        emulator.pc_to_line[ram_ptr] = line_num
+        emulator.ram[ram_ptr:ram_ptr + len(encoded)] = encoded
+        ram_ptr += len(encoded)
 
-            elif cmd == "AND":
-                current_address = ram_ptr
-                emulator.pc_to_line[current_address] = line_num
-                if ram_ptr + 4 > emulator.ram_size:
-                    emulator.error = f"Error on line {line_num}: Not enough RAM"
-                    return False
-                addr1 = int(parts[1])
-                addr2 = int(parts[2])
-                addr_result = int(parts[3])
-                if addr1 >= emulator.ram_size or addr2 >= emulator.ram_size or addr_result >= emulator.ram_size:
-                    emulator.error = f"Error on line {line_num}: Address out of range"
-                    return False
-                emulator.ram[ram_ptr] = emulator.AND
-                emulator.ram[ram_ptr + 1] = addr1
-                emulator.ram[ram_ptr + 2] = addr2
-                emulator.ram[ram_ptr + 3] = addr_result
-                required_bytes = 4
-                ram_ptr += required_bytes
+    emulator.pc = emulator.entry_point
+    emulator.disassemble()
+    return True
 
-            elif cmd == "OR":
-                current_address = ram_ptr
-                emulator.pc_to_line[current_address] = line_num
-                if ram_ptr + 4 > emulator.ram_size:
-                    emulator.error = f"Error on line {line_num}: Not enough RAM"
-                    return False
-                addr1 = int(parts[1])
-                addr2 = int(parts[2])
-                addr_result = int(parts[3])
-                if addr1 >= emulator.ram_size or addr2 >= emulator.ram_size or addr_result >= emulator.ram_size:
-                    emulator.error = f"Error on line {line_num}: Address out of range"
-                    return False
-                emulator.ram[ram_ptr] = emulator.OR
-                emulator.ram[ram_ptr + 1] = addr1
-                emulator.ram[ram_ptr + 2] = addr2
-                emulator.ram[ram_ptr + 3] = addr_result
-                required_bytes = 4
-                ram_ptr += required_bytes
+_TOKEN_RE = re.compile(r"\S+")
 
-            elif cmd == "XOR":
-                current_address = ram_ptr
-                emulator.pc_to_line[current_address] = line_num
-                if ram_ptr + 4 > emulator.ram_size:
-                    emulator.error = f"Error on line {line_num}: Not enough RAM"
-                    return False
-                addr1 = int(parts[1])
-                addr2 = int(parts[2])
-                addr_result = int(parts[3])
-                if addr1 >= emulator.ram_size or addr2 >= emulator.ram_size or addr_result >= emulator.ram_size:
-                    emulator.error = f"Error on line {line_num}: Address out of range"
-                    return False
-                emulator.ram[ram_ptr] = emulator.XOR
-                emulator.ram[ram_ptr + 1] = addr1
-                emulator.ram[ram_ptr + 2] = addr2
-                emulator.ram[ram_ptr + 3] = addr_result
-                required_bytes = 4
-                ram_ptr += required_bytes
+def diagnose_line(line, ram_size=64, scratchpad_size=8, geometry=None):
+    """Check one source line the way the assembler would, without assembling it.
 
-            elif cmd == "NOT":
-                current_address = ram_ptr
-                emulator.pc_to_line[current_address] = line_num
-                if ram_ptr + 3 > emulator.ram_size:
-                    emulator.error = f"Error on line {line_num}: Not enough RAM"
-                    return False
-                addr = int(parts[1])
-                addr_result = int(parts[2])
-                if addr >= emulator.ram_size or addr_result >= emulator.ram_size:
-                    emulator.error = f"Error on line {line_num}: Address out of range"
-                    return False
-                emulator.ram[ram_ptr] = emulator.NOT
-                emulator.ram[ram_ptr + 1] = addr
-                emulator.ram[ram_ptr + 2] = addr_result
-                required_bytes = 3
-                ram_ptr += required_bytes
+    Returns a list of (start, end, message) spans in the original line text,
+    empty when the line is fine. Program-wide errors (running out of RAM)
+    are left to parse_and_load_program().
+    """
+    tokens = [(m.start(), m.end(), m.group().upper()) for m in _TOKEN_RE.finditer(line)]
+    if not tokens or tokens[0][2].startswith('#'):
+        return []
+    start, end, cmd = tokens[0]
+    kinds = SOURCE_SYNTAX.get(cmd)
+    if kinds is None:
+        return [(start, end, f"Unknown command '{cmd}'")]
 
-            elif cmd == "SUB":
-                current_address = ram_ptr
-                emulator.pc_to_line[current_address] = line_num
-                if ram_ptr + 4 > emulator.ram_size:
-                    emulator.error = f"Error on line {line_num}: Not enough RAM"
-                    return False
-                addr1 = int(parts[1])
-                addr2 = int(parts[2])
-                addr_result = int(parts[3])
-                if addr1 >= emulator.ram_size or addr2 >= emulator.ram_size or addr_result >= emulator.ram_size:
-                    emulator.error = f"Error on line {line_num}: Address out of range"
-                    return False
-                emulator.ram[ram_ptr] = emulator.SUB
-                emulator.ram[ram_ptr + 1] = addr1
-                emulator.ram[ram_ptr + 2] = addr2
-                emulator.ram[ram_ptr + 3] = addr_result
-                required_bytes = 4
-                ram_ptr += required_bytes
+    if kinds == (OPERAND_PAIRS,):
+        return _diagnose_pairs(line, end, cmd, get_geometry(geometry))
+    if cmd in MASK_COMMANDS:
+        geometry = get_geometry(geometry)
+        if geometry.pixels > MASK_PIXELS:
+            return [(start, end, f"{cmd} needs a display of at most {MASK_PIXELS} pixels, "
+                                 f"not {geometry.width}x{geometry.height}")]
 
-            elif cmd == "SHL":
-                current_address = ram_ptr
-                emulator.pc_to_line[current_address] = line_num
-                if ram_ptr + 3 > emulator.ram_size:
-                    emulator.error = f"Error on line {line_num}: Not enough RAM"
-                    return False
-                addr = int(parts[1])
-                addr_result = int(parts[2])
-                if addr >= emulator.ram_size or addr_result >= emulator.ram_size:
-                    emulator.error = f"Error on line {line_num}: Address out of range"
-                    return False
-                emulator.ram[ram_ptr] = emulator.SHL
-                emulator.ram[ram_ptr + 1] = addr
-                emulator.ram[ram_ptr + 2] = addr_result
-                required_bytes = 3
-                ram_ptr += required_bytes
+    diagnostics = []
+    operands = tokens[1:]
+    if len(operands) < len(kinds):
+        return [(start, end, f"{cmd} needs {len(kinds)} operand(s)")]
 
-            elif cmd == "SHR":
-                current_address = ram_ptr
-                emulator.pc_to_line[current_address] = line_num
-                if ram_ptr + 3 > emulator.ram_size:
-                    emulator.error = f"Error on line {line_num}: Not enough RAM"
-                    return False
-                addr = int(parts[1])
-                addr_result = int(parts[2])
-                if addr >= emulator.ram_size or addr_result >= emulator.ram_size:
-                    emulator.error = f"Error on line {line_num}: Address out of range"
-                    return False
-                emulator.ram[ram_ptr] = emulator.SHR
-                emulator.ram[ram_ptr + 1] = addr
-                emulator.ram[ram_ptr + 2] = addr_result
-                required_bytes = 3
-                ram_ptr += required_bytes
+    limits = _operand_limits(ram_size, scratchpad_size)
+    values = []
+    for kind, (start, end, token) in zip(kinds, operands):
+        try:
+            value = _operand_value(cmd, kind, token)
+        except ValueError:
+            diagnostics.append((start, end, f"Invalid number '{token}'"))
+            values.append(None)
+            continue
+        values.append(value)
+        if kind == OPERAND_MASK:
+            if not 0 <= value <= 0xFFFF:
+                diagnostics.append((start, end, f"Mask {token} out of range"))
+        elif kind == OPERAND_IMMEDIATE:
+            if cmd in ("WAIT", "MEMSET") and not 0 <= value <= 0xFF:
+                diagnostics.append((start, end, f"Value {token} out of range"))
+        elif not 0 <= value < limits[kind]:
+            space = "Scratchpad address" if kind in (OPERAND_SCRATCH_READ, OPERAND_SCRATCH_WRITE) else "Address"
+            diagnostics.append((start, end, f"{space} {token} out of range"))
 
-                
+    if OPERAND_COUNT in kinds and not diagnostics:
+        count = values[kinds.index(OPERAND_COUNT)]
+        for kind, value in zip(kinds, values):
+            if kind in (OPERAND_SCRATCH_READ, OPERAND_SCRATCH_WRITE):
+                size = scratchpad_size
+            elif kind in (OPERAND_RAM_READ, OPERAND_RAM_WRITE):
+                size = ram_size
             else:
-                emulator.error = f"Error on line {line_num}: Unknown command '{cmd}'"
-                return False
-                
-        except (IndexError, ValueError) as e:
-            emulator.error = f"Error on line {line_num}: {e}"
-            return False
+                continue
+            if value + count > size:
+                start, end, token = operands[kinds.index(OPERAND_COUNT)]
+                diagnostics.append((start, end, "Block out of range"))
+                break
+    return diagnostics
 
-    emulator.pc = emulator.entry_point        
-    return True
\ No newline at end of file
+@lru_cache(maxsize=8)
+def _operand_limits(ram_size, scratchpad_size):
+    # Exclusive upper bound for each address-like operand kind
+    return {
+        OPERAND_TARGET: ram_size, OPERAND_RAM_READ: ram_size, OPERAND_RAM_WRITE: ram_size,
+        OPERAND_RAM_MODIFY: ram_size, OPERAND_RAM_READ_WORD: ram_size - 1,
+        OPERAND_SCRATCH_READ: scratchpad_size, OPERAND_SCRATCH_WRITE: scratchpad_size,
+        OPERAND_COUNT: 0x100,
+    }
+
+def _diagnose_pairs(line, offset, cmd, geometry):
+    diagnostics = []
+    pairs = 0
+    for match in re.finditer(r"[^,]+", line[offset:]):
+        pair = match.group().strip()
+        if not pair:
+            continue
+        start = offset + match.start() + (len(match.group()) - len(match.group().lstrip()))
+        end = start + len(pair)
+        coords = pair.split()
+        if len(coords) != 2 or not all(c.isdigit() and int(c) <= 0xFF for c in coords):
+            diagnostics.append((start, end, f"Invalid pair '{pair}'"))
+        elif not geometry.contains(int(coords[0]), int(coords[1])):
+            diagnostics.append((start, end, f"Coordinates ({coords[0]}, {coords[1]}) outside "
+                                            f"the {geometry.width}x{geometry.height} display"))
+        pairs += 1
+    if not pairs:
+        diagnostics.append((0, offset, f"{cmd} requires pairs"))
+    return diagnostics
\ No newline at end of file
@@ -0,0 +1,63 @@
+from contextlib import contextmanager
+from em_core import Emulator, address_mode
+from em_framebuffer import get_geometry
+
+class EmulatorPool:
+    """Pre-built Emulators handed out to batch jobs and servers.
+
+    acquire() takes a free instance, resizes it in place if the job needs a
+    different RAM or display size, and loads the requested scratchpad
+    (zeros by default); release() resets it and puts it back. No RAM is
+    reallocated and no file is touched, so per-job setup is a few
+    microseconds instead of a new Emulator reading scratchpad.dat.
+    """
+    def __init__(self, size=4, ram_size=64, timing="legacy", geometry=None, wide=None):
+        self.ram_size = ram_size
+        self.timing = timing
+        self.geometry = get_geometry(geometry)
+        self.wide = wide
+        self.free = [self._create() for _ in range(size)]
+
+    def _create(self):
+        emulator = Emulator(None, ram_size=self.ram_size, timing=self.timing, geometry=self.geometry,
+                            wide=self.wide, scratchpad=bytearray(8))
+        emulator.save_scratchpad = lambda: None  # The scratchpad stays in memory; scratchpad.dat is never written
+        return emulator
+
+    def acquire(self, ram_size=None, timing=None, geometry=None, wide=None, scratchpad=b""):
+        """A reset Emulator with the given sizes (pool defaults for None); raises ValueError if they are invalid"""
+        ram_size = self.ram_size if ram_size is None else ram_size
+        geometry = self.geometry if geometry is None else get_geometry(geometry)
+        wide = address_mode(ram_size, self.wide if wide is None else wide)
+        if len(scratchpad) > 8:
+            raise ValueError("Scratchpad is 8 bytes")
+        emulator = self.free.pop() if self.free else self._create()
+        try:
+            emulator.set_timing(self.timing if timing is None else timing)
+        except ValueError:
+            self.free.append(emulator)
+            raise
+        if (ram_size, geometry, wide) != (emulator.ram_size, emulator.geometry, emulator.wide):
+            emulator.resize(ram_size, geometry, wide)
+        emulator.scratchpad[:] = bytes(scratchpad).ljust(emulator.scratchpad_size, b"\0")
+        return emulator
+
+    def release(self, emulator):
+        """Reset emulator, detach everything a job attached to it and return it to the pool"""
+        emulator.display = None
+        emulator.heatmap = None
+        emulator.hooks = None
+        emulator.fusion = None
+        emulator.metrics = None
+        emulator.entry_point = 0
+        emulator.reset()
+        self.free.append(emulator)
+
+    @contextmanager
+    def lease(self, **options):
+        """with pool.lease(ram_size=256) as emulator: ..."""
+        emulator = self.acquire(**options)
+        try:
+            yield emulator
+        finally:
+            self.release(emulator)
\ No newline at end of file
@@ -0,0 +1,273 @@
+import struct
+import zlib
+from array import array
+
+FRAME_STREAM_MAGIC = b"FMXS"
+FRAME_STREAM_HEADER = struct.Struct("<HHI")  # width, height, hz
+
+class DisplayRecorder:
+    """Display sink that records the framebuffer as a timeline of distinct frames.
+
+    Install it as the emulator's display (DisplayRecorder.attach). The core
+    only calls set_frame() when an instruction presents a frame, and frames
+    equal to the previous one are dropped, so memory and time grow with the
+    number of frame changes rather than with the number of cycles run.
+    """
+    def __init__(self, width=4, height=4, hz=120):
+        self.width = width
+        self.height = height
+        self.hz = hz
+        self.emulator = None
+        self.start_cycle = 0
+        self.end_cycle = None
+        self.cycles = array("Q")  # Cycle at which each recorded frame appeared
+        self.frames = []          # Frame masks, bit y*width+x
+        self.frame = 0
+
+    @classmethod
+    def attach(cls, emulator, hz=120):
+        """Create a recorder sized to the emulator's display and install it as emulator.display"""
+        recorder = cls(emulator.geometry.width, emulator.geometry.height, hz)
+        recorder.emulator = emulator
+        recorder.start_cycle = emulator.cycles
+        emulator.display = recorder
+        recorder._record(emulator.framebuffer)
+        return recorder
+
+    def _now(self):
+        return self.emulator.cycles if self.emulator is not None else 0
+
+    def _record(self, frame):
+        if self.frames and self.frames[-1] == frame:
+            return
+        now = self._now()
+        if self.cycles and self.cycles[-1] == now:
+            self.frames[-1] = frame  # Replaced within the same cycle
+            if len(self.frames) > 1 and self.frames[-2] == frame:
+                self.frames.pop()
+                self.cycles.pop()
+            return
+        self.cycles.append(now)
+        self.frames.append(frame)
+
+    # Display interface used by the emulator core
+    def set_frame(self, frame):
+        self.frame = frame
+        self._record(frame)
+
+    def update_pixel(self, x, y, state):
+        bit = 1 << (y * self.width + x)
+        self.set_frame((self.frame | bit) if state else (self.frame & ~bit))
+
+    def clear_all(self):
+        self.set_frame(0)
+
+    def finish(self, cycle=None):
+        """Mark the end of the recording (default: the emulator's current cycle)"""
+        self.end_cycle = self._now() if cycle is None else cycle
+
+    def timeline(self):
+        """List of (frame, duration in cycles); the last frame lasts until finish()"""
+        end = self.end_cycle if self.end_cycle is not None else self._now()
+        points = list(self.cycles) + [max(end, self.cycles[-1] if self.cycles else 0)]
+        return [(frame, points[i + 1] - points[i]) for i, frame in enumerate(self.frames)]
+
+    def save(self, path, scale=32):
+        """Encode by extension: .gif, .png/.apng (animated PNG), anything else a frame stream"""
+        lower = path.lower()
+        if lower.endswith(".gif"):
+            data = encode_gif(self.timeline(), self.width, self.height, self.hz, scale)
+        elif lower.endswith((".png", ".apng")):
+            data = encode_apng(self.timeline(), self.width, self.height, self.hz, scale)
+        else:
+            data = encode_frame_stream(self.timeline(), self.width, self.height, self.hz)
+        with open(path, "wb") as f:
+            f.write(data)
+
+def _frame_rows(frame, width, height, scale):
+    """Frame as height*scale rows of width*scale pixel values (1 = lit)"""
+    rows = []
+    for y in range(height):
+        row = []
+        for x in range(width):
+            row.extend([frame >> (y * width + x) & 1] * scale)
+        rows.extend([row] * scale)
+    return rows
+
+def _centiseconds(timeline, hz):
+    """GIF delays in 1/100 s, carrying rounding error so the total stays exact"""
+    delays = []
+    elapsed = 0
+    shown = 0
+    for frame, cycles in timeline:
+        elapsed += cycles
+        target = (elapsed * 100 + hz // 2) // hz
+        delays.append((frame, target - shown))
+        shown = target
+    # Frames that round to no time at all are merged into the next one
+    merged = []
+    for frame, delay in delays:
+        if merged and merged[-1][1] == 0:
+            merged[-1] = (frame, delay)
+        else:
+            merged.append((frame, delay))
+    return merged
+
+def _lzw_encode(pixels, min_code_size):
+    clear = 1 << min_code_size
+    end = clear + 1
+    out = bytearray()
+    bit_buffer = 0
+    bit_count = 0
+
+    def emit(code, size):
+        nonlocal bit_buffer, bit_count
+        bit_buffer |= code << bit_count
+        bit_count += size
+        while bit_count >= 8:
+            out.append(bit_buffer & 0xFF)
+            bit_buffer >>= 8
+            bit_count -= 8
+
+    code_size = min_code_size + 1
+    table = {}
+    next_code = end + 1
+    emit(clear, code_size)
+    prefix = pixels[0]
+    for pixel in pixels[1:]:
+        key = (prefix << 8) | pixel
+        code = table.get(key)
+        if code is not None:
+            prefix = code
+            continue
+        emit(prefix, code_size)
+        if next_code < 4096:
+            table[key] = next_code
+            next_code += 1
+            if next_code > (1 << code_size) and code_size < 12:
+                code_size += 1
+        else:
+            emit(clear, code_size)
+            table = {}
+            next_code = end + 1
+            code_size = min_code_size + 1
+        prefix = pixel
+    emit(prefix, code_size)
+    # The decoder adds a table entry for the final code, which may widen END
+    if next_code < 4096 and next_code >= (1 << code_size) and code_size < 12:
+        code_size += 1
+    emit(end, code_size)
+    if bit_count:
+        out.append(bit_buffer & 0xFF)
+    return bytes(out)
+
+def _sub_blocks(data):
+    return b"".join(bytes([len(data[i:i + 255])]) + data[i:i + 255]
+                    for i in range(0, len(data), 255)) + b"\x00"
+
+def encode_gif(timeline, width=4, height=4, hz=120, scale=32):
+    """Animated GIF with a black/white palette; each distinct frame is encoded once"""
+    image_width, image_height = width * scale, height * scale
+    out = bytearray(b"GIF89a")
+    out += struct.pack("<HHBBB", image_width, image_height, 0x80, 0, 0)  # 2-colour global table
+    out += b"\x00\x00\x00\xff\xff\xff"
+    out += b"\x21\xff\x0bNETSCAPE2.0\x03\x01\x00\x00\x00"  # Loop forever
+    encoded = {}
+    for frame, delay in _centiseconds(timeline, hz):
+        image = encoded.get(frame)
+        if image is None:
+            pixels = [p for row in _frame_rows(frame, width, height, scale) for p in row]
+            image = encoded[frame] = b"\x02" + _sub_blocks(_lzw_encode(pixels, 2))
+        out += b"\x21\xf9\x04\x00" + struct.pack("<H", min(delay, 0xFFFF)) + b"\x00\x00"
+        out += b"\x2c" + struct.pack("<HHHHB", 0, 0, image_width, image_height, 0)
+        out += image
+    out += b"\x3b"
+    return bytes(out)
+
+def _png_chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+def encode_apng(timeline, width=4, height=4, hz=120, scale=32):
+    """Animated PNG (1-bit greyscale); frame delays are exact cycle counts over hz"""
+    image_width, image_height = width * scale, height * scale
+    out = bytearray(b"\x89PNG\r\n\x1a\n")
+    out += _png_chunk(b"IHDR", struct.pack(">IIBBBBB", image_width, image_height, 1, 0, 0, 0, 0))
+    out += _png_chunk(b"acTL", struct.pack(">II", len(timeline), 0))
+    compressed = {}
+    sequence = 0
+    for index, (frame, cycles) in enumerate(timeline):
+        data = compressed.get(frame)
+        if data is None:
+            raw = bytearray()
+            for row in _frame_rows(frame, width, height, scale):
+                raw.append(0)  # Filter type: none
+                bits = 0
+                for i, pixel in enumerate(row):
+                    bits = (bits << 1) | (pixel * 1)
+                    if i % 8 == 7:
+                        raw.append(bits)
+                        bits = 0
+                if len(row) % 8:
+                    raw.append(bits << (8 - len(row) % 8))
+            data = compressed[frame] = zlib.compress(bytes(raw), 9)
+        # Delays are 16-bit fractions; scale both terms down for very long frames
+        num, den = cycles, hz
+        while num > 0xFFFF or den > 0xFFFF:
+            num, den = num // 2, max(den // 2, 1)
+        out += _png_chunk(b"fcTL", struct.pack(">IIIIIHHBB", sequence, image_width, image_height,
+                                               0, 0, num, den, 0, 0))
+        sequence += 1
+        if index == 0:
+            out += _png_chunk(b"IDAT", data)
+        else:
+            out += _png_chunk(b"fdAT", struct.pack(">I", sequence) + data)
+            sequence += 1
+    out += _png_chunk(b"IEND", b"")
+    return bytes(out)
+
+def _varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+def encode_frame_stream(timeline, width=4, height=4, hz=120):
+    """Compact binary timeline: header, then (varint cycles, frame bytes) per frame.
+
+    Header: magic "FMXS", width and height (2 bytes LE each, displays go up
+    to 256 pixels), hz (4 bytes LE).
+    Each frame mask is stored little-endian in ceil(width*height/8) bytes.
+    """
+    frame_bytes = (width * height + 7) // 8
+    out = bytearray(FRAME_STREAM_MAGIC)
+    out += FRAME_STREAM_HEADER.pack(width, height, hz)
+    for frame, cycles in timeline:
+        out += _varint(cycles)
+        out += frame.to_bytes(frame_bytes, "little")
+    return bytes(out)
+
+def decode_frame_stream(data):
+    """Inverse of encode_frame_stream: (width, height, hz, [(frame, cycles), ...])"""
+    if data[:4] != FRAME_STREAM_MAGIC:
+        raise ValueError("Not a frame stream")
+    width, height, hz = FRAME_STREAM_HEADER.unpack_from(data, 4)
+    frame_bytes = (width * height + 7) // 8
+    timeline = []
+    pos = 4 + FRAME_STREAM_HEADER.size
+    while pos < len(data):
+        cycles = shift = 0
+        while True:
+            byte = data[pos]
+            pos += 1
+            cycles |= (byte & 0x7F) << shift
+            shift += 7
+            if not byte & 0x80:
+                break
+        timeline.append((int.from_bytes(data[pos:pos + frame_bytes], "little"), cycles))
+        pos += frame_bytes
+    return width, height, hz, timeline
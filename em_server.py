@@ -0,0 +1,365 @@
+"""Local emulation server: submit programs and stream their display as line-delimited JSON.
+
+    python em_server.py --port 8765          # 127.0.0.1 only
+    python em_server.py --unix /tmp/fm.sock
+
+Every request and reply is one JSON object per line. Requests:
+
+    {"op": "submit", "source": "SETALL\\nWAIT 60\\nLOOP", "cycles": 1000, "watch": true}
+    {"op": "submit", "image": "10033c04", "entry": 0, "ram": 64, "realtime": false}
+    {"op": "subscribe", "job": 1}
+    {"op": "cancel", "job": 1}
+    {"op": "jobs"}
+
+submit also takes timing, display ("8x8"), wide, hz, seconds, batch and a
+scratchpad hex string (jobs never touch scratchpad.dat). Replies are
+{"event": "accepted", "job": n}, {"event": "jobs", "jobs": [...]} or
+{"event": "error", "message": ...}; hz and batch must be positive and
+cycles and seconds not negative. Subscribers get one
+{"event": "frame", "job", "cycle", "frame": hex} with the current frame,
+then {"event": "frame", "job", "cycle", "xor": hex} deltas to apply with
+XOR, and finally {"event": "done", "job", "state", "cycles", "pc",
+"error", "frame", "ram", "scratchpad"}. state is halted, error, budget,
+timeout or cancelled. Frames a slow subscriber has not read yet are
+merged into one delta; the final state is never dropped.
+
+Frames are delivered at batch granularity: a job runs batch cycles
+(default hz/60 in realtime, 1000 otherwise) between turns of the event
+loop, and subscribers send the frame showing at the end of each batch.
+A frame presented and replaced within one batch is never sent; submit
+"batch": 1 to see every frame, at the cost of one loop turn per cycle.
+"""
+import argparse
+import asyncio
+import json
+import sys
+from collections import OrderedDict
+from em_async import AsyncRunner
+from em_pool import EmulatorPool
+from em_metrics import Metrics, MetricsFile, serve_metrics
+
+LINE_LIMIT = 1 << 20  # Longest request line (source or a hex image of 64 KB RAM)
+
+class Job:
+    """One submitted program, its runner and the subscribers watching it.
+
+    The job is its emulator's display: every presented frame is stored in
+    frame/cycle and subscribers are only woken up, so a subscriber always
+    sends the newest frame and never a backlog. Subscribers only run
+    between the runner's batches, so batch (cycles per batch, None for the
+    runner's default) sets how fine-grained the frames they see are.
+    """
+    def __init__(self, job_id, emulator, cycles, seconds, realtime=True, hz=120, metrics=None, batch=None):
+        self.id = job_id
+        self.emulator = emulator
+        self.cycles = cycles
+        self.seconds = seconds
+        self.state = "queued"
+        self.frame = emulator.framebuffer
+        self.cycle = emulator.cycles
+        self.result = None  # The "done" message once the job has finished
+        self.viewers = set()
+        self.cancelled = False
+        self.timed_out = False
+        self.failure = None  # Message of an exception raised by the runner
+        emulator.display = self
+        self.runner = AsyncRunner(emulator, hz=hz, batch=batch, realtime=realtime, metrics=metrics)
+
+    # Display interface used by the emulator core
+    def set_frame(self, frame):
+        self.frame = frame
+        self.cycle = self.emulator.cycles
+        for viewer in self.viewers:
+            viewer.wakeup.set()
+
+    def clear_all(self):
+        self.set_frame(0)
+
+    def cancel(self):
+        self.cancelled = True
+        self.runner.stop()
+        if self.state == "queued" and self.result is None:
+            self._finish()  # Don't leave it waiting for a worker slot
+
+    def _timeout(self):
+        self.timed_out = True
+        self.runner.stop()
+
+    async def run(self, slots):
+        """Wait for a worker slot, run within the budgets, then publish the result.
+
+        The result is published however the run ends, so subscribers always
+        get their "done" message; an exception from the runner is reported
+        as the error state. A job cancelled while queued has already been
+        finished by cancel() and never takes a slot.
+        """
+        if self.cancelled:
+            return
+        try:
+            async with slots:
+                if not self.cancelled:
+                    self.state = "running"
+                    self.emulator.running = True
+                    timer = asyncio.get_running_loop().call_later(self.seconds, self._timeout)
+                    try:
+                        await self.runner.run(self.cycles)
+                    finally:
+                        timer.cancel()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        except Exception as e:
+            self.failure = f"{type(e).__name__}: {e}"
+        finally:
+            if self.result is None:
+                self._finish()
+
+    def _finish(self):
+        em = self.emulator
+        finished = self.runner.finished
+        if self.failure is not None:
+            self.state = "error"
+        elif self.cancelled:
+            self.state = "cancelled"
+        elif finished is None:
+            self.state = "budget"
+        elif finished.kind == "stopped":
+            self.state = "timeout" if self.timed_out else "cancelled"
+        else:
+            self.state = finished.kind
+        self.result = {
+            "event": "done", "job": self.id, "state": self.state, "cycles": em.cycles,
+            "pc": em.pc, "error": self.failure or em.error, "frame": hex(em.framebuffer),
+            "ram": bytes(em.ram).hex(), "scratchpad": bytes(em.scratchpad).hex(),
+        }
+        for viewer in self.viewers:
+            viewer.wakeup.set()
+
+    def summary(self):
+        cycles = self.emulator.cycles if self.result is None else self.result["cycles"]
+        return {"job": self.id, "state": self.state, "cycles": cycles}
+
+class Viewer:
+    """A connection's subscription to one job"""
+    def __init__(self, connection, job):
+        self.connection = connection
+        self.job = job
+        self.sent = None  # Frame this subscriber last received
+        self.wakeup = asyncio.Event()
+        self.wakeup.set()  # Send the current frame straight away
+
+    async def stream(self):
+        job = self.job
+        job.viewers.add(self)
+        try:
+            while True:
+                await self.wakeup.wait()
+                self.wakeup.clear()
+                frame = job.frame
+                if frame != self.sent:
+                    message = {"event": "frame", "job": job.id, "cycle": job.cycle}
+                    if self.sent is None:
+                        message["frame"] = hex(frame)
+                    else:
+                        message["xor"] = hex(frame ^ self.sent)
+                    self.sent = frame
+                    await self.connection.send(message)  # Waits while the client is slow
+                if job.result is not None and job.frame == self.sent:
+                    await self.connection.send(job.result)
+                    return
+        finally:
+            job.viewers.discard(self)
+
+class Connection:
+    """Serializes writes from the request handler and any number of viewers"""
+    def __init__(self, writer):
+        self.writer = writer
+        self.lock = asyncio.Lock()
+
+    async def send(self, message):
+        async with self.lock:
+            self.writer.write(json.dumps(message).encode() + b"\n")
+            await self.writer.drain()
+
+class EmulationServer:
+    """Runs submitted jobs on at most workers concurrent runners.
+
+    Running jobs share the event loop; each runner yields after every
+    batch of cycles, so jobs take turns in submission order (fair
+    round-robin) and none can starve the others or the subscribers.
+    All runners record into metrics (an em_metrics.Metrics) if given.
+    """
+    def __init__(self, workers=4, max_cycles=10_000_000, max_seconds=600.0, keep_finished=256, metrics=None):
+        self.workers = workers
+        self.metrics = metrics
+        self.max_cycles = max_cycles
+        self.max_seconds = max_seconds
+        self.keep_finished = keep_finished
+        self.jobs = OrderedDict()
+        self.next_id = 1
+        self.slots = asyncio.Semaphore(workers)
+        self.pool = EmulatorPool(workers)
+        self.tasks = set()
+        self.connections = set()
+        self.server = None
+
+    async def start(self, host="127.0.0.1", port=8765, unix=None):
+        """Listen on host:port, or on the Unix socket path unix"""
+        if unix:
+            self.server = await asyncio.start_unix_server(self.handle, path=unix, limit=LINE_LIMIT)
+        else:
+            self.server = await asyncio.start_server(self.handle, host, port, limit=LINE_LIMIT)
+        return self.server
+
+    async def close(self):
+        for job in self.jobs.values():
+            job.cancel()
+        for writer in self.connections:
+            writer.close()  # Handlers see end of input and return
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    def submit(self, request):
+        """Create and schedule a job from a submit request; raises ValueError if it is invalid"""
+        if "source" not in request and "image" not in request:
+            raise ValueError("submit needs source or image")
+        ram_size = int(request.get("ram", 64))
+        hz = int(request.get("hz", 120))
+        cycles = int(request.get("cycles", self.max_cycles))
+        seconds = float(request.get("seconds", self.max_seconds))
+        batch = None if request.get("batch") is None else int(request["batch"])
+        if ram_size <= 0:
+            raise ValueError(f"Invalid RAM size: {ram_size}")
+        if hz <= 0:
+            raise ValueError(f"hz must be positive: {hz}")
+        if cycles < 0 or not seconds >= 0:
+            raise ValueError("cycles and seconds must not be negative")
+        if batch is not None and batch <= 0:
+            raise ValueError(f"batch must be positive: {batch}")
+        emulator = self.pool.acquire(ram_size=ram_size, timing=request.get("timing", "legacy"),
+                                     geometry=request.get("display"), wide=request.get("wide"),
+                                     scratchpad=bytes.fromhex(request.get("scratchpad", "")))
+        try:
+            if "source" in request:
+                loaded = emulator.parse_and_load_program(str(request["source"]).split("\n"))
+            else:
+                loaded = emulator.load_image(bytes.fromhex(request["image"]), int(request.get("entry", 0)))
+            if not loaded:
+                raise ValueError(emulator.error)
+        except ValueError:
+            self.pool.release(emulator)
+            raise
+        job = Job(self.next_id, emulator, min(cycles, self.max_cycles), min(seconds, self.max_seconds),
+                  realtime=bool(request.get("realtime", True)), hz=hz, metrics=self.metrics, batch=batch)
+        self.next_id += 1
+        self.jobs[job.id] = job
+        self._spawn(self._run(job))
+        self._prune()
+        return job
+
+    async def _run(self, job):
+        try:
+            await job.run(self.slots)
+        finally:
+            self.pool.release(job.emulator)  # job.run() has always copied the result out by now
+
+    def _spawn(self, coroutine):
+        task = asyncio.get_running_loop().create_task(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.result is not None]
+        for job_id in finished[:max(len(finished) - self.keep_finished, 0)]:
+            del self.jobs[job_id]
+
+    def _job(self, request):
+        job = self.jobs.get(request.get("job"))
+        if job is None:
+            raise ValueError(f"Unknown job: {request.get('job')}")
+        return job
+
+    async def handle(self, reader, writer):
+        connection = Connection(writer)
+        viewers = set()
+        self.connections.add(writer)
+        self.tasks.add(asyncio.current_task())
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:  # Line longer than LINE_LIMIT
+                    await connection.send({"event": "error", "message": "Request too long"})
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                    op = request.get("op")
+                    if op == "submit":
+                        job = self.submit(request)
+                        await connection.send({"event": "accepted", "job": job.id})
+                        if request.get("watch"):
+                            viewers.add(self._spawn(Viewer(connection, job).stream()))
+                    elif op == "subscribe":
+                        viewers.add(self._spawn(Viewer(connection, self._job(request)).stream()))
+                    elif op == "cancel":
+                        self._job(request).cancel()
+                    elif op == "jobs":
+                        await connection.send({"event": "jobs", "jobs": [job.summary() for job in self.jobs.values()]})
+                    else:
+                        raise ValueError(f"Unknown op: {op}")
+                except (ValueError, TypeError, AttributeError) as e:
+                    await connection.send({"event": "error", "message": str(e)})
+            # Keep streaming to a client that has finished sending requests
+            await asyncio.gather(*viewers, return_exceptions=True)
+        except ConnectionError:
+            pass
+        finally:
+            for viewer in viewers:
+                viewer.cancel()
+            writer.close()
+            self.connections.discard(writer)
+            self.tasks.discard(asyncio.current_task())
+
+async def serve(args):
+    metrics = Metrics() if args.metrics_port or args.metrics_file else None
+    if args.metrics_port:
+        serve_metrics(metrics, args.metrics_port)
+    if args.metrics_file:
+        MetricsFile(metrics, args.metrics_file,
+                    on_error=lambda e: print(f"Error writing metrics: {e}", file=sys.stderr)).start()
+    server = EmulationServer(workers=args.workers, max_cycles=args.max_cycles, max_seconds=args.max_seconds,
+                             metrics=metrics)
+    listener = await server.start(args.host, args.port, args.unix)
+    where = args.unix or f"{args.host}:{listener.sockets[0].getsockname()[1]}"
+    print(f"Listening on {where}", file=sys.stderr)
+    async with listener:
+        await listener.serve_forever()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve Forgematrix emulation jobs over line-delimited JSON.")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to bind (default 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", metavar="PATH", help="Listen on a Unix socket instead of TCP")
+    parser.add_argument("--workers", type=int, default=4, help="Jobs running at the same time (default 4)")
+    parser.add_argument("--max-cycles", type=int, default=10_000_000, help="Cycle budget cap per job")
+    parser.add_argument("--max-seconds", type=float, default=600.0, help="Wall time budget cap per job")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT",
+                        help="Serve Prometheus metrics at http://127.0.0.1:PORT/metrics")
+    parser.add_argument("--metrics-file", metavar="PATH", help="Rewrite Prometheus metrics to PATH every 5 seconds")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,86 @@
+from em_disasm import format_instruction, memory_accesses, changed_ranges
+
+class Snapshot:
+    """Immutable copy of the emulator state published to other threads.
+
+    dirty lists the RAM ranges that changed since the previous snapshot
+    (seq - 1); a reader that skipped snapshots should refresh everything.
+    reloaded is set on the first snapshot after a load, reset or resize.
+    reads lists the RAM ranges the instruction at PC will read. watch is
+    the em_debug.WatchHit that stopped execution, if any. heat holds the
+    access counter totals (see AccessCounters.totals) while the heatmap is on.
+    """
+    __slots__ = ("seq", "pc", "cycles", "delay", "active_delay", "running",
+                 "free_running", "error", "breakpoint", "framebuffer", "ram",
+                 "dirty", "scratchpad", "instruction", "instruction_length",
+                 "reads", "reloaded", "watch", "heat")
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            object.__setattr__(self, name, fields.get(name))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Snapshot is read-only")
+
+class SnapshotPublisher:
+    """Builds snapshots from one emulator and publishes them by reference swap.
+
+    The writer keeps two RAM images (the one last published and the live
+    RAM) and only copies/diffs them when publishing, so execution itself
+    pays nothing. Readers call latest() from any thread without locking:
+    swapping self._front is a single atomic reference store.
+    """
+    def __init__(self, emulator):
+        self.emulator = emulator
+        self.seq = 0
+        self._published_ram = bytes(emulator.ram)
+        self._reloaded = True
+        self._front = None
+
+    def rebase(self, emulator=None):
+        """Forget the previous image, e.g. after a load or resize"""
+        if emulator is not None:
+            self.emulator = emulator
+        self._published_ram = b""
+        self._reloaded = True
+
+    def publish(self, free_running=False):
+        em = self.emulator
+        ram = bytes(em.ram)
+        dirty = changed_ranges(self._published_ram, ram)
+        self._published_ram = ram
+        if dirty and em.instructions is not None:
+            em.instructions.sync(em.ram)  # Re-decode self-modified code
+        instruction = em.instruction_at()
+        reads = ()
+        if instruction is not None:
+            reads = tuple((start, end) for space, kind, start, end in memory_accesses(instruction)
+                          if space == "ram" and kind == "read")
+        self.seq += 1
+        snapshot = Snapshot(
+            seq=self.seq,
+            pc=em.pc,
+            cycles=em.cycles,
+            delay=em.delay,
+            active_delay=em.active_delay,
+            running=em.running,
+            free_running=free_running,
+            error=em.error,
+            breakpoint=em.breakpoint_hit,
+            framebuffer=em.framebuffer,
+            ram=ram,
+            dirty=dirty,
+            scratchpad=bytes(em.scratchpad),
+            instruction=format_instruction(instruction) if instruction is not None else None,
+            instruction_length=instruction.length if instruction is not None else 0,
+            reads=reads,
+            reloaded=self._reloaded,
+            watch=em.watch_hit,
+            heat=em.heatmap.totals() if em.heatmap is not None else None,
+        )
+        self._reloaded = False
+        self._front = snapshot
+        return snapshot
+
+    def latest(self):
+        return self._front
@@ -0,0 +1,90 @@
+from em_constants import (
+    SET, CLEAR, LOAD, LOOP, JUMP, JUMPIF, ADD, SETALL, SETNONE,
+    SCRATCH_STORE, SCRATCH_LOAD, SCRATCH_ADD, SCRATCH_COPY, SCRATCH_JUMPIF,
+    AND, OR, XOR, NOT, SUB, SHL, SHR,
+    SETMASK, CLEARMASK, TOGGLEMASK, LOADMASK,
+    SETMASK_RAM, CLEARMASK_RAM, TOGGLEMASK_RAM, LOADMASK_RAM,
+    MEMCPY, MEMSET, SCRATCH_LOAD_BLOCK, SCRATCH_COPY_BLOCK,
+    ADDI, SUBI, ANDI, ORI, XORI, SHLI, SHRI, DJNZ
+)
+from em_disasm import instruction_length
+
+class TimingModel:
+    """Cycle cost of each instruction.
+
+    base maps opcode -> cycles (default for anything missing), per_pair adds
+    cycles for every SET/CLEAR pair and per_byte for every byte a block
+    instruction moves. Subclass and override cost() for anything fancier.
+    """
+    def __init__(self, name, base=None, default=1, per_pair=None, per_byte=None):
+        self.name = name
+        self.base = dict(base or {})
+        self.default = default
+        self.per_pair = dict(per_pair or {})
+        self.per_byte = dict(per_byte or {})
+
+    def cost(self, ram, pc, opcode, wide=False):
+        """Total cycles for the instruction at pc (at least 1)"""
+        cycles = self.base.get(opcode, self.default)
+        if opcode in self.per_pair and pc + 1 < len(ram):
+            cycles += self.per_pair[opcode] * ram[pc + 1]
+        if opcode in self.per_byte:
+            count_at = pc + instruction_length(opcode, wide) - 1  # The count is the last operand
+            if count_at < len(ram):
+                cycles += self.per_byte[opcode] * ram[count_at]
+        return max(cycles, 1)
+
+    def extra_cycles(self, ram, pc, opcode, wide=False):
+        """Cycles the core stays busy after the instruction's first cycle"""
+        return self.cost(ram, pc, opcode, wide) - 1
+
+    def __repr__(self):
+        return f"TimingModel({self.name!r})"
+
+class LegacyTiming(TimingModel):
+    """Every instruction takes exactly one step(), as the emulator always did"""
+    def __init__(self):
+        super().__init__("legacy")
+
+    def cost(self, ram, pc, opcode, wide=False):
+        return 1
+
+    def extra_cycles(self, ram, pc, opcode, wide=False):
+        return 0
+
+LEGACY = LegacyTiming()
+
+# Approximate costs for the modelled board: one cycle per memory access,
+# scratchpad writes are slow persistent storage, display writes go over a bus.
+REALISTIC = TimingModel(
+    "realistic",
+    base={
+        SET: 1, CLEAR: 1, LOAD: 2, LOOP: 2, JUMP: 2, JUMPIF: 2, DJNZ: 2,
+        ADD: 3, SUB: 3, AND: 3, OR: 3, XOR: 3, NOT: 2, SHL: 2, SHR: 2,
+        ADDI: 2, SUBI: 2, ANDI: 2, ORI: 2, XORI: 2, SHLI: 2, SHRI: 2,
+        SETALL: 2, SETNONE: 2,
+        SETMASK: 2, CLEARMASK: 2, TOGGLEMASK: 2, LOADMASK: 2,
+        SETMASK_RAM: 3, CLEARMASK_RAM: 3, TOGGLEMASK_RAM: 3, LOADMASK_RAM: 3,
+        SCRATCH_STORE: 4, SCRATCH_LOAD: 2, SCRATCH_ADD: 5, SCRATCH_COPY: 4,
+        SCRATCH_JUMPIF: 3,
+        MEMCPY: 2, MEMSET: 2, SCRATCH_LOAD_BLOCK: 2, SCRATCH_COPY_BLOCK: 4,
+    },
+    per_pair={SET: 1, CLEAR: 1},
+    per_byte={MEMCPY: 1, MEMSET: 1, SCRATCH_LOAD_BLOCK: 1, SCRATCH_COPY_BLOCK: 1},
+)
+
+TIMING_PROFILES = {
+    "legacy": LEGACY,
+    "realistic": REALISTIC,
+}
+
+def get_timing(timing):
+    """Resolve a profile name or TimingModel to a TimingModel"""
+    if timing is None:
+        return LEGACY
+    if isinstance(timing, str):
+        try:
+            return TIMING_PROFILES[timing]
+        except KeyError:
+            raise ValueError(f"Unknown timing profile: {timing}")
+    return timing
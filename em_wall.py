@@ -0,0 +1,87 @@
+import time
+from em_pool import EmulatorPool
+
+class Tile:
+    """One program on a display wall"""
+    def __init__(self, name, emulator):
+        self.name = name
+        self.emulator = emulator
+        self.frame = emulator.framebuffer  # Frame the view last showed
+        self.error = emulator.error
+
+def advance(emulator, cycles):
+    """Run up to cycles cycles, fast-forwarding busy and WAIT cycles; returns cycles executed"""
+    if emulator.hooks is not None or emulator.fusion is not None:
+        return emulator.run(cycles)
+    start = emulator.cycles
+    end = start + cycles
+    step = emulator.step_function
+    while emulator.running and emulator.cycles < end:
+        if emulator.busy or emulator.delay:
+            emulator.skip_idle(end - emulator.cycles)
+        else:
+            step(emulator)
+    return emulator.cycles - start
+
+class WallScheduler:
+    """Steps many independent emulators from one clock.
+
+    Each tick() runs every running emulator for the cycles the wall clock
+    owes at hz (capped at one second of catch-up, like EmulatorWorker) and
+    reports which tiles changed, so a view repaints only those. Emulators
+    come from an EmulatorPool: their scratchpads stay in memory and
+    programs on the wall never share scratchpad.dat.
+    """
+    def __init__(self, hz=120, metrics=None):
+        self.hz = hz
+        self.metrics = metrics
+        self.pool = EmulatorPool(0)
+        self.tiles = []
+        self._clock_start = None
+        self._clock_cycles = 0
+
+    def add(self, code, name="", ram_size=64, timing="legacy", geometry=None):
+        """Assemble code (a list of source lines) onto a new tile; a program that fails shows its error"""
+        emulator = self.pool.acquire(ram_size=ram_size, timing=timing, geometry=geometry)
+        emulator.running = bool(emulator.parse_and_load_program(code))
+        tile = Tile(name, emulator)
+        self.tiles.append(tile)
+        return tile
+
+    def remove(self, tile):
+        self.tiles.remove(tile)
+        self.pool.release(tile.emulator)
+
+    def start(self, now=None):
+        """Restart the clock (after a pause nothing is owed)"""
+        self._clock_start = time.perf_counter() if now is None else now
+        self._clock_cycles = 0
+
+    def tick(self, now=None):
+        """Run the cycles owed since the last tick; returns the indices of tiles that changed"""
+        now = time.perf_counter() if now is None else now
+        if self._clock_start is None:
+            self.start(now)
+        due = int((now - self._clock_start) * self.hz) - self._clock_cycles
+        if due > self.hz:
+            self._clock_start = now - 1.0
+            self._clock_cycles = 0
+            due = self.hz
+        changed = []
+        if due <= 0:
+            return changed
+        self._clock_cycles += due
+        executed = 0
+        for index, tile in enumerate(self.tiles):
+            emulator = tile.emulator
+            if emulator.running:
+                executed += advance(emulator, due)
+            if emulator.framebuffer != tile.frame or emulator.error != tile.error:
+                tile.frame = emulator.framebuffer
+                tile.error = emulator.error
+                changed.append(index)
+        if self.metrics is not None:
+            finished = time.perf_counter()
+            lag = self.metrics.clock_lag(finished - self._clock_start, self.hz, self._clock_cycles)
+            self.metrics.batch(executed, finished - now, lag)
+        return changed
\ No newline at end of file
@@ -0,0 +1,144 @@
+import queue
+import time
+from PyQt5.QtCore import QThread
+from em_core import Emulator
+from em_snapshot import SnapshotPublisher
+
+class EmulatorWorker(QThread):
+    """Runs an Emulator on its own thread.
+
+    The GUI never touches the worker's emulator directly: it sends commands
+    through send() and reads the most recent published Snapshot with
+    latest(). While free-running the worker executes cycles in batches paced
+    to the wall clock, so emulation speed does not depend on how busy the
+    GUI thread is. With an em_metrics.Metrics every batch is recorded with
+    its duration and how far the emulation is behind the wall clock.
+    """
+    def __init__(self, ram_size=64, timing="legacy", hz=120, refresh_hz=60, geometry=None, metrics=None, parent=None):
+        super().__init__(parent)
+        self.hz = hz
+        self.metrics = metrics
+        self.refresh_interval = 1.0 / refresh_hz
+        self.commands = queue.SimpleQueue()
+        self.emulator = Emulator(None, ram_size=ram_size, timing=timing, geometry=geometry)
+        self.emulator.metrics = metrics
+        self.publisher = SnapshotPublisher(self.emulator)
+        self.breakpoints = set()
+        self.watchpoints = None
+        self.heatmap = False
+        self.free_running = False
+        self._resume = False  # Next run() continues past the breakpoint at the PC
+        self._quit = False
+        self.publisher.publish()
+
+    def send(self, command, *args):
+        """Queue a command: load, start, stop, step, reset, resize, timing, breakpoints, watchpoints, heatmap, quit"""
+        self.commands.put((command, args))
+
+    def latest(self):
+        """Most recently published Snapshot (safe to call from any thread)"""
+        return self.publisher.latest()
+
+    def run(self):
+        last_publish = 0.0
+        while not self._quit:
+            if not self.free_running:
+                self._handle(*self.commands.get())
+                self._drain()
+                self.publisher.publish(self.free_running)
+                last_publish = time.perf_counter()
+                self._clock_start = last_publish
+                self._clock_cycles = 0
+                continue
+
+            changed = self._drain()
+
+            # Cycles owed according to the wall clock, capped at one second of
+            # catch-up so a stalled thread does not spiral
+            now = time.perf_counter()
+            due = int((now - self._clock_start) * self.hz) - self._clock_cycles
+            if due > self.hz:
+                self._clock_start = now - 1.0
+                self._clock_cycles = 0
+                due = self.hz
+            if due > 0:
+                em = self.emulator
+                executed = em.run(due, self.breakpoints, self.watchpoints, self._resume)
+                self._resume = False
+                self._clock_cycles += executed
+                if not em.running or em.breakpoint_hit is not None or em.watch_hit is not None or em.hook_stop:
+                    self.free_running = False
+                    changed = True
+                if self.metrics is not None:
+                    finished = time.perf_counter()
+                    lag = (self.metrics.clock_lag(finished - self._clock_start, self.hz, self._clock_cycles)
+                           if self.free_running else 0)
+                    self.metrics.batch(executed, finished - now, lag)
+
+            if changed or now - last_publish >= self.refresh_interval:
+                self.publisher.publish(self.free_running)
+                last_publish = now
+
+            if self.free_running:
+                time.sleep(min(1.0 / self.hz, self.refresh_interval))
+
+    def _drain(self):
+        changed = False
+        while True:
+            try:
+                command, args = self.commands.get_nowait()
+            except queue.Empty:
+                return changed
+            self._handle(command, args)
+            changed = True
+
+    def _handle(self, command, args):
+        em = self.emulator
+        if command == "load":
+            image, entry_point, pc_to_line = args
+            self.free_running = False
+            if em.load_image(image, entry_point):
+                em.pc_to_line = dict(pc_to_line)
+                em.running = True
+            self.publisher.rebase()
+        elif command == "start":
+            if em.running:
+                self.free_running = True
+                self._resume = em.breakpoint_hit is not None  # Continue from the breakpoint it stopped at
+                self._clock_start = time.perf_counter()
+                self._clock_cycles = 0
+        elif command == "stop":
+            self.free_running = False
+            em.running = False
+        elif command == "step":
+            if em.running and not self.free_running:
+                executed = em.run(1, self.breakpoints, self.watchpoints, resume=True)
+                if self.metrics is not None:
+                    self.metrics.cycles.inc(executed)
+        elif command == "reset":
+            self.free_running = False
+            em.reset()
+            self.publisher.rebase()
+        elif command == "resize":
+            ram_size = args[0]
+            geometry = args[1] if len(args) > 1 else em.geometry  # Optional new display size
+            self.free_running = False
+            em.resize(ram_size, geometry)  # In place: same buffers, scratchpad stays in memory
+            self.publisher.rebase()
+        elif command == "timing":
+            em.set_timing(args[0])
+        elif command == "breakpoints":
+            self.breakpoints = args[0]  # A set of addresses or an em_debug.BreakpointSet
+        elif command == "heatmap":
+            self.heatmap = bool(args[0])
+            em.enable_heatmap(self.heatmap)
+        elif command == "watchpoints":
+            self.watchpoints = args[0]  # An em_debug.WatchpointSet
+        elif command == "quit":
+            self.free_running = False
+            self._quit = True
+
+    def shutdown(self):
+        """Stop the thread and wait for it to finish"""
+        self.send("quit")
+        self.wait()
@@ -1,10 +1,39 @@
+import time
+_START = time.perf_counter()
+
 import sys
-from PyQt5.QtWidgets import QApplication
-from main_window import MainWindow, configure_dark_theme
 
-if __name__ == "__main__":
-    app = QApplication(sys.argv)
+def _option(argv, name):
+    """Value following name on the command line, or None"""
+    if name in argv[:-1]:
+        return argv[argv.index(name) + 1]
+    return None
+
+def run_gui(argv):
+    # PyQt5 and the window modules are only imported when the GUI is wanted
+    from PyQt5.QtWidgets import QApplication
+    from main_window import MainWindow, configure_dark_theme
+
+    app = QApplication(argv)
     configure_dark_theme(app)  # Apply theme before creating window
     window = MainWindow()
+    if "--timings" in argv:
+        # Measured when the display has painted for the first time, not when the event loop starts
+        window.display.on_first_paint = lambda: print(
+            f"time to first frame {1000 * (time.perf_counter() - _START):.1f} ms", file=sys.stderr)
     window.show()
-    sys.exit(app.exec_())
\ No newline at end of file
+    metrics_port, metrics_file = _option(argv, "--metrics-port"), _option(argv, "--metrics-file")
+    if metrics_port or metrics_file:
+        from em_metrics import MetricsFile, serve_metrics
+        if metrics_port:
+            serve_metrics(window.metrics, int(metrics_port))  # Prometheus text at 127.0.0.1:port/metrics
+        if metrics_file:
+            MetricsFile(window.metrics, metrics_file,
+                        on_error=lambda e: print(f"Error writing metrics: {e}", file=sys.stderr)).start()
+    return app.exec_()
+
+if __name__ == "__main__":
+    if "--headless" in sys.argv:
+        from em_cli import main
+        sys.exit(main([arg for arg in sys.argv[1:] if arg != "--headless"]))
+    sys.exit(run_gui(sys.argv))
\ No newline at end of file
@@ -1,14 +1,24 @@
 import sys
 import os
+import re
+import time
 from PyQt5.QtWidgets import (QMainWindow, QWidget, QTextEdit, QPushButton, QVBoxLayout, 
                              QHBoxLayout, QGridLayout, QLabel, QMessageBox, QComboBox, QFileDialog, 
                              QAction, QMenuBar, QStatusBar, QProgressBar, QFrame, QSplitter, QGraphicsDropShadowEffect,
-                             QToolBar, QSpacerItem, QSizePolicy, QDialog)
-from PyQt5.QtCore import QRegularExpression
+                             QToolBar, QSpacerItem, QSizePolicy, QDialog, QInputDialog)
 from PyQt5.QtCore import QTimer, Qt, QSize
 from PyQt5.QtGui import *
 from display import DisplayWidget
 from em_core import Emulator
+from em_parser import SOURCE_SYNTAX, diagnose_line, encoded_length
+from em_debug import (parse_condition, resolve_breakpoints, parse_watchpoint,
+                      WatchpointSet, format_watch_hit)
+from em_timing import TIMING_PROFILES
+from emulator_worker import EmulatorWorker
+from memory_view import MemoryPanel, HEAT_COLORS, HEAT_LEVELS
+from em_heatmap import HeatDecay
+from em_framebuffer import get_geometry
+from em_metrics import Metrics, format_hud
 
 def configure_dark_theme(app):
     """Centralized dark theme configuration"""
@@ -44,40 +54,154 @@ class StyledTextEdit(QTextEdit):
         self.setFont(QFont("Consolas", 10))
         self.highlighter = SyntaxHighlighter(self.document())
 
+# One combined pattern, built once from the assembler's instruction table.
+# Longest mnemonics first so SCRATCH_LOAD_BLOCK is not cut short at SCRATCH_LOAD.
+TOKEN_PATTERN = re.compile(
+    r"(?P<comment>#.*)"
+    r"|(?P<keyword>\b(?:" + "|".join(sorted(SOURCE_SYNTAX, key=len, reverse=True)) + r")\b)"
+    r"|(?P<number>\b(?:0[xX][0-9A-Fa-f]+|0[bB][01]+|\d+)\b)")
+
+class LineDiagnostics(QTextBlockUserData):
+    """Assembler diagnostics for one editor line: (start, end, message) spans"""
+    def __init__(self, diagnostics):
+        super().__init__()
+        self.diagnostics = diagnostics
+
 class SyntaxHighlighter(QSyntaxHighlighter):
+    """Single-pass highlighter: one precompiled regex scan plus diagnose_line() per line"""
     def __init__(self, document):
         super().__init__(document)
-        self.highlight_rules = []
-        
+        self.ram_size = 64
+        self.geometry = get_geometry(None)
 
-        keywords = ["EP", "SET", "CLEAR", "WAIT", "LOOP", "STORE", 
-                   "LOAD", "JUMP", "JUMPIF", "ADD", "SETALL", "SETNONE",
-                   "SCRATCH_STORE", "SCRATCH_LOAD", "SCRATCH_ADD",
-                   "SCRATCH_COPY", "SCRATCH_JUMPIF", "AND", "OR", 
-                   "XOR", "NOT", "SUB", "SHL", "SHR"]
-        
         number_format = QTextCharFormat()
         number_format.setForeground(QColor("#FF8C00"))
-        self.highlight_rules.append((r'\b\d+\b', number_format))
-        
         comment_format = QTextCharFormat()
         comment_format.setForeground(QColor("#57A64A"))
-        self.highlight_rules.append((r'#.*', comment_format))
-        
         keyword_format = QTextCharFormat()
         keyword_format.setForeground(QColor("#569CD6"))
         keyword_format.setFontWeight(QFont.Bold)
-        for pattern in keywords:
-            self.highlight_rules.append((fr'\b{pattern}\b', keyword_format))
+        self.formats = {"number": number_format, "comment": comment_format, "keyword": keyword_format}
+
+        self.error_format = QTextCharFormat()
+        self.error_format.setUnderlineStyle(QTextCharFormat.WaveUnderline)
+        self.error_format.setUnderlineColor(QColor("#F44747"))
+
+    def set_ram_size(self, ram_size):
+        """Operand range checks depend on the RAM size; re-check everything"""
+        if ram_size != self.ram_size:
+            self.ram_size = ram_size
+            self.rehighlight()
+
+    def set_geometry(self, geometry):
+        """SET/CLEAR coordinates are checked against the display size"""
+        if geometry != self.geometry:
+            self.geometry = geometry
+            self.rehighlight()
 
     def highlightBlock(self, text):
-        for pattern, format in self.highlight_rules:
-            regex = QRegularExpression(pattern)
-            match_iterator = regex.globalMatch(text)
-            while match_iterator.hasNext():
-                match = match_iterator.next()
-                self.setFormat(match.capturedStart(), 
-                              match.capturedLength(), format)
+        formats = self.formats
+        for match in TOKEN_PATTERN.finditer(text):
+            self.setFormat(match.start(), match.end() - match.start(), formats[match.lastgroup])
+
+        diagnostics = diagnose_line(text, self.ram_size, geometry=self.geometry)
+        for start, end, message in diagnostics:
+            for i in range(start, end):
+                char_format = self.format(i)
+                char_format.merge(self.error_format)
+                self.setFormat(i, 1, char_format)
+        self.setCurrentBlockUserData(LineDiagnostics(diagnostics) if diagnostics else None)
+
+class LineHighlightManager:
+    """Owns the editor's ExtraSelections: the current-PC line plus breakpoint markers.
+
+    Block lookups go through a cached line -> QTextBlock list that is only
+    rebuilt after the document changes. set_pc_line() just records the
+    wanted line; flush() (called once per display refresh) touches the
+    editor only if the line or the breakpoints actually changed.
+    """
+    def __init__(self, editor):
+        self.editor = editor
+        self._blocks = None
+        self._pc_line = None
+        self._pending_line = None
+        self._breakpoints = frozenset()
+        self._breakpoint_selections = []
+        self._dirty = False
+
+        self.pc_format = QTextCharFormat()
+        self.pc_format.setBackground(QColor("#264F78"))
+        self.pc_format.setProperty(QTextFormat.FullWidthSelection, True)
+        self.breakpoint_format = QTextCharFormat()
+        self.breakpoint_format.setBackground(QColor("#5A1E1E"))
+        self.breakpoint_format.setProperty(QTextFormat.FullWidthSelection, True)
+
+        editor.document().contentsChanged.connect(self._invalidate)
+
+    def _invalidate(self):
+        self._blocks = None
+        self._dirty = True
+
+    def _block(self, line):
+        """QTextBlock for a 1-based line number, or None"""
+        if self._blocks is None:
+            blocks = []
+            block = self.editor.document().firstBlock()
+            while block.isValid():
+                blocks.append(block)
+                block = block.next()
+            self._blocks = blocks
+        if line is None or not 1 <= line <= len(self._blocks):
+            return None
+        return self._blocks[line - 1]
+
+    def _selection(self, line, text_format):
+        block = self._block(line)
+        if block is None:
+            return None
+        selection = QTextEdit.ExtraSelection()
+        selection.format = text_format
+        selection.cursor = QTextCursor(block)
+        return selection
+
+    def set_pc_line(self, line):
+        self._pending_line = line
+
+    def set_breakpoints(self, lines):
+        lines = frozenset(lines)
+        if lines != self._breakpoints:
+            self._breakpoints = lines
+            self._dirty = True
+
+    def flush(self):
+        """Apply pending changes to the editor"""
+        line = self._pending_line
+        if line == self._pc_line and not self._dirty:
+            return
+        if self._dirty:
+            self._breakpoint_selections = [
+                selection for selection in
+                (self._selection(bp, self.breakpoint_format) for bp in sorted(self._breakpoints))
+                if selection is not None]
+        selections = list(self._breakpoint_selections)
+        pc_selection = self._selection(line, self.pc_format)
+        if pc_selection is not None:
+            selections.append(pc_selection)  # Drawn on top of a breakpoint marker
+        self.editor.setExtraSelections(selections)
+
+        if line != self._pc_line and pc_selection is not None:
+            self._scroll_to(pc_selection.cursor)
+        self._pc_line = line
+        self._dirty = False
+
+    def _scroll_to(self, cursor):
+        # Scroll only if the line is off-screen; never move the user's cursor
+        rect = self.editor.cursorRect(cursor)
+        viewport = self.editor.viewport().rect()
+        if viewport.contains(rect.topLeft()) and viewport.contains(rect.bottomLeft()):
+            return
+        scrollbar = self.editor.verticalScrollBar()
+        scrollbar.setValue(scrollbar.value() + rect.top() - viewport.height() // 3)
 
 class ControlButton(QPushButton):
     """Custom styled button for controls"""
@@ -196,9 +320,12 @@ class ScratchpadPanel(QFrame):
         grid.setContentsMargins(0, 0, 0, 0)
         
         self.bars = []
+        self.labels = []
+        self.heat = HeatDecay(8, levels=HEAT_LEVELS)
         for i in range(8):
             label = QLabel(f"S{i}")
             label.setAlignment(Qt.AlignCenter)
+            self.labels.append(label)
             
             bar = QProgressBar()
             bar.setRange(0, 255)
@@ -225,10 +352,24 @@ class ScratchpadPanel(QFrame):
         for i, value in enumerate(scratchpad):
             self.bars[i].setValue(value)
 
+    def update_heat(self, reads=None, writes=None):
+        """Tint each S label by recent accesses; no counts clears the overlay"""
+        if reads is None:
+            self.heat.reset()
+            changed = range(len(self.labels))
+        else:
+            changed = self.heat.update(reads, writes)
+        for i in changed:
+            level = self.heat.level[i]
+            self.labels[i].setStyleSheet(f"background-color: {HEAT_COLORS[level].name()};" if level else "")
+            if reads is not None:
+                self.labels[i].setToolTip(f"S{i}: reads {reads[i]}, writes {writes[i]}")
+
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.current_file = None
+        self.help_dialog = None  # Built the first time Help is opened
         self.setWindowIcon(QIcon("icon.png"))       
 
         # Set application style
@@ -283,12 +424,21 @@ class MainWindow(QMainWindow):
             }
         """)
         
+        self.metrics = Metrics()  # Run loop, paint and refresh timings (em_metrics)
         self.initUI()
-        # Initialize emulator with default RAM size 64
-        self.emulator = Emulator(self.display, ram_size=64)
+        # GUI-side emulator: assembles programs and holds pc_to_line/ram_size.
+        # The running machine lives in self.worker; its state arrives as snapshots.
+        self.emulator = Emulator(None, ram_size=64)
+        self.worker = EmulatorWorker(ram_size=64, metrics=self.metrics)
+        self.worker.start()
+        self.snapshot = None
+        self.awaiting_reset = False  # Ignore snapshots until the worker publishes the reset state
         self.timer = QTimer()
-        self.timer.timeout.connect(self.run_cycle)
+        self.timer.timeout.connect(self.refresh_from_worker)
+        self.timer.start(16)  # Pick up worker state at ~60Hz
         self.breakpoints = set()
+        self.breakpoint_conditions = {}  # line -> condition text
+        self.watch_specs = []  # Watchpoint texts, e.g. "RAM[40] W"
 
     def initUI(self):
         self.setWindowTitle("Forgematrix")
@@ -322,9 +472,12 @@ class MainWindow(QMainWindow):
             border-radius: 8px;
             padding: 20px;
         """)
+        self.display.metrics = self.metrics
+        self.create_hud()
         
         # Editor with custom styling
         self.editor = StyledTextEdit()
+        self.line_highlighter = LineHighlightManager(self.editor)
         
         # Create modern buttons
         self.run_btn = ControlButton("Run", "play", "#28A745")
@@ -334,10 +487,10 @@ class MainWindow(QMainWindow):
         self.step_btn = ControlButton("Step", "step", "#6C757D")
         
         # Memory display panels
-        self.memory_panel = InfoPanel("RAM (64 bytes)")
-        self.memory_display = self.memory_panel.content
+        self.memory_panel = MemoryPanel("RAM (64 bytes)")
         
         self.scratchpad_panel = ScratchpadPanel("Scratchpad (8 bytes)")
+        self.memory_panel.show_heat.toggled.connect(self.on_heatmap_toggled)
         
         # Add program counter display
         self.pc_label = QLabel("PC: 0")
@@ -407,10 +560,24 @@ class MainWindow(QMainWindow):
         
         program_header.addWidget(QLabel("RAM Size:"))
         self.ram_combo = QComboBox()
-        self.ram_combo.addItems(["32", "64", "128", "256"])
+        self.ram_combo.addItems(["32", "64", "128", "256", "4096", "16384", "65536"])  # >256: wide addresses
         self.ram_combo.setCurrentText("64")
         self.ram_combo.currentTextChanged.connect(self.on_ram_size_changed)
         program_header.addWidget(self.ram_combo)
+
+        program_header.addWidget(QLabel("Display:"))
+        self.display_combo = QComboBox()
+        self.display_combo.addItems(["4x4", "8x8", "16x16"])
+        self.display_combo.setCurrentText("4x4")
+        self.display_combo.currentTextChanged.connect(self.on_display_size_changed)
+        program_header.addWidget(self.display_combo)
+
+        program_header.addWidget(QLabel("Timing:"))
+        self.timing_combo = QComboBox()
+        self.timing_combo.addItems(list(TIMING_PROFILES))
+        self.timing_combo.setCurrentText("legacy")
+        self.timing_combo.currentTextChanged.connect(self.on_timing_changed)
+        program_header.addWidget(self.timing_combo)
         
         right_layout.addLayout(program_header)
         right_layout.addWidget(self.editor, 3)
@@ -491,31 +658,22 @@ class MainWindow(QMainWindow):
         self.reset_btn.clicked.connect(self.reset_emulation)
         self.help_btn.clicked.connect(self.show_help)
         self.editor.textChanged.connect(self.update_byte_counter)
+        self.editor.cursorPositionChanged.connect(self.show_line_diagnostics)
         self.step_btn.clicked.connect(self.step_debug)
 
+    def show_line_diagnostics(self):
+        """Show the assembler diagnostics for the cursor line in the status bar"""
+        data = self.editor.textCursor().block().userData()
+        if isinstance(data, LineDiagnostics):
+            self.statusBar.showMessage("; ".join(message for _, _, message in data.diagnostics))
+        elif self.statusBar.currentMessage():
+            self.statusBar.clearMessage()
+
     def update_highlight(self):
         """Highlight the line corresponding to current PC"""
-        self.editor.setExtraSelections([])  # Clear old highlights
-        
-        pc = self.emulator.pc
-        line_num = self.emulator.pc_to_line.get(pc, None)
-        
-        if line_num is not None:
-            doc = self.editor.document()
-            block = doc.findBlockByLineNumber(line_num - 1)  # Convert to 0-based index
-            
-            if block.isValid():
-                # Create highlight
-                cursor = QTextCursor(block)
-                selection = QTextEdit.ExtraSelection()
-                selection.format.setBackground(QColor("#264F78"))
-                selection.format.setProperty(QTextFormat.FullWidthSelection, True)
-                selection.cursor = cursor
-                
-                # Apply highlight
-                self.editor.setExtraSelections([selection])
-                self.editor.setTextCursor(cursor)
-                self.editor.ensureCursorVisible()
+        if self.snapshot is None:
+            return
+        self.line_highlighter.set_pc_line(self.emulator.pc_to_line.get(self.snapshot.pc))
 
     def create_toolbar(self):
         toolbar = QToolBar("Main Toolbar")
@@ -592,6 +750,43 @@ class MainWindow(QMainWindow):
         exit_action.triggered.connect(self.close)
         file_menu.addAction(exit_action)
         
+        # Debug menu
+        debug_menu = menubar.addMenu('Debug')
+
+        breakpoint_action = QAction('Toggle Breakpoint', self)
+        breakpoint_action.setShortcut('F9')
+        breakpoint_action.triggered.connect(self.toggle_breakpoint)
+        debug_menu.addAction(breakpoint_action)
+
+        condition_action = QAction('Conditional Breakpoint...', self)
+        condition_action.setShortcut('Ctrl+F9')
+        condition_action.triggered.connect(self.edit_breakpoint_condition)
+        debug_menu.addAction(condition_action)
+
+        clear_action = QAction('Clear All Breakpoints', self)
+        clear_action.triggered.connect(self.clear_breakpoints)
+        debug_menu.addAction(clear_action)
+
+        debug_menu.addSeparator()
+
+        watch_action = QAction('Add Watchpoint...', self)
+        watch_action.setShortcut('Ctrl+W')
+        watch_action.triggered.connect(self.add_watchpoint)
+        debug_menu.addAction(watch_action)
+
+        clear_watch_action = QAction('Clear All Watchpoints', self)
+        clear_watch_action.triggered.connect(self.clear_watchpoints)
+        debug_menu.addAction(clear_watch_action)
+
+        # View menu
+        view_menu = menubar.addMenu('View')
+
+        self.hud_action = QAction('Performance HUD', self)
+        self.hud_action.setShortcut('F12')
+        self.hud_action.setCheckable(True)
+        self.hud_action.toggled.connect(self.toggle_hud)
+        view_menu.addAction(self.hud_action)
+
         # Help menu
         help_menu = menubar.addMenu('Help')
         
@@ -599,6 +794,43 @@ class MainWindow(QMainWindow):
         about_action.triggered.connect(self.show_about)
         help_menu.addAction(about_action)
 
+    def create_hud(self):
+        """Metrics overlay in the display's corner, hidden until View > Performance HUD"""
+        self.hud = QLabel(self.display)
+        self.hud.setStyleSheet("""
+            background-color: #1E1E1E;
+            color: #4EC9B0;
+            border: 1px solid #3F3F46;
+            border-radius: 0px;
+            padding: 4px;
+            font-family: Consolas, monospace;
+            font-size: 9pt;
+        """)
+        self.hud.setAttribute(Qt.WA_TransparentForMouseEvents)
+        self.hud.move(12, 12)
+        self.hud.hide()
+        self.hud_sample = None
+        self.hud_timer = QTimer()
+        self.hud_timer.timeout.connect(self.update_hud)
+
+    def toggle_hud(self, enabled):
+        self.hud.setVisible(enabled)
+        if enabled:
+            self.hud_sample = self.metrics.sample()
+            self.hud.setText("Measuring...")
+            self.hud.adjustSize()
+            self.hud.raise_()
+            self.hud_timer.start(500)
+        else:
+            self.hud_timer.stop()
+
+    def update_hud(self):
+        """Show the rates since the previous update"""
+        sample = self.metrics.sample()
+        self.hud.setText("\n".join(format_hud(self.hud_sample, sample)))
+        self.hud.adjustSize()
+        self.hud_sample = sample
+
     def show_about(self):
         QMessageBox.about(self, "About Forgematrix",
                         "Forgematrix Emulator\nVersion 1.0\nDeveloped by\n"
@@ -646,21 +878,13 @@ class MainWindow(QMainWindow):
                             except:
                                 invalid_chars = True
                         if pairs:
-                            ram_ptr += 1 + 1 + 2 * len(pairs)  # 1 byte opcode + 1 byte count + 2 bytes per pair
+                            ram_ptr += encoded_length(cmd, len(pairs), self.emulator.wide)  # opcode + count + 2 bytes per pair
                         else:
                             invalid_chars = True
 
-                    # Existing logic for other commands
-                    elif cmd in {"STORE", "JUMPIF", "SCRATCH_STORE", 
-                                "SCRATCH_LOAD", "SCRATCH_COPY", "SCRATCH_JUMPIF", 
-                                "NOT", "SHL", "SHR"}:
-                        ram_ptr += 3
-                    elif cmd in {"WAIT", "LOAD", "JUMP"}:
-                        ram_ptr += 2
-                    elif cmd in {"LOOP", "SETALL", "SETNONE"}:
-                        ram_ptr += 1
-                    elif cmd in {"ADD", "SCRATCH_ADD", "AND", "OR", "XOR", "SUB"}:
-                        ram_ptr += 4
+                    # Other commands: size from the instruction table (address operands are 2 bytes in wide mode)
+                    elif cmd in SOURCE_SYNTAX:
+                        ram_ptr += encoded_length(cmd, wide=self.emulator.wide)
                     else:
                         invalid_chars = True
 
@@ -689,7 +913,8 @@ class MainWindow(QMainWindow):
             self.byte_counter.style().unpolish(self.byte_counter)
             self.byte_counter.style().polish(self.byte_counter)
 
-    def start_emulation(self):
+    def load_program(self):
+        """Assemble the editor contents and hand the image to the worker"""
         code = self.editor.toPlainText().split('\n')
         
         # Reset emulator and load the program into RAM
@@ -698,37 +923,49 @@ class MainWindow(QMainWindow):
         if not success:
             self.error_display.setText(self.emulator.error)
             self.status_label.setText("Error loading program")
-            return
-            
+            return False
+
         self.error_display.setText("")
-        self.emulator.running = True
-        self.timer.start(8)  # Run at ~120Hz
+        self.worker.send("load", bytes(self.emulator.ram), self.emulator.entry_point,
+                         dict(self.emulator.pc_to_line))
+        self.send_breakpoints()
+        return True
+
+    def start_emulation(self):
+        # Continue from a breakpoint or a step instead of restarting
+        paused = self.snapshot is not None and self.snapshot.running and not self.snapshot.free_running
+        if not paused and not self.load_program():
+            return
+        self.worker.send("start")
         self.status_label.setText("Running...")
-        self.update_memory_display()
-        self.update_pc_display()
 
     def stop_emulation(self):
-        self.timer.stop()
-        self.emulator.running = False
+        self.worker.send("stop")
         self.status_label.setText("Stopped")
         
-        if self.emulator.error:
-            self.error_display.setText(self.emulator.error)
+        if self.snapshot is not None and self.snapshot.error:
+            self.error_display.setText(self.snapshot.error)
 
     def reset_emulation(self):
         self.stop_emulation()
+        self.worker.send("reset")
         self.emulator.reset()
+        # Start and Step must not continue from the state before the reset; the
+        # worker publishes the reset state, marked reloaded, once it has handled
+        # the command, and any snapshot before that is from the old run
+        self.awaiting_reset = True
+        self.snapshot = None
         self.error_display.setText("")
-        self.update_memory_display()
-        self.update_pc_display()
         self.status_label.setText("Reset completed")
-        self.editor.setExtraSelections([])
-        self.editor.repaint()
+        self.line_highlighter.set_pc_line(None)
+        self.line_highlighter.flush()
 
     def on_ram_size_changed(self, size_str):
         """Handle RAM size change event"""
         new_size = int(size_str)
-        self.emulator = Emulator(self.display, ram_size=new_size)
+        self.emulator.resize(new_size)
+        self.worker.send("resize", new_size)
+        self.editor.highlighter.set_ram_size(new_size)
         self.reset_emulation()
         self.memory_panel.title_label.setText(f"RAM ({new_size} bytes)")
         self.update_byte_counter()
@@ -736,154 +973,174 @@ class MainWindow(QMainWindow):
         self.memory_panel.setMinimumWidth(250)
         self.memory_panel.setMaximumWidth(350)
 
+    def on_display_size_changed(self, size_str):
+        """Switch the LED matrix size (e.g. "8x8") for the assembler, worker and renderer"""
+        geometry = get_geometry(size_str)
+        self.emulator.resize(self.emulator.ram_size, geometry)
+        self.worker.send("resize", self.emulator.ram_size, geometry)
+        self.display.set_geometry(geometry)
+        self.editor.highlighter.set_geometry(geometry)
+        self.reset_emulation()
+        self.status_label.setText(f"Display: {geometry.width}x{geometry.height}")
+
+    def on_heatmap_toggled(self, enabled):
+        """Collect access counters in the worker only while the overlay is shown"""
+        self.worker.send("heatmap", enabled)
+        if not enabled:
+            self.scratchpad_panel.update_heat()
+
+    def on_timing_changed(self, profile):
+        """Handle timing profile change event"""
+        self.emulator.set_timing(profile)
+        self.worker.send("timing", profile)
+        self.status_label.setText(f"Timing: {profile}")
+
     def toggle_breakpoint(self):
         cursor = self.editor.textCursor()
         line = cursor.blockNumber() + 1
         if line in self.breakpoints:
             self.breakpoints.remove(line)
+            self.breakpoint_conditions.pop(line, None)
         else:
             self.breakpoints.add(line)
-        self.highlight_current_line()
-
-    def highlight_current_line(self):
-        extra_selections = []
-        cursor = QTextEdit.ExtraSelection()
-        line_color = QColor("#264F78")
-        cursor.format.setBackground(line_color)
-        cursor.format.setProperty(QTextFormat.FullWidthSelection, True)
-        cursor.cursor = self.editor.textCursor()
-        cursor.cursor.clearSelection()
-        extra_selections.append(cursor)
-        self.editor.setExtraSelections(extra_selections)
+        self.breakpoints_changed()
+
+    def edit_breakpoint_condition(self):
+        """Set a RAM/scratchpad condition on the breakpoint at the cursor line"""
+        line = self.editor.textCursor().blockNumber() + 1
+        text, ok = QInputDialog.getText(
+            self, "Conditional Breakpoint",
+            f"Break on line {line} when (e.g. RAM[10] == 5, SCRATCH[2] > 0; empty for always):",
+            text=self.breakpoint_conditions.get(line, ""))
+        if not ok:
+            return
+        text = text.strip()
+        if text:
+            try:
+                parse_condition(text)
+            except ValueError as e:
+                QMessageBox.warning(self, "Error", str(e))
+                return
+            self.breakpoint_conditions[line] = text
+        else:
+            self.breakpoint_conditions.pop(line, None)
+        self.breakpoints.add(line)
+        self.breakpoints_changed()
+
+    def clear_breakpoints(self):
+        self.breakpoints.clear()
+        self.breakpoint_conditions.clear()
+        self.breakpoints_changed()
+
+    def breakpoints_changed(self):
+        self.line_highlighter.set_breakpoints(self.breakpoints)
+        self.line_highlighter.flush()
+        self.send_breakpoints()
+
+    def send_breakpoints(self):
+        """Resolve breakpoint lines to addresses of the loaded program and hand them to the worker"""
+        # A fresh set every time: the worker owns whatever it was sent
+        self.worker.send("breakpoints", resolve_breakpoints(
+            self.emulator.pc_to_line, self.breakpoints, self.breakpoint_conditions))
+
+    def add_watchpoint(self):
+        """Watch a RAM or scratchpad byte/range for reads, writes or a value"""
+        text, ok = QInputDialog.getText(
+            self, "Add Watchpoint",
+            "Watch (e.g. RAM[40], RAM[8:16] RW, SCRATCH[2] R, RAM[40] == 5):")
+        if not ok or not text.strip():
+            return
+        try:
+            parse_watchpoint(text)
+        except ValueError as e:
+            QMessageBox.warning(self, "Error", str(e))
+            return
+        self.watch_specs.append(text.strip())
+        self.send_watchpoints()
+        self.status_label.setText(f"Watchpoints: {', '.join(self.watch_specs)}")
+
+    def clear_watchpoints(self):
+        self.watch_specs = []
+        self.send_watchpoints()
+        self.status_label.setText("Watchpoints cleared")
+
+    def send_watchpoints(self):
+        self.worker.send("watchpoints", WatchpointSet(parse_watchpoint(spec) for spec in self.watch_specs))
 
     def step_debug(self):
-        if not self.emulator.running:
-            code = self.editor.toPlainText().split('\n')
-            if not self.emulator.parse_and_load_program(code):
+        if self.snapshot is None or not self.snapshot.running:
+            if not self.load_program():
                 return
-            self.emulator.running = True
 
-        self.emulator.step()
-        self.update_pc_display()
-        self.update_highlight()
-        self.update_memory_display()
+        self.worker.send("step")
 
-        if self.emulator.pc in self.breakpoints:
-            self.stop_emulation()
+    def refresh_from_worker(self):
+        """Show the worker's latest snapshot if it is new"""
+        started = time.perf_counter()
+        try:
+            self._show_latest_snapshot()
+        finally:
+            self.metrics.gui_seconds.observe(time.perf_counter() - started)
+
+    def _show_latest_snapshot(self):
+        snapshot = self.worker.latest()
+        if snapshot is None or snapshot is self.snapshot or (self.awaiting_reset and not snapshot.reloaded):
+            self.line_highlighter.flush()  # Breakpoint markers after edits
+            return
+        self.awaiting_reset = False
+        previous = self.snapshot
+        self.snapshot = snapshot
 
-    def run_cycle(self):
-        if self.emulator.running:
-            self.emulator.step()
-            
-            # Update PC display each cycle
-            self.update_pc_display()
+        # Dirty ranges are relative to seq - 1; redraw everything if we skipped one
+        contiguous = previous is not None and snapshot.seq == previous.seq + 1
+        self.display.set_frame(snapshot.framebuffer)
+        self.update_pc_display()
+        if previous is None or snapshot.pc != previous.pc:
             self.update_highlight()
-            
-            # Update memory display every 30 cycles
-            if self.emulator.pc % 30 == 0:
-                self.update_memory_display()
-                
-            # Check for errors
-            if self.emulator.error:
-                self.error_display.setText(self.emulator.error)
-                self.stop_emulation()
-
-    def update_memory_display(self):
-        mem_text = ""
-        for i in range(0, self.emulator.ram_size, 8):
-            row = f"{i:02d}: "
-            row += " ".join(f"{self.emulator.ram[i+j]:02X}" for j in range(8))
-            mem_text += row + "\n"
-        self.memory_display.setText(mem_text)
-        self.scratchpad_panel.update_values(self.emulator.scratchpad)
+            self.line_highlighter.flush()  # Editor selection changes at most once per refresh
+        self.update_memory_display(snapshot.dirty if contiguous else None)
+        if not contiguous or snapshot.scratchpad != previous.scratchpad:
+            self.scratchpad_panel.update_values(snapshot.scratchpad)
+        if snapshot.heat is not None and self.memory_panel.show_heat.isChecked():
+            self.scratchpad_panel.update_heat(snapshot.heat[2], snapshot.heat[3])
+
+        if snapshot.error:
+            self.error_display.setText(snapshot.error)
+            self.status_label.setText("Stopped")
+        elif snapshot.watch is not None:
+            if previous is None or previous.watch != snapshot.watch or previous.free_running:
+                self.status_label.setText(format_watch_hit(snapshot.watch))
+        elif snapshot.breakpoint is not None:
+            if previous is None or previous.breakpoint != snapshot.breakpoint or previous.free_running:
+                line = self.emulator.pc_to_line.get(snapshot.breakpoint)
+                where = f"line {line}" if line is not None else f"address {snapshot.breakpoint}"
+                self.status_label.setText(f"Breakpoint at {where}")
+        elif previous is not None and previous.free_running and not snapshot.free_running:
+            if self.status_label.text() != "Stopped":  # Not stopped by the user
+                self.status_label.setText("Halted" if not snapshot.running else "Stopped")
+
+    def update_memory_display(self, dirty=None):
+        """Push the current snapshot into the RAM grid (dirty=None: compare all cells)"""
+        if self.snapshot is not None:
+            self.memory_panel.apply_snapshot(self.snapshot, dirty)
         
     def update_pc_display(self):
-        pc_text = f"PC: {self.emulator.pc}"
+        snapshot = self.snapshot
+        if snapshot is None:
+            return
+        pc_text = f"PC: {snapshot.pc}"
+
+        if snapshot.instruction is not None:
+            pc_text += f" | {snapshot.instruction}"
     
         # Show WAIT cycles if active
-        if self.emulator.delay > 0:
-            pc_text += f" | WAIT: {self.emulator.active_delay - self.emulator.delay + 1}/{self.emulator.active_delay}"
+        if snapshot.delay > 0:
+            pc_text += f" | WAIT: {snapshot.active_delay - snapshot.delay + 1}/{snapshot.active_delay}"
+
+        pc_text += f" | CYC: {snapshot.cycles}"
     
         self.pc_label.setText(pc_text)
 
-        """Update the byte counter based on program code."""
-        code = self.editor.toPlainText().split('\n')
-        ram_ptr = 0
-        valid = True
-        invalid_chars = False
-
-        try:
-            for line in code:
-                line = line.strip().upper()
-                if not line or line.startswith('#'):
-                    continue
-
-                parts = line.split()
-                if not parts:
-                    continue
-
-                cmd = parts[0]
-                try:
-                    if cmd == "EP":
-                        continue
-
-                    # Handle SET/CLEAR with multiple pairs
-                    elif cmd in {"SET", "CLEAR"}:
-                        params_str = ' '.join(parts[1:])
-                        pairs = []
-                        for pair in params_str.split(','):
-                            pair = pair.strip()
-                            if not pair:
-                                continue
-                            try:
-                                x, y = pair.split()
-                                pairs.append((x, y))
-                            except:
-                                invalid_chars = True
-                        if pairs:
-                            ram_ptr += 1 + 1 + 2 * len(pairs)  # 1 byte opcode + 1 byte count + 2 bytes per pair
-                        else:
-                            invalid_chars = True
-
-                    # Existing logic for other commands
-                    elif cmd in {"STORE", "JUMPIF", "SCRATCH_STORE", 
-                                "SCRATCH_LOAD", "SCRATCH_COPY", "SCRATCH_JUMPIF", 
-                                "NOT", "SHL", "SHR"}:
-                        ram_ptr += 3
-                    elif cmd in {"WAIT", "LOAD", "JUMP"}:
-                        ram_ptr += 2
-                    elif cmd in {"LOOP", "SETALL", "SETNONE"}:
-                        ram_ptr += 1
-                    elif cmd in {"ADD", "SCRATCH_ADD", "AND", "OR", "XOR", "SUB"}:
-                        ram_ptr += 4
-                    else:
-                        invalid_chars = True
-
-                except Exception as e:
-                    invalid_chars = True
-
-            status_text = f"{ram_ptr}/{self.emulator.ram_size} BYTES USED"
-
-            if invalid_chars:
-                status_text += " - INVALID SYNTAX"
-                valid = False
-            elif ram_ptr > self.emulator.ram_size:
-                status_text += " - OVER CAPACITY!"
-                valid = False
-            elif ram_ptr > self.emulator.ram_size * 0.8:
-                valid = False  # Warning state (yellow)
-
-            self.byte_counter.setText(status_text)
-            self.byte_counter.setProperty("valid", valid)
-            self.byte_counter.style().unpolish(self.byte_counter)
-            self.byte_counter.style().polish(self.byte_counter)
-
-        except Exception as e:
-            self.byte_counter.setText("SYNTAX ERROR IN PROGRAM")
-            self.byte_counter.setProperty("valid", False)
-            self.byte_counter.style().unpolish(self.byte_counter)
-            self.byte_counter.style().polish(self.byte_counter)
-
     def new_file(self):
         if self.check_save_needed():
             self.editor.clear()
@@ -960,6 +1217,11 @@ class MainWindow(QMainWindow):
         return True
 
     def show_help(self):
+        if self.help_dialog is not None:
+            self.help_dialog.show()
+            self.help_dialog.raise_()
+            return
+
         help_text = """<h2>Forgematrix Programming Guide</h2>
         <p>A simple emulator for a 2-bit processor with:</p>
         <ul>
@@ -977,18 +1239,31 @@ class MainWindow(QMainWindow):
         <code>LOOP</code> - Jumps back to first instruction<br>
         <code>SETALL</code> - Turns on all pixels<br>
         <code>SETNONE</code> - Turns off all pixels</p>
+        <h3>Pixel Mask Commands:</h3>
+        <p>A mask holds one bit per pixel: bit (y*width + x), so 0x000F is the top row of the 4x4 display.
+        Masks are 16 bits, so mask commands work only on displays of up to 16 pixels.<br>
+        <code>SETMASK m</code> - Turns on every pixel set in mask m (e.g. 0xF00F)<br>
+        <code>CLEARMASK m</code> - Turns off every pixel set in mask m<br>
+        <code>TOGGLEMASK m</code> - Flips every pixel set in mask m<br>
+        <code>LOADMASK m</code> - Shows exactly mask m<br>
+        <code>SETMASK_RAM a</code>, <code>CLEARMASK_RAM a</code>, <code>TOGGLEMASK_RAM a</code>, <code>LOADMASK_RAM a</code> -
+        Same, with the mask read from RAM[a] (rows 0-1) and RAM[a+1] (rows 2-3)</p>
         <h3>Memory Commands:</h3>
         <p><code>STORE a v</code> - Store value v in RAM at address a<br>
         <code>LOAD a</code> - Load value from RAM address a (demonstrates by setting pixel 0,0)<br>
         <code>JUMP a</code> - Jump to instruction at position a<br>
         <code>JUMPIF a r</code> - Jump to instruction a if RAM address r is non-zero<br>
-        <code>ADD a b c</code> - Add value at RAM address a to value at b, store result in c</p>
+        <code>ADD a b c</code> - Add value at RAM address a to value at b, store result in c<br>
+        <code>MEMCPY s d n</code> - Copy n bytes from RAM[s] to RAM[d] in one step<br>
+        <code>MEMSET d v n</code> - Fill n bytes starting at RAM[d] with value v</p>
         <h3>Scratchpad Commands:</h3>
         <p><code>SCRATCH_STORE s v</code> - Store value v in scratchpad address s (0-7)<br>
         <code>SCRATCH_LOAD s a</code> - Load value from scratchpad s to RAM address a<br>
         <code>SCRATCH_ADD s1 s2 d</code> - Add scratchpad s1 and s2, store result in scratchpad d<br>
         <code>SCRATCH_COPY a s</code> - Copy RAM address a to scratchpad s<br>
-        <code>SCRATCH_JUMPIF a s</code> - Jump to address a if scratchpad s is non-zero</p>
+        <code>SCRATCH_JUMPIF a s</code> - Jump to address a if scratchpad s is non-zero<br>
+        <code>SCRATCH_LOAD_BLOCK s a n</code> - Copy n bytes from scratchpad s to RAM address a<br>
+        <code>SCRATCH_COPY_BLOCK a s n</code> - Copy n bytes from RAM address a to scratchpad s (saved once)</p>
         <h3>Bitwise Commands:</h3>
         <p><code>AND a b c</code> - Bitwise AND of RAM[a] and RAM[b], store in RAM[c]<br>
         <code>OR a b c</code> - Bitwise OR of RAM[a] and RAM[b], store in RAM[c]<br>
@@ -997,14 +1272,22 @@ class MainWindow(QMainWindow):
         <code>SHL a b</code> - Shift RAM[a] left by 1 bit, store in RAM[b]<br>
         <code>SHR a b</code> - Shift RAM[a] right by 1 bit, store in RAM[b]</p>
         <h3>Math Commands:</h3>
-        <p><code>SUB a b c</code> - Subtract RAM[b] from RAM[a], store in RAM[c]</p>
+        <p><code>SUB a b c</code> - Subtract RAM[b] from RAM[a], store in RAM[c]<br>
+        <code>ADDI a v c</code>, <code>SUBI a v c</code>, <code>ANDI a v c</code>, <code>ORI a v c</code>, <code>XORI a v c</code> -
+        Same as ADD/SUB/AND/OR/XOR with the literal value v instead of RAM[b]<br>
+        <code>SHLI a n c</code>, <code>SHRI a n c</code> - Shift RAM[a] by n bits, store in RAM[c]</p>
+        <h3>Loop Commands:</h3>
+        <p><code>DJNZ a t</code> - Decrement RAM[a]; jump to address t if it is still non-zero</p>
         <h3>RAM Usage:</h3>
         <ul>
             <li>Each instruction requires space in RAM:<br>
-                <code>ADD/SCRATCH_ADD/AND/OR/XOR/SUB</code>: 4 bytes<br>
-                <code>SET/CLEAR/STORE/JUMPIF/SCRATCH_STORE/SCRATCH_LOAD/SCRATCH_COPY/SCRATCH_JUMPIF/NOT/SHL/SHR</code>: 3 bytes<br>
-                <code>WAIT/LOAD/JUMP</code>: 2 bytes<br>
+                <code>ADD/SCRATCH_ADD/AND/OR/XOR/SUB/MEMCPY/MEMSET/SCRATCH_LOAD_BLOCK/SCRATCH_COPY_BLOCK/ADDI/SUBI/ANDI/ORI/XORI/SHLI/SHRI</code>: 4 bytes<br>
+                <code>STORE/JUMPIF/SCRATCH_STORE/SCRATCH_LOAD/SCRATCH_COPY/SCRATCH_JUMPIF/NOT/SHL/SHR/SETMASK/CLEARMASK/TOGGLEMASK/LOADMASK/DJNZ</code>: 3 bytes<br>
+                <code>SET/CLEAR</code>: 2 bytes + 2 per pixel<br>
+                <code>WAIT/LOAD/JUMP/*MASK_RAM</code>: 2 bytes<br>
                 <code>LOOP/SETALL/SETNONE</code>: 1 byte</li>
+            <li>RAM sizes above 256 bytes use the wide address mode: RAM addresses and jump targets
+                take 2 bytes (low byte first), e.g. STORE is 4 bytes and ADD is 7</li>
             <li>Program code and data share the same RAM</li>
             <li>Scratchpad: 8 persistent bytes (saved between runs)</li>
             <li>Execution stops when all RAM is used or an error occurs</li>
@@ -1055,6 +1338,9 @@ class MainWindow(QMainWindow):
     def closeEvent(self, event):
         # Handle window close event with save check
         if self.check_save_needed():
+            self.timer.stop()
+            self.hud_timer.stop()
+            self.worker.shutdown()
             event.accept()
         else:
             event.ignore()
@@ -0,0 +1,215 @@
+from PyQt5.QtWidgets import (QFrame, QVBoxLayout, QHBoxLayout, QLabel, QTableView,
+                             QHeaderView, QCheckBox, QAbstractItemView)
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex
+from PyQt5.QtGui import QColor, QBrush, QFont
+from em_heatmap import HeatDecay
+
+COLUMNS = 8
+WRITE_FADE_STEPS = 20  # Refreshes a written cell stays highlighted
+
+PC_BRUSH = QBrush(QColor("#264F78"))
+READ_BRUSH = QBrush(QColor("#1F4E3D"))
+# Recently written cells fade from bright orange back to the background
+WRITE_BRUSHES = [QBrush(QColor(30 + (170 * age) // WRITE_FADE_STEPS,
+                               30 + (80 * age) // WRITE_FADE_STEPS,
+                               30)) for age in range(WRITE_FADE_STEPS + 1)]
+
+HEAT_LEVELS = 16
+# Heatmap ramp: background -> deep red -> yellow for the hottest addresses
+HEAT_COLORS = [QColor(30 + (225 * level) // (HEAT_LEVELS - 1),
+                      30 + max(0, 200 * (2 * level - HEAT_LEVELS) // HEAT_LEVELS),
+                      30) for level in range(HEAT_LEVELS)]
+HEAT_BRUSHES = [QBrush(color) for color in HEAT_COLORS]
+
+class RamTableModel(QAbstractTableModel):
+    """RAM as an 8-column grid of hex bytes.
+
+    apply_snapshot() only emits dataChanged for cells whose value or
+    highlight actually changed, so a quiet program costs almost nothing.
+    """
+    def __init__(self, ram_size=64, parent=None):
+        super().__init__(parent)
+        self.ram = bytes(ram_size)
+        self.write_age = {}   # address -> refreshes left in the write highlight
+        self.pc_cells = range(0)
+        self.read_cells = set()
+        self.show_heat = False
+        self.heat = HeatDecay(ram_size, levels=HEAT_LEVELS)
+        self.access_totals = None  # (reads, writes) per address from the last snapshot
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else (len(self.ram) + COLUMNS - 1) // COLUMNS
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else COLUMNS
+
+    def data(self, index, role=Qt.DisplayRole):
+        addr = index.row() * COLUMNS + index.column()
+        if addr >= len(self.ram):
+            return None
+        if role == Qt.DisplayRole:
+            return f"{self.ram[addr]:02X}"
+        if role == Qt.BackgroundRole:
+            if addr in self.pc_cells:
+                return PC_BRUSH
+            if addr in self.write_age:
+                return WRITE_BRUSHES[self.write_age[addr]]
+            if addr in self.read_cells:
+                return READ_BRUSH
+            if self.show_heat and self.heat.level[addr]:
+                return HEAT_BRUSHES[self.heat.level[addr]]
+            return None
+        if role == Qt.ToolTipRole:
+            if self.show_heat and self.access_totals is not None:
+                reads, writes = self.access_totals
+                return f"RAM[{addr}] = {self.ram[addr]} (reads {reads[addr]}, writes {writes[addr]})"
+            return f"RAM[{addr}] = {self.ram[addr]}"
+        if role == Qt.TextAlignmentRole:
+            return Qt.AlignCenter
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return f"+{section}"
+        return f"{section * COLUMNS:02d}"
+
+    def reset_ram(self, ram):
+        """Replace the whole image (load, reset or resize)"""
+        self.beginResetModel()
+        self.ram = bytes(ram)
+        self.write_age = {}
+        self.pc_cells = range(0)
+        self.read_cells = set()
+        self.heat.reset(len(self.ram))
+        self.access_totals = None
+        self.endResetModel()
+
+    def set_heat_visible(self, visible):
+        """Show or hide the access heatmap overlay"""
+        self.show_heat = visible
+        self.heat.reset(len(self.ram))
+        self.access_totals = None
+        self._emit_changed(range(len(self.ram)))
+
+    def apply_snapshot(self, snapshot, dirty=None):
+        """Update from a worker Snapshot; dirty=None means compare everything"""
+        if snapshot.reloaded or len(snapshot.ram) != len(self.ram):
+            self.reset_ram(snapshot.ram)
+            dirty = []
+        changed = set()
+
+        if dirty is None:
+            old = self.ram
+            dirty = [(a, a + 1) for a in range(len(old)) if old[a] != snapshot.ram[a]]
+        self.ram = snapshot.ram
+
+        # Age out old write highlights, then mark the new writes
+        for addr in list(self.write_age):
+            if self.write_age[addr] <= 1:
+                del self.write_age[addr]
+            else:
+                self.write_age[addr] -= 1
+            changed.add(addr)
+        for start, end in dirty:
+            for addr in range(start, min(end, len(self.ram))):
+                self.write_age[addr] = WRITE_FADE_STEPS
+                changed.add(addr)
+
+        pc_cells = range(snapshot.pc, min(snapshot.pc + max(snapshot.instruction_length, 1), len(self.ram)))
+        if pc_cells != self.pc_cells:
+            changed.update(self.pc_cells)
+            changed.update(pc_cells)
+            self.pc_cells = pc_cells
+
+        read_cells = {addr for start, end in snapshot.reads for addr in range(start, min(end, len(self.ram)))}
+        if read_cells != self.read_cells:
+            changed.update(read_cells ^ self.read_cells)
+            self.read_cells = read_cells
+
+        if self.show_heat and snapshot.heat is not None:
+            reads, writes = snapshot.heat[0], snapshot.heat[1]
+            self.access_totals = (reads, writes)
+            changed.update(self.heat.update(reads, writes))
+
+        self._emit_changed(changed)
+
+    def _emit_changed(self, addresses):
+        # One dataChanged per contiguous row span keeps signal traffic small
+        rows = sorted({addr // COLUMNS for addr in addresses})
+        start = None
+        for i, row in enumerate(rows):
+            if start is None:
+                start = row
+            if i + 1 == len(rows) or rows[i + 1] != row + 1:
+                self.dataChanged.emit(self.index(start, 0), self.index(row, COLUMNS - 1),
+                                      [Qt.DisplayRole, Qt.BackgroundRole])
+                start = None
+
+class MemoryPanel(QFrame):
+    """RAM grid panel fed by worker snapshots; can follow the PC"""
+    def __init__(self, title, ram_size=64, parent=None):
+        super().__init__(parent)
+        self.setFrameShape(QFrame.StyledPanel)
+        self.setStyleSheet("""
+            QFrame {
+                background-color: #252526;
+                border: 1px solid #3F3F46;
+                border-radius: 4px;
+            }
+            QLabel, QCheckBox {
+                color: #DCDCDC;
+                font-weight: bold;
+                padding: 4px;
+                border: none;
+            }
+            QTableView {
+                background-color: #1E1E1E;
+                color: #DCDCDC;
+                gridline-color: #2D2D30;
+                border: 1px solid #3F3F46;
+                border-radius: 2px;
+            }
+            QHeaderView::section {
+                background-color: #252526;
+                color: #808080;
+                border: none;
+                padding: 0 4px;
+            }
+        """)
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(8, 8, 8, 8)
+        layout.setSpacing(4)
+
+        header = QHBoxLayout()
+        self.title_label = QLabel(title)
+        header.addWidget(self.title_label)
+        header.addStretch(1)
+        self.follow_pc = QCheckBox("Follow PC")
+        self.follow_pc.setChecked(True)
+        header.addWidget(self.follow_pc)
+        self.show_heat = QCheckBox("Heatmap")
+        header.addWidget(self.show_heat)
+        layout.addLayout(header)
+
+        self.model = RamTableModel(ram_size, self)
+        self.show_heat.toggled.connect(self.model.set_heat_visible)
+        self.view = QTableView()
+        self.view.setModel(self.model)
+        self.view.setFont(QFont("Consolas", 9))
+        self.view.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.view.setSelectionMode(QAbstractItemView.NoSelection)
+        self.view.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.view.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.view.verticalHeader().setDefaultSectionSize(18)
+        layout.addWidget(self.view)
+        self._pc_row = -1
+
+    def apply_snapshot(self, snapshot, dirty=None):
+        self.model.apply_snapshot(snapshot, dirty)
+        row = snapshot.pc // COLUMNS
+        if self.follow_pc.isChecked() and row != self._pc_row:
+            self._pc_row = row
+            self.view.scrollTo(self.model.index(row, 0))
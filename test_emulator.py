@@ -1,6 +1,34 @@
+import asyncio
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
 import unittest
 from em_core import Emulator
-from em_parser import parse_and_load_program
+from em_constants import INSTRUCTIONS
+from em_parser import parse_and_load_program, diagnose_line, encoded_length
+import em_cli
+from em_heatmap import HeatDecay
+from em_framebuffer import DisplayGeometry, get_geometry
+from em_machine import Machine
+from em_async import AsyncRunner, FrameEvent, RunnerEvent
+from em_server import EmulationServer
+from em_pool import EmulatorPool
+import em_fuzz
+from em_wall import WallScheduler
+from em_metrics import Metrics, MetricsFile, serve_metrics, format_hud
+from em_fusion import corpus_statistics, split_programs, FUSED_PAIRS
+from em_hooks import (INSTRUCTION, RAM_WRITE, SCRATCH_WRITE, PIXELS, HALT, ERROR,
+                      InstructionEvent, WriteEvent, PixelEvent, StopEvent, InstructionProfile)
+from em_recorder import DisplayRecorder, encode_gif, encode_apng, encode_frame_stream, decode_frame_stream
+from em_timing import TimingModel
+from em_snapshot import SnapshotPublisher, changed_ranges
+from em_disasm import memory_accesses, disassemble
+from em_debug import (BreakpointSet, Condition, parse_condition, resolve_breakpoints,
+                      Watchpoint, WatchpointSet, parse_watchpoint, format_watch_hit)
 
 class TestEmulator(unittest.TestCase):
     def setUp(self):
@@ -45,5 +73,1141 @@ class TestEmulator(unittest.TestCase):
         self.em.step()
         self.assertEqual(self.em.scratchpad[2], 50)
 
+class TestDisassembler(unittest.TestCase):
+    def setUp(self):
+        self.em = Emulator(None, ram_size=64)
+
+    def test_index_matches_parser(self):
+        code = [
+            "EP 0",
+            "STORE 40 3",
+            "SET 0 0, 1 1",
+            "JUMPIF 0 40",
+            "LOOP"
+        ]
+        self.assertTrue(parse_and_load_program(self.em, code))
+        index = self.em.instructions
+        for address in self.em.pc_to_line:
+            self.assertIsNotNone(index.at(address))
+        self.assertEqual(index.at(3).name, "SET")
+        self.assertEqual(index.at(3).operands, ((0, 0), (1, 1)))
+        self.assertEqual(index.at(3).length, 6)
+        self.assertIn(9, index.reachable)
+
+    def test_load_image_without_source(self):
+        image = bytes([self.em.JUMP, 4, 0xFF, 0xFF, self.em.SETALL, self.em.LOOP])
+        self.assertTrue(self.em.load_image(image))
+        index = self.em.instructions
+        self.assertEqual(index.at(0).name, "JUMP")
+        self.assertIsNone(index.at(2))
+        self.assertEqual(index.at(4).name, "SETALL")
+        self.assertEqual(sorted(index.reachable), [0, 4, 5])
+
+    def test_update_after_write(self):
+        parse_and_load_program(self.em, ["STORE 40 1", "SETALL", "LOOP"])
+        index = self.em.instructions
+        self.em.ram[3] = self.em.WAIT  # SETALL -> WAIT 9 (swallows LOOP's byte)
+        self.em.ram[4] = 9
+        self.assertTrue(index.sync())
+        self.assertEqual(index.at(3).name, "WAIT")
+        self.assertEqual(index.at(3).operands, (9,))
+        self.assertIsNone(index.at(4))
+        self.assertEqual(sorted(index.reachable), [0, 3, 5])
+        self.assertFalse(index.sync())
+
+    def test_update_after_retargeting_jump(self):
+        image = bytes([self.em.JUMP, 4, 0, 0, self.em.SETALL, self.em.LOOP])
+        self.assertTrue(self.em.load_image(image))
+        index = self.em.instructions
+        self.assertEqual(sorted(index.reachable), [0, 4, 5])
+        self.em.ram[1] = 2
+        index.sync()
+        self.assertEqual(sorted(index.reachable), [0, 2])
+        self.assertEqual(index.at(4).name, "SETALL")  # Still swept, no longer reachable
+
+    def test_update_matches_rebuild(self):
+        rng = random.Random(26)
+        opcodes = [0] + list(INSTRUCTIONS)
+        for case in range(300):
+            size, wide = rng.choice([(32, False), (64, False), (200, True)])
+            ram = bytearray(rng.choice(opcodes) if rng.random() < 0.6 else rng.randrange(8) for _ in range(size))
+            entry_point = rng.randrange(4)
+            index = disassemble(ram, size, entry_point, wide)
+            for write in range(10):
+                address = rng.randrange(size)
+                for addr in range(address, min(address + rng.randint(1, 3), size)):
+                    ram[addr] = rng.choice(opcodes) if rng.random() < 0.5 else rng.randrange(size)
+                index.sync()
+                fresh = disassemble(ram, size, entry_point, wide)
+                self.assertEqual(index.instructions, fresh.instructions, (case, write))
+                self.assertEqual(index.reachable, fresh.reachable, (case, write))
+
+class RecordingDisplay:
+    """Headless display that records bulk frame updates"""
+    def __init__(self):
+        self.frames = []
+
+    def set_frame(self, frame):
+        self.frames.append(frame)
+
+    def clear_all(self):
+        self.frames.append(0)
+
+class TestPixelMasks(unittest.TestCase):
+    def setUp(self):
+        self.display = RecordingDisplay()
+        self.em = Emulator(self.display, ram_size=64)
+
+    def run_program(self, code):
+        self.assertTrue(parse_and_load_program(self.em, code), self.em.error)
+        self.em.running = True
+        while self.em.running:
+            self.em.step()
+        self.assertIsNone(self.em.error)
+
+    def test_immediate_masks(self):
+        self.run_program([
+            "LOADMASK 0x000F",
+            "SETMASK 0b1000000000000000",
+            "CLEARMASK 0x0001",
+            "TOGGLEMASK 0x8003",
+        ])
+        self.assertEqual(self.display.frames[1:], [0x000F, 0x800F, 0x800E, 0x000D])
+        self.assertEqual(self.em.framebuffer, 0x000D)
+
+    def test_ram_mask_is_one_display_update(self):
+        self.run_program([
+            "STORE 40 0xF0",
+            "STORE 41 0x0F",
+            "LOADMASK_RAM 40",
+        ])
+        self.assertEqual(self.display.frames[1:], [0x0FF0])
+
+    def test_set_pairs_share_one_update(self):
+        self.run_program(["SET 0 0, 1 1, 2 2, 3 3", "CLEAR 1 1"])
+        self.assertEqual(self.display.frames[1:], [0x8421, 0x8401])
+
+    def test_mask_encoding_size(self):
+        self.assertTrue(parse_and_load_program(self.em, ["SETMASK 0xFFFF", "LOADMASK_RAM 10", "LOOP"]))
+        self.assertEqual(list(self.em.ram[:6]), [self.em.SETMASK, 0xFF, 0xFF, self.em.LOADMASK_RAM, 10, self.em.LOOP])
+        self.assertEqual(self.em.instructions.at(3).name, "LOADMASK_RAM")
+        self.assertFalse(parse_and_load_program(self.em, ["SETMASK 0x10000"]))
+
+class TestBlockMemory(unittest.TestCase):
+    def setUp(self):
+        self.em = Emulator(None, ram_size=64)
+        self.em.save_scratchpad = lambda: None  # Keep tests off the disk
+
+    def run_program(self, code):
+        self.assertTrue(parse_and_load_program(self.em, code), self.em.error)
+        self.em.running = True
+        steps = 0
+        while self.em.running:
+            self.em.step()
+            steps += 1
+        return steps
+
+    def test_memset_and_memcpy(self):
+        steps = self.run_program(["MEMSET 40 0xAA 8", "MEMCPY 38 44 6"])
+        self.assertEqual(steps, 3)  # Two instructions plus the halting zero byte
+        self.assertIsNone(self.em.error)
+        self.assertEqual(list(self.em.ram[38:50]), [0, 0, 0xAA, 0xAA, 0xAA, 0xAA, 0, 0, 0xAA, 0xAA, 0xAA, 0xAA])
+
+    def test_scratchpad_blocks_flush_once(self):
+        flushes = []
+        self.em.save_scratchpad = lambda: flushes.append(bytes(self.em.scratchpad))
+        self.em.scratchpad = bytearray(8)
+        self.run_program(["MEMSET 40 7 4", "SCRATCH_COPY_BLOCK 40 2 4", "SCRATCH_LOAD_BLOCK 0 50 8"])
+        self.assertEqual(flushes, [bytes([0, 0, 7, 7, 7, 7, 0, 0])])
+        self.assertEqual(list(self.em.ram[50:58]), [0, 0, 7, 7, 7, 7, 0, 0])
+
+    def test_range_checked_once(self):
+        self.assertFalse(parse_and_load_program(self.em, ["MEMSET 60 1 8"]))
+        self.em.load_image(bytes([self.em.MEMCPY, 0, 60, 8]))
+        self.em.running = True
+        self.em.step()
+        self.assertEqual(self.em.error, "Invalid RAM range")
+        self.assertEqual(self.em.ram[60:64], bytes(4))
+
+class TestImmediateOps(unittest.TestCase):
+    def setUp(self):
+        self.em = Emulator(None, ram_size=64)
+
+    def run_program(self, code):
+        self.assertTrue(parse_and_load_program(self.em, code), self.em.error)
+        self.em.running = True
+        steps = 0
+        while self.em.running:
+            self.em.step()
+            steps += 1
+        self.assertIsNone(self.em.error)
+        return steps
+
+    def test_immediate_alu(self):
+        self.run_program([
+            "STORE 40 200",
+            "ADDI 40 100 41",
+            "SUBI 40 0xC9 42",
+            "ANDI 40 0x0F 43",
+            "ORI 40 1 44",
+            "XORI 40 0xFF 45",
+            "SHLI 40 2 46",
+            "SHRI 40 3 47",
+        ])
+        self.assertEqual(list(self.em.ram[41:48]), [44, 255, 8, 201, 55, 32, 25])
+
+    def test_djnz_counter_loop(self):
+        steps = self.run_program([
+            "STORE 40 5",
+            "ADDI 41 2 41",  # Loop body at address 3
+            "DJNZ 40 3",
+        ])
+        self.assertEqual(self.em.ram[41], 10)
+        self.assertEqual(self.em.ram[40], 0)
+        self.assertEqual(steps, 1 + 5 * 2 + 1)
+        self.assertEqual(self.em.instructions.at(7).name, "DJNZ")
+        self.assertIn(3, self.em.instructions.reachable)
+
+class TestTiming(unittest.TestCase):
+    def run_program(self, em, code):
+        self.assertTrue(parse_and_load_program(em, code), em.error)
+        em.running = True
+        while em.running:
+            em.step()
+        self.assertIsNone(em.error)
+
+    def test_legacy_is_one_cycle_per_step(self):
+        em = Emulator(None, ram_size=64)
+        self.run_program(em, ["SET 0 0, 1 1, 2 2", "WAIT 3", "SETALL"])
+        self.assertEqual(em.cycles, 1 + 1 + 3 + 1 + 1)
+
+    def test_realistic_charges_per_pair_and_byte(self):
+        em = Emulator(None, ram_size=64, timing="realistic")
+        self.run_program(em, ["SET 0 0, 1 1, 2 2", "MEMSET 40 1 10"])
+        self.assertEqual(em.cycles, (1 + 3) + (2 + 10) + 1)
+        self.assertEqual(em.delay, 0)
+
+    def test_custom_model(self):
+        em = Emulator(None, ram_size=64, timing=TimingModel("slow", default=4))
+        self.run_program(em, ["STORE 40 1"])
+        self.assertEqual(em.cycles, 4 + 1)
+        self.assertRaises(ValueError, em.set_timing, "bogus")
+
+class TestBatchExecution(unittest.TestCase):
+    def setUp(self):
+        self.em = Emulator(None, ram_size=64)
+        parse_and_load_program(self.em, ["STORE 40 1", "ADDI 40 1 40", "JUMP 3"])
+        self.em.running = True
+
+    def test_run_batch(self):
+        self.assertEqual(self.em.run(101), 101)
+        self.assertEqual(self.em.ram[40], 51)
+        self.assertTrue(self.em.running)
+
+    def test_run_stops_at_breakpoint(self):
+        executed = self.em.run(100, breakpoints={7})
+        self.assertEqual(executed, 2)
+        self.assertEqual(self.em.breakpoint_hit, 7)
+        self.assertEqual(self.em.run(100, breakpoints={7}), 0)  # Still on it
+        self.assertEqual(self.em.run(100, breakpoints={7}, resume=True), 2)  # Continues past it
+        self.assertEqual(self.em.breakpoint_hit, 7)
+
+    def test_breakpoint_on_entry_instruction(self):
+        self.assertEqual(self.em.run(100, breakpoints={0}), 0)
+        self.assertEqual((self.em.breakpoint_hit, self.em.pc), (0, 0))
+        self.assertEqual(self.em.run(100, breakpoints={0}, resume=True), 100)
+        self.assertIsNone(self.em.breakpoint_hit)
+
+    def test_snapshots_report_dirty_ranges(self):
+        self.assertEqual(changed_ranges(b"\x00\x01\x02\x03", b"\x00\x09\x09\x03"), [(1, 3)])
+        publisher = SnapshotPublisher(self.em)
+        first = publisher.publish()
+        self.em.run(3)
+        second = publisher.publish()
+        self.assertEqual(second.seq, first.seq + 1)
+        self.assertEqual(second.dirty, [(40, 41)])
+        self.assertEqual(second.ram[40], 2)
+        self.assertEqual(first.ram[40], 0)
+        self.assertIs(publisher.latest(), second)
+        self.assertEqual(second.instruction, "ADDI 40 1 40")
+        with self.assertRaises(AttributeError):
+            second.pc = 0
+        self.assertEqual(second.reads, ((40, 41),))
+        self.assertFalse(second.reloaded)
+
+    def test_memory_accesses(self):
+        parse_and_load_program(self.em, ["MEMCPY 10 20 4", "DJNZ 30 0", "LOADMASK_RAM 40", "SCRATCH_COPY 5 1"])
+        index = self.em.instructions
+        self.assertEqual(memory_accesses(index.at(0)), [("ram", "read", 10, 14), ("ram", "write", 20, 24)])
+        self.assertEqual(memory_accesses(index.at(4)), [("ram", "read", 30, 31), ("ram", "write", 30, 31)])
+        self.assertEqual(memory_accesses(index.at(7)), [("ram", "read", 40, 42)])
+        self.assertEqual(memory_accesses(index.at(9)), [("ram", "read", 5, 6), ("scratch", "write", 1, 2)])
+
 if __name__ == '__main__':
-    unittest.main()
\ No newline at end of file
+    unittest.main()
+
+class TestBreakpoints(unittest.TestCase):
+    def setUp(self):
+        self.em = Emulator(None, ram_size=64)
+        parse_and_load_program(self.em, ["STORE 40 1", "# count up", "ADDI 40 1 40", "JUMP 3"])
+        self.em.running = True
+
+    def test_lines_resolve_to_addresses(self):
+        breakpoints = resolve_breakpoints(self.em.pc_to_line, {2, 4, 9})
+        self.assertEqual(list(breakpoints), [3, 7])  # Comment line moves to the next instruction
+        self.assertEqual(breakpoints.lines[3], 2)
+
+    def test_conditional_breakpoint(self):
+        breakpoints = resolve_breakpoints(self.em.pc_to_line, {3}, {3: "RAM[40] >= 5"})
+        self.em.run(1000, breakpoints)
+        self.assertEqual(self.em.breakpoint_hit, 3)
+        self.assertEqual(self.em.ram[40], 5)
+
+    def test_scratchpad_condition(self):
+        condition = parse_condition("S[2] == 0x10")
+        self.assertEqual((condition.space, condition.address, condition.op, condition.value), ("scratch", 2, "==", 16))
+        self.em.scratchpad[2] = 0x10
+        breakpoints = BreakpointSet()
+        breakpoints.add(7, condition)
+        self.assertEqual(self.em.run(100, breakpoints), 2)
+        with self.assertRaises(ValueError):
+            parse_condition("PC == 3")
+        with self.assertRaises(ValueError):
+            Condition("rom", 0)
+
+class TestWatchpoints(unittest.TestCase):
+    def setUp(self):
+        self.em = Emulator(None, ram_size=64)
+        parse_and_load_program(self.em, ["STORE 40 1", "ADDI 40 1 40", "SCRATCH_COPY 40 2", "JUMP 3"])
+        self.em.running = True
+        self.em.save_scratchpad = lambda: None
+
+    def test_write_watchpoint_reports_old_and_new(self):
+        watchpoints = WatchpointSet([parse_watchpoint("RAM[40]")])
+        self.em.run(100, watchpoints=watchpoints)
+        hit = self.em.watch_hit
+        self.assertEqual((hit.pc, hit.line, hit.space, hit.kind, hit.old, hit.new), (0, 1, "ram", "write", 0, 1))
+        self.em.run(100, watchpoints=watchpoints)
+        self.assertEqual((self.em.watch_hit.pc, self.em.watch_hit.old, self.em.watch_hit.new), (3, 1, 2))
+        self.assertEqual(format_watch_hit(self.em.watch_hit), "Watchpoint: RAM[40] written 1 -> 2 at PC 3 (line 2)")
+
+    def test_value_condition_and_scratch_read(self):
+        watchpoints = WatchpointSet([parse_watchpoint("RAM[38:42] == 4")])
+        self.em.run(1000, watchpoints=watchpoints)
+        self.assertEqual(self.em.watch_hit.new, 4)
+        self.assertEqual(self.em.ram[40], 4)
+        watchpoints = WatchpointSet([Watchpoint("scratch", 2, read=True, write=False)])
+        self.em.run(1000, watchpoints=watchpoints)
+        self.assertIsNone(self.em.watch_hit)  # SCRATCH_COPY only writes the scratchpad
+        watchpoints = WatchpointSet([parse_watchpoint("S[2] W")])
+        self.em.run(1000, watchpoints=watchpoints)
+        self.assertEqual((self.em.watch_hit.space, self.em.watch_hit.pc), ("scratch", 7))
+
+    def test_no_watchpoints_runs_unchanged(self):
+        self.assertEqual(self.em.run(50, watchpoints=WatchpointSet()), 50)
+        self.assertIsNone(self.em.watch_hit)
+        with self.assertRaises(ValueError):
+            parse_watchpoint("RAM[10:5]")
+
+class TestDiagnostics(unittest.TestCase):
+    def test_valid_lines(self):
+        for line in ["STORE 40 0x10", "# comment", "", "SET 0 0, 3 3", "DJNZ 3 9", "EP 10", "setall"]:
+            self.assertEqual(diagnose_line(line), [], line)
+
+    def test_spans_point_at_bad_operand(self):
+        self.assertEqual(diagnose_line("ADD 1 99 3"), [(6, 8, "Address 99 out of range")])
+        self.assertEqual(diagnose_line("SCRATCH_COPY 4 9"), [(15, 16, "Scratchpad address 9 out of range")])
+        self.assertEqual(diagnose_line("SET 0 0, 1 x"), [(9, 12, "Invalid pair '1 x'")])
+        self.assertEqual(diagnose_line("MEMCPY 60 0 8"), [(12, 13, "Block out of range")])
+        self.assertEqual(diagnose_line("JUMP 99", ram_size=128), [])
+
+    def test_matches_assembler(self):
+        for line in ["BOGUS 1", "JUMP", "SETMASK 0x10000", "LOADMASK_RAM 63", "WAIT 300", "STORE 4x 1"]:
+            self.assertTrue(diagnose_line(line), line)
+            self.assertFalse(parse_and_load_program(Emulator(None), [line]), line)
+
+    def test_byte_and_wide_modes_share_the_assembler(self):
+        for em in (Emulator(None), Emulator(None, ram_size=512)):
+            self.assertFalse(parse_and_load_program(em, ["STORE 10"]))
+            self.assertEqual(em.error, "Error on line 1: STORE needs 2 operand(s)")
+            self.assertTrue(parse_and_load_program(em, ["SETALL", "EP 20", "SETNONE"]))
+            self.assertEqual(em.pc_to_line, {0: 1, 20: 3})  # EP has no code of its own
+            self.assertEqual(em.pc, 20)
+
+class TestHeadless(unittest.TestCase):
+    def test_core_does_not_import_qt(self):
+        code = "import sys, em_cli, em_core, em_debug, em_snapshot; print('PyQt5' in sys.modules)"
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        self.assertEqual(result.stdout.strip(), "False", result.stderr)
+
+    def test_cli_runs_program(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".2b", delete=False) as f:
+            f.write("STORE 40 3\nSET 0 0, 3 3\nADDI 40 1 40\nJUMP 9\n")
+        self.addCleanup(os.remove, f.name)
+        out = io.StringIO()
+        self.assertEqual(em_cli.main([f.name, "--break", "3:RAM[40]==5"], out=out), 0)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0], "Breakpoint at line 3 (PC 9)")
+        self.assertEqual(lines[2:], ["#...", "....", "....", "...#"])
+
+class TestHeatmap(unittest.TestCase):
+    def setUp(self):
+        self.em = Emulator(None, ram_size=64)
+        parse_and_load_program(self.em, ["STORE 40 1", "ADDI 40 1 40", "SCRATCH_COPY 40 2", "JUMP 3"])
+        self.em.running = True
+        self.em.save_scratchpad = lambda: None
+
+    def test_counts_reads_and_writes(self):
+        self.assertIsNone(self.em.heatmap)
+        self.em.enable_heatmap()
+        self.em.run(10)  # STORE, then three times ADDI/SCRATCH_COPY/JUMP
+        counters = self.em.heatmap
+        self.assertEqual((counters.ram_reads[40], counters.ram_writes[40]), (6, 4))
+        self.assertEqual(counters.scratch_writes[2], 3)
+        self.assertEqual(counters.ram_reads.typecode, "Q")
+        buffer = io.StringIO()
+        counters.write_csv(buffer)
+        self.assertIn("ram,40,6,4", buffer.getvalue().splitlines())
+        totals = counters.totals()
+        self.assertIs(counters.totals(), totals)  # Not copied again while nothing was accessed
+        self.em.run(3)
+        self.assertEqual((totals[0][40], counters.totals()[0][40]), (6, 8))
+        self.em.reset()
+        self.assertEqual(max(counters.ram_writes), 0)
+        self.assertEqual(max(counters.totals()[1]), 0)
+
+    def test_heat_decays(self):
+        heat = HeatDecay(2, decay=0.5)
+        heat.update([0, 0])
+        self.assertEqual(heat.update([100, 0]), [0])
+        hot = heat.level[0]
+        for _ in range(20):
+            heat.update([100, 0])
+        self.assertLess(heat.level[0], hot)
+        self.assertEqual(heat.level[0], 0)
+
+class TestDisplayRecorder(unittest.TestCase):
+    def setUp(self):
+        self.em = Emulator(None)
+        parse_and_load_program(self.em, ["LOADMASK 0x8421", "WAIT 30", "SETALL", "SETALL", "WAIT 5", "LOOP"])
+        self.recorder = DisplayRecorder.attach(self.em)
+        self.em.running = True
+
+    def test_timeline_deduplicates_frames(self):
+        self.em.run(100)
+        self.recorder.finish()
+        timeline = self.recorder.timeline()
+        self.assertEqual([frame for frame, _ in timeline[:4]], [0, 0x8421, 0xFFFF, 0x8421])
+        self.assertEqual(sum(cycles for _, cycles in timeline), 100)
+        self.assertEqual(timeline[1][1], 32)  # LOADMASK's cycle, WAIT's own cycle and its 30-cycle delay
+
+    def test_encoders(self):
+        self.em.run(100)
+        timeline = self.recorder.timeline()
+        self.assertEqual(decode_frame_stream(encode_frame_stream(timeline)), (4, 4, 120, timeline))
+        large = [(1 << 65535, 3), (1, 9)]  # Largest display: 256x256
+        self.assertEqual(decode_frame_stream(encode_frame_stream(large, 256, 256, 60)), (256, 256, 60, large))
+        gif = encode_gif(timeline, scale=2)
+        self.assertTrue(gif.startswith(b"GIF89a") and gif.endswith(b"\x3b"))
+        apng = encode_apng(timeline, scale=2)
+        self.assertEqual(apng[:8], b"\x89PNG\r\n\x1a\n")
+        self.assertEqual(apng.count(b"fcTL"), len(timeline))
+
+    def decode_gif(self, gif):
+        """Pixels of each image in a GIF from encode_gif, read with a plain LZW decoder"""
+        images = []
+        pos = 13 + 6  # Header, screen descriptor and 2-colour global table
+        while gif[pos] != 0x3b:
+            image = gif[pos] == 0x2c
+            pos += 11 if image else 2  # Image descriptor and LZW code size, or extension label
+            min_code_size = gif[pos - 1]
+            data = bytearray()
+            while gif[pos]:
+                data += gif[pos + 1:pos + 1 + gif[pos]]
+                pos += 1 + gif[pos]
+            pos += 1
+            if image:
+                images.append(self.lzw_decode(data, min_code_size))
+        return images
+
+    def lzw_decode(self, data, min_code_size):
+        clear, end = 1 << min_code_size, (1 << min_code_size) + 1
+        bits = int.from_bytes(data, "little")
+        pos = 0
+        pixels = []
+        code = clear
+        while True:
+            if code == clear:
+                table = [[i] for i in range(clear)] + [None, None]
+                code_size = min_code_size + 1
+                prev = None
+            self.assertLessEqual(pos + code_size, len(data) * 8, "LZW data ended before END")
+            code = (bits >> pos) & ((1 << code_size) - 1)
+            pos += code_size
+            if code == end:
+                return pixels
+            if code == clear:
+                continue
+            if prev is None:
+                entry = table[code]
+            else:
+                entry = table[code] if code < len(table) else table[prev] + table[prev][:1]
+                if len(table) < 4096:
+                    table.append(table[prev] + entry[:1])
+                if len(table) == 1 << code_size and code_size < 12:
+                    code_size += 1
+            pixels += entry
+            prev = code
+
+    def test_gif_images_decode(self):
+        rng = random.Random(7)
+        for width, height, scale in [(2, 2, 4), (3, 2, 2), (4, 4, 32), (16, 16, 8), (1, 1, 1)]:
+            frames = [rng.getrandbits(width * height) for _ in range(8)] + [0, (1 << width * height) - 1]
+            timeline = [(frame, 5) for frame in frames]
+            images = self.decode_gif(encode_gif(timeline, width, height, scale=scale))
+            self.assertEqual(len(images), len(frames))
+            for frame, pixels in zip(frames, images):
+                expected = [frame >> (y // scale * width + x // scale) & 1
+                            for y in range(height * scale) for x in range(width * scale)]
+                self.assertEqual(pixels, expected, (width, height, scale, frame))
+
+class TestDisplayGeometry(unittest.TestCase):
+    def test_row_operations(self):
+        geometry = get_geometry("8x8")
+        self.assertEqual((geometry.width, geometry.height, geometry.full), (8, 8, (1 << 64) - 1))
+        frame = 0b10000001 << 16
+        self.assertEqual(geometry.rows(frame)[2], 0b10000001)
+        self.assertEqual(geometry.row(frame | geometry.bit(1, 2), 2), 0b10000011)
+        self.assertEqual(DisplayGeometry(3, 2).render_text(0b100001), ["#..", "..#"])
+        with self.assertRaises(ValueError):
+            get_geometry("8by8")
+
+    def test_larger_display(self):
+        em = Emulator(RecordingDisplay(), geometry="16x16")
+        self.assertTrue(parse_and_load_program(em, ["SET 15 15, 0 8", "SETALL"]))
+        em.running = True
+        em.step()
+        self.assertEqual(em.framebuffer, em.geometry.bit(15, 15) | em.geometry.bit(0, 8))
+        em.step()
+        self.assertEqual(em.framebuffer, (1 << 256) - 1)
+
+    def test_masks_need_sixteen_pixels(self):
+        self.assertEqual(diagnose_line("SETMASK 0x1", geometry="8x8"),
+                         [(0, 7, "SETMASK needs a display of at most 16 pixels, not 8x8")])
+        self.assertEqual(diagnose_line("LOADMASK_RAM 4", geometry="2x8"), [])
+        em = Emulator(None, geometry="8x8")
+        self.assertFalse(parse_and_load_program(em, ["TOGGLEMASK 0x1"]))
+        self.assertTrue(em.load_image(bytes([em.SETALL, em.CLEARMASK, 0xFF, 0xFF])))
+        em.running = True
+        em.run(2)
+        self.assertEqual((em.running, em.pc, em.error), (False, 1, "Pixel masks need a display of at most 16 pixels"))
+        self.assertEqual(em.framebuffer, em.geometry.full)
+
+    def test_coordinates_validated_against_size(self):
+        em = Emulator(None)
+        self.assertFalse(parse_and_load_program(em, ["SET 4 0"]))
+        self.assertEqual(em.error, "Error on line 1: Coordinates (4, 0) outside the 4x4 display")
+        self.assertTrue(parse_and_load_program(Emulator(None, geometry="8x8"), ["CLEAR 4 0"]))
+        self.assertEqual(diagnose_line("SET 1 1, 5 0"), [(9, 12, "Coordinates (5, 0) outside the 4x4 display")])
+        self.assertEqual(diagnose_line("SET 5 0", geometry="8x8"), [])
+class TestWideAddressMode(unittest.TestCase):
+    def setUp(self):
+        self.em = Emulator(None, ram_size=8192, timing="realistic")
+        self.em.save_scratchpad = lambda: None
+
+    def test_mode_selection(self):
+        self.assertFalse(Emulator(None, ram_size=256).wide)
+        self.assertTrue(self.em.wide)
+        self.assertTrue(Emulator(None, ram_size=64, wide=True).wide)
+        with self.assertRaises(ValueError):
+            Emulator(None, ram_size=512, wide=False)
+        with self.assertRaises(ValueError):
+            Emulator(None, ram_size=0x10001)
+
+    def test_encoding(self):
+        self.assertTrue(parse_and_load_program(self.em, ["STORE 4000 3", "ADD 4000 300 5000", "SET 1 2"]))
+        self.assertEqual(bytes(self.em.ram[:4]), bytes([self.em.STORE, 0xA0, 0x0F, 3]))
+        self.assertEqual(bytes(self.em.ram[4:11]), bytes([self.em.ADD, 0xA0, 0x0F, 0x2C, 0x01, 0x88, 0x13]))
+        self.assertEqual(bytes(self.em.ram[11:15]), bytes([self.em.SET, 1, 1, 2]))
+        self.assertEqual(self.em.pc_to_line, {0: 1, 4: 2, 11: 3})
+        self.assertEqual([(i.address, i.operands) for i in self.em.instructions][:2],
+                         [(0, (4000, 3)), (4, (4000, 300, 5000))])
+        self.assertEqual((encoded_length("STORE", wide=True), encoded_length("STORE")), (4, 3))
+        self.assertFalse(parse_and_load_program(self.em, ["JUMP 8192"]))
+        self.assertEqual(self.em.error, "Error on line 1: Address 8192 out of range")
+
+    def test_execution_beyond_256_bytes(self):
+        code = [
+            "STORE 4000 3",
+            "MEMSET 5000 7 4",
+            "MEMCPY 5000 6000 4",
+            "ADDI 6001 1 6001",
+            "SCRATCH_COPY 6001 2",
+            "DJNZ 4000 9",
+        ]
+        self.assertTrue(parse_and_load_program(self.em, code))
+        self.em.running = True
+        self.em.run(1000)
+        self.assertIsNone(self.em.error)
+        self.assertEqual(self.em.ram[4000], 0)
+        self.assertEqual(bytes(self.em.ram[6000:6004]), bytes([7, 8, 7, 7]))
+        self.assertEqual(self.em.scratchpad[2], 8)
+        # Realistic timing reads the block count from the last operand (pc + 5 for wide MEMCPY)
+        self.assertEqual(self.em.timing.cost(self.em.ram, 9, self.em.MEMCPY, wide=True), 2 + 4)
+
+    def test_watchpoints_decode_wide_operands(self):
+        self.assertTrue(parse_and_load_program(self.em, ["STORE 4000 1", "STORE 300 2"]))
+        self.em.running = True
+        self.em.run(10, watchpoints=WatchpointSet([parse_watchpoint("RAM[300]")]))
+        self.assertEqual((self.em.watch_hit.address, self.em.watch_hit.new), (300, 2))
+class TestMachine(unittest.TestCase):
+    def make_machine(self, **options):
+        machine = Machine(**options)
+        machine.saves = 0
+        def save():
+            machine.saves += 1
+        machine.save_scratchpad = save
+        return machine
+
+    def test_shared_scratchpad_and_display(self):
+        machine = self.make_machine(cores=2)
+        machine.scratchpad[0] = 0
+        self.assertTrue(machine.load(0, ["WAIT 10", "SCRATCH_STORE 0 1", "LOADMASK 0x0001"]))
+        self.assertTrue(machine.load(1, ["SCRATCH_JUMPIF 5 0", "JUMP 0", "SETMASK 0x0002"]))
+        self.assertIs(machine.cores[0].scratchpad, machine.cores[1].scratchpad)
+        machine.run(100)
+        self.assertFalse(machine.running)
+        self.assertIsNone(machine.error)
+        # Core 1 ORed its mask into the frame core 0 presented
+        self.assertEqual(machine.framebuffer, 0b11)
+        self.assertEqual([core.framebuffer for core in machine.cores], [0b11, 0b11])
+
+    def test_deterministic_schedule(self):
+        program = ["STORE 20 3", "SCRATCH_ADD 0 1 0", "TOGGLEMASK 0x0001", "DJNZ 20 3"]
+        timelines = []
+        for _ in range(2):
+            machine = self.make_machine(cores=3)
+            machine.scratchpad[:] = bytes([0, 1, 0, 0, 0, 0, 0, 0])
+            recorder = DisplayRecorder.attach(machine)
+            for index in range(3):
+                machine.load(index, program)
+            machine.run(50)
+            timelines.append((recorder.timeline(), bytes(machine.scratchpad)))
+        self.assertEqual(timelines[0], timelines[1])
+        self.assertEqual(timelines[0][1][0], 9)  # Three cores added 1 three times each
+
+    def test_batches_flush_scratchpad_at_sync_points(self):
+        machine = self.make_machine(cores=2, quantum=25)
+        for index in range(2):
+            machine.load(index, [f"SCRATCH_STORE {index} 7", "LOOP"])
+        self.assertEqual(machine.run(100), 100)
+        self.assertEqual(machine.scratchpad[:2], bytearray([7, 7]))
+        self.assertEqual(machine.saves, 4)  # One write-back per batch, not per SCRATCH_STORE
+        self.assertEqual([core.cycles for core in machine.cores], [100, 100])
+class TestAsyncRunner(unittest.TestCase):
+    PROGRAM = ["SETALL", "WAIT 200", "STORE 20 3", "SETNONE", "DJNZ 20 6"]
+
+    def make_emulator(self, timing="realistic"):
+        em = Emulator(RecordingDisplay(), timing=timing)
+        self.assertTrue(parse_and_load_program(em, self.PROGRAM))
+        em.running = True
+        return em
+
+    def test_matches_synchronous_run(self):
+        reference = self.make_emulator()
+        reference.run(10000)
+        em = self.make_emulator()
+        runner = AsyncRunner(em, realtime=False, batch=7)
+
+        async def main():
+            frames, events = runner.frames(), runner.events()
+            cycles = await runner.run()
+            return cycles, [event async for event in frames], [event async for event in events]
+
+        cycles, frames, events = asyncio.run(main())
+        self.assertEqual((cycles, em.pc, bytes(em.ram)), (reference.cycles, reference.pc, bytes(reference.ram)))
+        self.assertEqual(frames[0], FrameEvent(1, 0xFFFF))
+        self.assertEqual([frame.frame for frame in frames], [0xFFFF, 0, 0, 0])  # SETNONE presents on every pass
+        self.assertEqual(events, [RunnerEvent("halted", em.cycles, em.pc, None)])
+        self.assertEqual(em.display.target.frames, [0, 0xFFFF, 0, 0, 0])  # Still forwarded (after the load's clear)
+
+    def test_realtime_awaits_wait(self):
+        em = Emulator(None)
+        parse_and_load_program(em, ["WAIT 100", "WAIT 100"])
+        em.running = True
+        runner = AsyncRunner(em, hz=2000)
+
+        async def main():
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            await runner.run()
+            return loop.time() - start
+
+        self.assertGreaterEqual(asyncio.run(main()), 0.09)  # 200 cycles at 2 kHz
+
+    def test_hook_stop_ends_run(self):
+        em = self.make_emulator()
+        em.add_hook(lambda kind, events: True, [PIXELS], batch=1)
+        runner = AsyncRunner(em, realtime=False, batch=1000)
+        cycles = asyncio.run(runner.run())
+        self.assertEqual(runner.finished.kind, "stopped")
+        self.assertTrue(em.running)
+        self.assertEqual((cycles, em.pc, em.framebuffer), (em.cycles, 1, 0xFFFF))
+
+    def test_many_programs_on_one_loop(self):
+        emulators = []
+        for index in range(200):
+            em = Emulator(None)
+            parse_and_load_program(em, [f"STORE 30 {index % 50 + 1}", "WAIT 3", "DJNZ 30 3", "STORE 31 9", "JUMP 60"])
+            em.running = True
+            emulators.append(em)
+        runners = [AsyncRunner(em, realtime=False, batch=5) for em in emulators]
+
+        async def main():
+            await asyncio.gather(*(runner.run() for runner in runners))
+
+        asyncio.run(main())
+        self.assertTrue(all(em.ram[31] == 9 for em in emulators))
+        self.assertTrue(all(runner.finished.kind == "halted" and runner.finished.pc == 60 for runner in runners))
+
+class TestEmulationServer(unittest.TestCase):
+    async def talk(self, reader, writer, requests, until):
+        """Send request lines, then collect replies until until(reply) is true"""
+        for request in requests:
+            writer.write(json.dumps(request).encode() + b"\n")
+        await writer.drain()
+        replies = []
+        while not replies or not until(replies[-1]):
+            replies.append(json.loads(await asyncio.wait_for(reader.readline(), 10)))
+        return replies
+
+    def test_frame_deltas_over_tcp(self):
+        async def main():
+            server = EmulationServer()
+            listener = await server.start(port=0)
+            reader, writer = await asyncio.open_connection("127.0.0.1", listener.sockets[0].getsockname()[1])
+            replies = await self.talk(reader, writer, [
+                {"op": "submit", "source": "SETALL\nWAIT 30\nSETNONE\nWAIT 30\nSET 1 1", "hz": 1000, "watch": True},
+            ], lambda reply: reply["event"] == "done")
+            writer.close()
+            await server.close()
+            return replies
+
+        replies = asyncio.run(main())
+        self.assertEqual(replies[0], {"event": "accepted", "job": 1})
+        frames = []
+        for reply in replies[1:-1]:
+            frame = int(reply["frame"], 16) if "frame" in reply else frames[-1] ^ int(reply["xor"], 16)
+            frames.append(frame)
+        self.assertEqual(frames[-3:], [0xFFFF, 0, 1 << 5])  # The first may already be SETALL's
+        done = replies[-1]
+        self.assertEqual((done["state"], done["frame"], done["error"]), ("halted", hex(1 << 5), None))
+
+    def test_batch_sets_frame_granularity(self):
+        async def main(batch):
+            server = EmulationServer()
+            listener = await server.start(port=0)
+            reader, writer = await asyncio.open_connection("127.0.0.1", listener.sockets[0].getsockname()[1])
+            replies = await self.talk(reader, writer, [
+                {"op": "submit", "source": "SETALL\nSETNONE\nSET 1 1\nSETNONE", "realtime": False,
+                 "batch": batch, "watch": True},
+            ], lambda reply: reply["event"] in ("done", "error"))
+            writer.close()
+            await server.close()
+            return replies
+
+        frames = [reply for reply in asyncio.run(main(None)) if reply["event"] == "frame"]
+        self.assertEqual(len(frames), 1)  # One batch: only the frame it ends with
+        frames = [reply for reply in asyncio.run(main(1)) if reply["event"] == "frame"]
+        self.assertEqual([reply["cycle"] for reply in frames], [1, 2, 3, 4])
+        self.assertEqual([reply.get("xor") for reply in frames[1:]], [hex(0xFFFF), hex(1 << 5), hex(1 << 5)])
+        self.assertEqual(asyncio.run(main(0))[0], {"event": "error", "message": "batch must be positive: 0"})
+
+    def test_budgets_cancel_and_errors_over_unix_socket(self):
+        path = os.path.join(tempfile.mkdtemp(), "fm.sock")
+
+        async def main():
+            server = EmulationServer()
+            await server.start(unix=path)
+            reader, writer = await asyncio.open_unix_connection(path)
+            replies = await self.talk(reader, writer, [
+                {"op": "submit", "source": "BOGUS"},
+                {"op": "submit", "source": "ADDI 30 1 30\nLOOP", "cycles": 500, "realtime": False, "watch": True},
+            ], lambda reply: reply["event"] == "done")
+            replies += await self.talk(reader, writer, [
+                {"op": "submit", "image": "311e011e04", "realtime": False, "scratchpad": "07"},
+                {"op": "cancel", "job": 2},
+                {"op": "subscribe", "job": 2},
+            ], lambda reply: reply["event"] == "done")
+            writer.close()
+            await server.close()
+            return replies
+
+        replies = asyncio.run(main())
+        self.assertEqual(replies[0]["event"], "error")
+        budget = next(reply for reply in replies if reply["event"] == "done")
+        self.assertEqual((budget["state"], budget["cycles"]), ("budget", 500))
+        self.assertEqual(bytes.fromhex(budget["ram"])[30], 250)
+        cancelled = replies[-1]
+        self.assertEqual((cancelled["job"], cancelled["state"], cancelled["scratchpad"]), (2, "cancelled", "0700000000000000"))
+
+    def test_cancel_queued_job_without_a_free_worker(self):
+        async def main():
+            server = EmulationServer(workers=1)
+            listener = await server.start(port=0)
+            reader, writer = await asyncio.open_connection("127.0.0.1", listener.sockets[0].getsockname()[1])
+            replies = await self.talk(reader, writer, [
+                {"op": "submit", "source": "LOOP", "realtime": False},
+                {"op": "submit", "source": "LOOP", "realtime": False, "watch": True},
+                {"op": "cancel", "job": 2},
+            ], lambda reply: reply["event"] == "done")
+            replies += await self.talk(reader, writer, [{"op": "jobs"}], lambda reply: reply["event"] == "jobs")
+            writer.close()
+            await server.close()
+            return replies
+
+        replies = asyncio.run(main())
+        done = next(reply for reply in replies if reply["event"] == "done")
+        self.assertEqual((done["job"], done["state"], done["cycles"]), (2, "cancelled", 0))
+        self.assertEqual([job["state"] for job in replies[-1]["jobs"]], ["running", "cancelled"])
+
+    def test_invalid_submissions_and_runner_failure(self):
+        async def main():
+            server = EmulationServer(workers=1)
+            for bad in ({"hz": 0}, {"hz": -5}, {"cycles": -1}, {"seconds": -1}, {"ram": 0}, {"ram": 70000}):
+                with self.assertRaises(ValueError):
+                    server.submit(dict(bad, source="SETALL"))
+            job = server.submit({"source": "SETALL\nLOOP", "realtime": False})
+            async def explode(cycles=None):
+                raise RuntimeError("boom")
+            job.runner.run = explode
+            await asyncio.gather(*server.tasks)
+            await server.close()
+            return server, job
+
+        server, job = asyncio.run(main())
+        self.assertEqual(list(server.jobs), [job.id])
+        self.assertEqual((job.state, job.result["state"], job.result["error"]), ("error", "error", "RuntimeError: boom"))
+        self.assertEqual(len(server.pool.free), 1)  # Released once, after the result was copied out
+
+    def test_worker_pool_and_time_budget(self):
+        async def main():
+            server = EmulationServer(workers=1)
+            first = server.submit({"source": "LOOP", "seconds": 0.1})
+            second = server.submit({"source": "SETALL", "realtime": False})
+            await asyncio.sleep(0.05)
+            states = (first.state, second.state)
+            await asyncio.gather(*server.tasks)
+            return states, first.result, second.result
+
+        states, first, second = asyncio.run(main())
+        self.assertEqual(states, ("running", "queued"))
+        self.assertEqual((first["state"], second["state"]), ("timeout", "halted"))
+
+class TestEmulatorPool(unittest.TestCase):
+    def test_reset_and_resize_in_place(self):
+        em = Emulator(None, scratchpad=bytearray(b"\x05" * 8))
+        em.save_scratchpad = lambda: None
+        em.enable_heatmap()
+        ram = em.ram
+        parse_and_load_program(em, ["STORE 40 9", "SCRATCH_STORE 1 3"])
+        em.running = True
+        em.run(10)
+        em.reset()
+        self.assertIs(em.ram, ram)
+        self.assertEqual(bytes(em.ram), bytes(64))
+        em.resize(4096, "8x8")
+        self.assertIs(em.ram, ram)
+        self.assertEqual((len(em.ram), em.wide, em.geometry.width, len(em.heatmap.ram_reads)), (4096, True, 8, 4096))
+        self.assertEqual(em.scratchpad[:2], b"\x05\x03")  # Kept in memory
+        em.resize(32)
+        self.assertEqual((len(em.ram), em.wide), (32, False))
+        self.assertRaises(ValueError, em.resize, 4096, None, False)
+
+    def test_acquire_reuses_and_resizes(self):
+        pool = EmulatorPool(size=1)
+        em = pool.acquire(scratchpad=b"\x07")
+        self.assertEqual(bytes(em.scratchpad), b"\x07" + bytes(7))
+        parse_and_load_program(em, ["SCRATCH_STORE 0 9", "SETALL"])
+        em.running = True
+        em.run(10)
+        pool.release(em)
+        again = pool.acquire(ram_size=1024, geometry="8x8")
+        self.assertIs(again, em)
+        self.assertEqual((again.ram_size, again.wide, again.geometry.width, again.cycles), (1024, True, 8, 0))
+        self.assertEqual((bytes(again.scratchpad), again.framebuffer, again.running), (bytes(8), 0, False))
+        self.assertIsNot(pool.acquire(), em)  # Pool empty: a new instance
+        self.assertRaises(ValueError, pool.acquire, ram_size=1 << 20)
+
+    def test_release_detaches_run_state(self):
+        pool = EmulatorPool(size=1)
+        em = pool.acquire()
+        em.enable_fusion()
+        em.enable_heatmap()
+        em.metrics = Metrics()
+        em.add_hook(lambda kind, events: True, [INSTRUCTION], batch=1)
+        parse_and_load_program(em, ["EP 2", "WAIT 50"])
+        em.running = True
+        em.run(10)
+        self.assertTrue(em.hook_stop and em.active_delay)
+        pool.release(em)
+        again = pool.acquire()
+        self.assertIs(again, em)
+        self.assertEqual((again.fusion, again.heatmap, again.hooks, again.metrics), (None, None, None, None))
+        self.assertEqual((again.entry_point, again.pc, again.delay, again.active_delay, again.hook_stop), (0, 0, 0, 0, False))
+
+    def test_lease_returns_instance(self):
+        pool = EmulatorPool(size=1)
+        with pool.lease(timing="realistic") as em:
+            self.assertEqual(pool.free, [])
+            self.assertEqual(em.timing.name, "realistic")
+        self.assertEqual(pool.free, [em])
+
+class TestDifferentialFuzzer(unittest.TestCase):
+    def test_engines_agree(self):
+        report = em_fuzz.fuzz(cases=300, workers=1, seed=1)
+        self.assertEqual(report.cases, 300)
+        self.assertGreater(report.steps, 10000)
+        self.assertEqual([em_fuzz.describe(divergence) for divergence in report.divergences], [])
+
+    def test_planted_bug_is_found_and_shrunk(self):
+        def forgets_active_delay(em, cycles):
+            end = em.cycles + cycles
+            while em.running and em.cycles < end:
+                if em.delay:
+                    skipped = min(em.delay, end - em.cycles)
+                    em.delay -= skipped
+                    em.cycles += skipped
+                else:
+                    em.step_function(em)
+
+        em_fuzz.register_engine("broken", forgets_active_delay)
+        try:
+            report = em_fuzz.fuzz(cases=200, workers=1, engines=["broken"], max_divergences=1)
+        finally:
+            del em_fuzz.ENGINES["broken"]
+        divergence, = report.divergences
+        self.assertEqual(divergence.engine, "broken")
+        self.assertIn("active_delay", divergence.fields)
+        self.assertEqual(em_fuzz.render(divergence.case.program)[0].split()[0], "WAIT")
+        self.assertEqual(len(divergence.case.program), 1)
+
+    def test_encodings_and_source_round_trip(self):
+        program = ((Emulator.JUMP, (em_fuzz.Label(1),)), (Emulator.STORE, (150, 9)))
+        self.assertEqual(em_fuzz.encode(program), (bytes([0x07, 2, 0x05, 150, 9]), [0, 2, 5]))
+        self.assertEqual(em_fuzz.encode(program, wide=True), (bytes([0x07, 3, 0, 0x05, 150, 0, 9]), [0, 3, 7]))
+        self.assertEqual(em_fuzz.render(program), ["JUMP 2", "STORE 150 9"])
+        divergences, _ = em_fuzz.check(em_fuzz.Case(0, program, None, em_fuzz.RAM_SIZE, "realistic", bytes(8)))
+        self.assertEqual(divergences, [])
+
+class TestFusion(unittest.TestCase):
+    PAIRS = ["STORE 40 5", "STORE 41 1", "SUB 40 41 40", "JUMPIF 3 40",
+             "CLEAR 0 0", "SET 0 0, 1 1", "WAIT 2", "LOOP"]
+
+    def make_emulator(self, code, timing="legacy", fused=False):
+        em = Emulator(RecordingDisplay(), timing=timing, scratchpad=bytearray(8))
+        self.assertTrue(parse_and_load_program(em, code))
+        em.running = True
+        if fused:
+            em.enable_fusion()
+        return em
+
+    def state(self, em):
+        return (em.pc, em.cycles, em.busy, em.delay, em.active_delay, em.running, em.error,
+                bytes(em.ram), em.display.frames)
+
+    def test_matches_stepping(self):
+        for timing in ("legacy", "realistic"):
+            reference = self.make_emulator(self.PAIRS, timing)
+            fused = self.make_emulator(self.PAIRS, timing, fused=True)
+            for batch in (1, 2, 3, 5, 7, 11, 13) * 20:
+                reference.run(batch)  # Plain loop: one step() per cycle
+                self.assertEqual(fused.run(batch), batch)
+                self.assertEqual(self.state(fused), self.state(reference))
+            self.assertEqual(len(fused.fusion.table), 4)
+            self.assertEqual(fused.fusion.defused, 0)
+
+    def test_defuses_overwritten_pair(self):
+        # The third STORE turns the second instruction of the STORE/STORE pairs at 0 and 3 into SETALL
+        code = ["STORE 40 1", "STORE 41 2", "STORE 3 16", "LOOP"]
+        reference = self.make_emulator(code)
+        fused = self.make_emulator(code, fused=True)
+        reference.run(40)
+        fused.run(40)
+        self.assertEqual(self.state(fused), self.state(reference))
+        self.assertEqual(fused.framebuffer, fused.geometry.full)
+        self.assertEqual((fused.fusion.defused, fused.fusion.table), (2, {}))
+
+    def test_pair_statistics(self):
+        with open("em_examples.2b") as f:
+            programs = split_programs(f.read())
+        pairs, executed = corpus_statistics(programs, cycles=1000)
+        self.assertEqual(len(programs), 3)
+        (first, second), count = pairs.most_common(1)[0]
+        self.assertIn((first, second), FUSED_PAIRS)  # SET/WAIT in the blink example
+        self.assertGreater(count, 10)
+        self.assertLess(sum(pairs.values()), executed)  # Jumps do not start a fall-through pair
+
+class TestExecutionHooks(unittest.TestCase):
+    CODE = ["STORE 40 3", "SCRATCH_STORE 1 7", "SET 0 0", "SUBI 40 1 40", "JUMPIF 6 40", "CLEAR 0 0"]
+
+    def make_emulator(self, code=CODE):
+        em = Emulator(RecordingDisplay(), scratchpad=bytearray(8))
+        self.assertTrue(parse_and_load_program(em, code))
+        em.running = True
+        return em
+
+    def test_batched_events(self):
+        reference = self.make_emulator()
+        reference.run(100)
+        em = self.make_emulator()
+        batches = []
+        em.add_hook(lambda kind, events: batches.append((kind, list(events))), batch=8)
+        self.assertEqual(em.run(100), reference.cycles)
+        self.assertEqual((bytes(em.ram), em.scratchpad, em.display.frames),
+                         (bytes(reference.ram), reference.scratchpad, reference.display.frames))
+        events = {}
+        for kind, batch in batches:
+            events.setdefault(kind, []).extend(batch)
+        self.assertEqual(len(events[INSTRUCTION]), 13)  # 2 + three passes of SET/SUBI/JUMPIF + CLEAR + HALT
+        self.assertEqual(events[INSTRUCTION][:2], [InstructionEvent(0, 0, em.STORE), InstructionEvent(1, 3, em.SCRATCH_STORE)])
+        self.assertEqual([(e.address, e.old, e.new) for e in events[RAM_WRITE]],
+                         [(40, 0, 3), (40, 3, 2), (40, 2, 1), (40, 1, 0)])
+        self.assertEqual(events[SCRATCH_WRITE], [WriteEvent(1, 3, 1, 0, 7)])
+        self.assertEqual(events[PIXELS], [PixelEvent(2, 6, 0, 1), PixelEvent(11, 17, 1, 0)])
+        self.assertEqual(events[HALT], [StopEvent(12, 21, None)])
+        self.assertLess(len(batches), 13 + 4 + 1 + 2 + 1)  # Fewer calls than events
+
+    def test_hook_watchpoint_and_error(self):
+        em = self.make_emulator(["STORE 40 3", "SUBI 40 1 40", "JUMPIF 3 40", "JUMP 0"])
+        hits = []
+        def watch(kind, events):
+            hits.extend(event for event in events if event.address == 40 and event.new == 1)
+            return bool(hits)
+        em.add_hook(watch, [RAM_WRITE], batch=1)
+        em.run(100)
+        self.assertEqual((len(hits), em.ram[40], em.pc, em.running), (1, 1, 7, True))  # Right after the SUBI
+
+        em.remove_hook(watch)
+        em.ram[11] = 200  # Patch the JUMP target out of range
+        self.assertIsNone(em.hooks)
+        stops = []
+        em.add_hook(lambda kind, events: stops.extend((kind, event) for event in events), [HALT, ERROR])
+        em.run(100)
+        self.assertEqual(stops, [(ERROR, StopEvent(7, 10, "Invalid jump address: 200"))])
+
+    def test_profile_and_single_steps(self):
+        em = self.make_emulator()
+        profile = em.add_hook(InstructionProfile(), [INSTRUCTION])
+        for _ in range(5):
+            em.step()  # Each step is delivered, not only whole runs
+        self.assertEqual(profile.counts, {0: 1, 3: 1, 6: 1, 10: 1, 14: 1})
+        em.run(100)
+        self.assertEqual(profile.counts[10], 3)
+        self.assertEqual(profile.lines(em.pc_to_line)[em.pc_to_line[10]], 3)
+        self.assertEqual(profile.uncovered(em.instructions), [])
+        self.assertEqual(EmulatorPool(1).acquire().hooks, None)
+
+class TestRuntimeMetrics(unittest.TestCase):
+    def test_exposition_and_hud(self):
+        metrics = Metrics()
+        before = metrics.sample()._replace(time=0.0)
+        metrics.batch(100, 0.0002, lag=-3)  # Ahead of the clock counts as no lag
+        metrics.batch(20, 0.004, lag=7)
+        metrics.frames.inc(30)
+        values = metrics.values()
+        self.assertEqual(values["forgematrix_cycles_total"], 120)
+        self.assertEqual(values["forgematrix_cycle_lag"], 7)
+        self.assertEqual(values['forgematrix_batch_seconds_bucket{le="0.00025"}'], 1)
+        self.assertEqual(values['forgematrix_batch_seconds_bucket{le="0.005"}'], 2)
+        self.assertEqual(values['forgematrix_batch_seconds_bucket{le="+Inf"}'], 2)
+        self.assertEqual(values["forgematrix_batch_seconds_count"], 2)
+        text = metrics.render()
+        self.assertIn("# TYPE forgematrix_batch_seconds histogram\n", text)
+        self.assertIn("\nforgematrix_frames_painted_total 30\n", text)
+        hud = format_hud(before, metrics.sample()._replace(time=2.0))
+        self.assertEqual(hud[0].split(), ["steps/s", "60"])
+        self.assertEqual(hud[2].split(), ["batch", "2.100", "ms"])
+        self.assertEqual(hud[3].split(), ["paint", "15.0", "fps"])
+
+    def test_runner_and_scratchpad_flushes(self):
+        em = Emulator(RecordingDisplay(), scratchpad=bytearray(8))
+        parse_and_load_program(em, ["SCRATCH_STORE 1 2", "WAIT 5", "LOOP"])
+        em.running = True
+        metrics = Metrics()
+        em.metrics = metrics
+        runner = AsyncRunner(em, realtime=False, batch=10, metrics=metrics)
+        self.assertEqual(asyncio.run(runner.run(100)), 100)
+        self.assertEqual(metrics.cycles.value, 100)
+        self.assertEqual(metrics.batch_seconds.count, 10)
+        self.assertEqual(metrics.lag.value, 0)
+        self.assertEqual(metrics.scratchpad_flushes.value, 100 // 8 + 1)  # One per pass of the 8-cycle loop
+
+    def test_endpoint_and_file(self):
+        import urllib.request
+        metrics = Metrics()
+        metrics.cycles.inc(42)
+        server = serve_metrics(metrics, port=0)
+        try:
+            url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+            with urllib.request.urlopen(url, timeout=5) as response:
+                self.assertIn("forgematrix_cycles_total 42", response.read().decode())
+        finally:
+            server.shutdown()
+            server.server_close()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "forgematrix.prom")
+            writer = MetricsFile(metrics, path, interval=60).start()
+            metrics.cycles.inc(8)
+            writer.stop()  # Writes the final values
+            with open(path) as f:
+                self.assertIn("forgematrix_cycles_total 50\n", f.read())
+            self.assertEqual(os.listdir(directory), ["forgematrix.prom"])
+            errors = []
+            writer = MetricsFile(metrics, os.path.join(directory, "missing", "x.prom"), 60, errors.append).start()
+            with self.assertRaises(OSError):
+                writer.stop()
+            self.assertIsInstance(writer.error, OSError)
+            self.assertEqual(errors, [writer.error])
+        self.assertEqual((Metrics.clock_lag(1.0, 120, 100), Metrics.clock_lag(0.5, 120, 100)), (20, 0))
+
+class TestDisplayWall(unittest.TestCase):
+    BLINK = ["SETALL", "WAIT 3", "SETNONE", "WAIT 3", "LOOP"]
+
+    def test_one_clock_for_all_tiles(self):
+        wall = WallScheduler(hz=128)
+        tiles = [wall.add(self.BLINK, f"blink {i}") for i in range(100)]
+        wall.start(now=0.0)
+        self.assertEqual(wall.tick(now=0.0), [])
+        self.assertEqual(wall.tick(now=1 / 128), list(range(100)))  # First cycle: SETALL everywhere
+        self.assertEqual(wall.tick(now=5 / 128), [])                # WAIT 3 until cycle 5
+        self.assertEqual(wall.tick(now=6 / 128), list(range(100)))  # SETNONE
+        self.assertTrue(all(tile.emulator.cycles == 6 and tile.frame == 0 for tile in tiles))
+        wall.tick(now=60.0)  # A stall owes at most one second
+        self.assertTrue(all(tile.emulator.cycles == 134 for tile in tiles))
+
+    def test_errors(self):
+        wall = WallScheduler()
+        broken = wall.add(["BOGUS"], "broken")
+        crash = wall.add(["SETALL", "JUMP 0"], "crash")
+        crash.emulator.ram[2] = 200  # Jump target out of range
+        self.assertFalse(broken.emulator.running)
+        self.assertIn("line 1", broken.error)
+        wall.start(now=0.0)
+        self.assertEqual(wall.tick(now=1.0), [1])
+        self.assertEqual(crash.error, "Invalid jump address: 200")
+        self.assertEqual(crash.frame, crash.emulator.geometry.full)
+
+    def test_tiles_are_independent(self):
+        metrics = Metrics()
+        wall = WallScheduler(hz=120, metrics=metrics)
+        writer = wall.add(["SCRATCH_STORE 0 9", "WAIT 100"], "writer", geometry="8x8")
+        reader = wall.add(["SCRATCH_LOAD 0 40", "WAIT 100"], "reader", ram_size=128)
+        wall.start(now=0.0)
+        wall.tick(now=0.5)
+        self.assertEqual((writer.emulator.scratchpad[0], reader.emulator.ram[40]), (9, 0))
+        self.assertEqual(metrics.cycles.value, 120)
+        wall.remove(writer)
+        self.assertEqual((wall.tiles, wall.pool.free), ([reader], [writer.emulator]))
+        self.assertEqual((writer.emulator.cycles, writer.emulator.running), (0, False))
\ No newline at end of file